@@ -0,0 +1,66 @@
+from logging.config import fileConfig
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+from app.config import settings
+from app.database import Base
+from app.search import is_search_object
+import app.models  # noqa: F401  - таблицы регистрируются в Base.metadata
+
+config = context.config
+# Соединение передает app.migrations.upgrade: логирование приложения не трогаем
+if config.config_file_name is not None and "connection" not in config.attributes:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+
+def _url() -> str:
+    return config.get_main_option("sqlalchemy.url") or settings.DATABASE_URL
+
+
+def _include_object(object, name, type_, reflected, compare_to):
+    # Поисковый индекс ведет app.search, его нет в метаданных моделей
+    return not (reflected and compare_to is None and is_search_object(type_, name))
+
+
+def _configure(**kwargs):
+    # SQLite не умеет ALTER большей части схемы: batch-режим пересоздает таблицу
+    context.configure(target_metadata=target_metadata, compare_server_default=True,
+                      include_object=_include_object, **kwargs)
+
+
+def run_migrations_offline():
+    url = _url()
+    _configure(
+        url=url,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=url.startswith("sqlite"),
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def _run(connection):
+    _configure(connection=connection, render_as_batch=connection.dialect.name == "sqlite")
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online():
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+
+    connectable = engine_from_config(
+        {"sqlalchemy.url": _url()}, prefix="sqlalchemy.", poolclass=pool.NullPool
+    )
+    with connectable.connect() as connection:
+        _run(connection)
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
@@ -0,0 +1,74 @@
+"""denormalized counters
+
+Счетчики постов, пользователей и тегов (app/counters.py) и таблица
+site_counters. Добавленные колонки сразу заполняются по исходным
+таблицам; site_counters заполняет ensure_site_counters на старте.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COUNTERS = {
+    "posts": {
+        "likes_count": "SELECT COUNT(*) FROM reactions WHERE reactions.post_id = posts.id AND reactions.is_like = {true}",
+        "dislikes_count": "SELECT COUNT(*) FROM reactions WHERE reactions.post_id = posts.id AND reactions.is_like = {false}",
+        "comments_count": "SELECT COUNT(*) FROM comments WHERE comments.post_id = posts.id",
+    },
+    "users": {
+        "posts_count": "SELECT COUNT(*) FROM posts WHERE posts.author_id = users.id",
+        "comments_count": "SELECT COUNT(*) FROM comments WHERE comments.author_id = users.id",
+        "likes_count": "SELECT COUNT(*) FROM reactions WHERE reactions.user_id = users.id AND reactions.is_like = {true}",
+        "dislikes_count": "SELECT COUNT(*) FROM reactions WHERE reactions.user_id = users.id AND reactions.is_like = {false}",
+    },
+    "tags": {
+        "posts_count": "SELECT COUNT(DISTINCT post_tags.post_id) FROM post_tags WHERE post_tags.tag_id = tags.id",
+    },
+}
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    true, false = ("1", "0") if bind.dialect.name == "sqlite" else ("true", "false")
+
+    for table, counters in COUNTERS.items():
+        existing = {column["name"] for column in inspector.get_columns(table)}
+        added = [name for name in counters if name not in existing]
+        if not added:
+            continue
+        with op.batch_alter_table(table) as batch_op:
+            for name in added:
+                batch_op.add_column(sa.Column(name, sa.Integer(), nullable=False, server_default="0"))
+        assignments = ", ".join(
+            f"{name} = ({counters[name].format(true=true, false=false)})" for name in added
+        )
+        op.execute(f"UPDATE {table} SET {assignments}")
+
+    if "site_counters" not in inspector.get_table_names():
+        op.create_table(
+            "site_counters",
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("value", sa.Integer(), nullable=False, server_default="0"),
+            sa.PrimaryKeyConstraint("name"),
+        )
+
+
+def downgrade() -> None:
+    op.drop_table("site_counters")
+    for table, counters in COUNTERS.items():
+        with op.batch_alter_table(table) as batch_op:
+            for name in counters:
+                batch_op.drop_column(name)
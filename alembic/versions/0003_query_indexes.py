@@ -0,0 +1,78 @@
+"""query indexes
+
+Индексы под запросы лент, профиля и тегов (проверка:
+python bench/query_plans.py) и первичный ключ post_tags.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+INDEXES = [
+    # Главная: ORDER BY created_at DESC, id DESC, курсор по той же паре
+    ("ix_posts_created_id", "posts", ["created_at", "id"]),
+    # Версия лент: max(coalesce(updated_at, created_at))
+    ("ix_posts_modified_at", "posts", [sa.text("coalesce(updated_at, created_at)")]),
+    # Посты в профиле
+    ("ix_posts_author_created_id", "posts", ["author_id", "created_at", "id"]),
+    # Комментарии поста и комментарии в профиле
+    ("ix_comments_post_created_id", "comments", ["post_id", "created_at", "id"]),
+    ("ix_comments_author_created_id", "comments", ["author_id", "created_at", "id"]),
+    # Лайки в профиле: WHERE user_id = ? AND is_like ORDER BY created_at DESC, id DESC
+    ("ix_reactions_user_like_created_id", "reactions", ["user_id", "is_like", "created_at", "id"]),
+    # Посты тега; по post_id ищет первичный ключ
+    ("ix_post_tags_tag_id_post_id", "post_tags", ["tag_id", "post_id"]),
+    # Популярные теги
+    ("ix_tags_posts_count", "tags", ["posts_count"]),
+]
+
+
+def _dedupe_post_tags(bind):
+    op.execute("DELETE FROM post_tags WHERE post_id IS NULL OR tag_id IS NULL")
+    if bind.dialect.name == "postgresql":
+        op.execute(
+            "DELETE FROM post_tags a USING post_tags b "
+            "WHERE a.ctid > b.ctid AND a.post_id = b.post_id AND a.tag_id = b.tag_id"
+        )
+    else:
+        op.execute(
+            "DELETE FROM post_tags WHERE rowid NOT IN "
+            "(SELECT min(rowid) FROM post_tags GROUP BY post_id, tag_id)"
+        )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+
+    if not inspector.get_pk_constraint("post_tags").get("constrained_columns"):
+        _dedupe_post_tags(bind)
+        with op.batch_alter_table("post_tags", recreate="auto") as batch_op:
+            batch_op.alter_column("post_id", existing_type=sa.Integer(), nullable=False)
+            batch_op.alter_column("tag_id", existing_type=sa.Integer(), nullable=False)
+            batch_op.create_primary_key("pk_post_tags", ["post_id", "tag_id"])
+
+    # Часть индексов уже могла создать create_all
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table)
+    with op.batch_alter_table("post_tags", recreate="auto") as batch_op:
+        batch_op.drop_constraint("pk_post_tags", type_="primary")
+        batch_op.alter_column("post_id", existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column("tag_id", existing_type=sa.Integer(), nullable=True)
@@ -0,0 +1,237 @@
+"""Статика: адреса с хэшем содержимого, предсжатые копии и Range.
+
+Шаблоны ссылаются на файлы через asset_url("css/style.css"), что дает
+/static/css/style.<хэш>.css. Такой адрес никогда не меняет содержимое,
+поэтому отдается с Cache-Control: immutable на год; после правки файла
+меняется хэш, а с ним и адрес.
+
+    python -m app.assets build   # .gz/.br рядом с css/js/svg
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import stat
+import sys
+from typing import Optional
+import anyio
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+from starlette.types import Receive, Scope, Send
+from app.middleware import acceptable_encodings
+
+try:
+    import brotli
+except ImportError:  # brotli необязателен, тогда только gzip
+    brotli = None
+
+STATIC_DIR = "app/static"
+STATIC_URL = "/static/"
+# Загрузки получают uuid-имена и не перезаписываются
+IMMUTABLE_PREFIXES = ("uploads/",)
+COMPRESSIBLE_EXTENSIONS = {".css", ".js", ".svg", ".json", ".txt", ".html"}
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "public, no-cache"
+
+_HASHED_NAME = re.compile(r"^(?P<stem>.+)\.(?P<hash>[0-9a-f]{10})(?P<ext>\.[^./]+)$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+_hashes = {}
+
+
+def _file_hash(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(64 * 1024), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:10]
+
+
+def asset_url(path: str) -> str:
+    """URL файла из app/static с хэшем содержимого в имени."""
+    path = path.lstrip("/")
+    if path not in _hashes:
+        full_path = os.path.join(STATIC_DIR, path)
+        if not os.path.isfile(full_path):
+            return STATIC_URL + path
+        _hashes[path] = _file_hash(full_path)
+    stem, ext = os.path.splitext(path)
+    return f"{STATIC_URL}{stem}.{_hashes[path]}{ext}"
+
+
+def _unhash(path: str):
+    """style.0123456789.css -> (style.css, хэш совпал с содержимым).
+
+    Адрес со старым хэшем (страница из кэша после деплоя) получает текущий
+    файл, но без immutable.
+    """
+    match = _HASHED_NAME.match(path)
+    if match:
+        original = match["stem"] + match["ext"]
+        if os.path.isfile(os.path.join(STATIC_DIR, original)):
+            return original, asset_url(original) == STATIC_URL + path
+    return path, False
+
+
+class RangeFileResponse(Response):
+    """206 Partial Content для одного диапазона байтов файла."""
+
+    chunk_size = 64 * 1024
+
+    def __init__(self, path: str, start: int, end: int, size: int, headers: dict, method: str):
+        super().__init__(status_code=206, headers=headers)
+        self.path = path
+        self.start = start
+        self.end = end
+        self.send_body = method != "HEAD"
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        await send({"type": "http.response.start", "status": self.status_code, "headers": self.raw_headers})
+        if not self.send_body:
+            await send({"type": "http.response.body", "body": b""})
+            return
+        async with await anyio.open_file(self.path, mode="rb") as f:
+            await f.seek(self.start)
+            remaining = self.end - self.start + 1
+            while remaining > 0:
+                chunk = await f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send({"type": "http.response.body", "body": chunk, "more_body": remaining > 0})
+        if remaining > 0:
+            await send({"type": "http.response.body", "body": b""})
+
+
+def _parse_range(value: str, size: int):
+    """(start, end) для "bytes=a-b", None для заголовка, который не
+    поддерживаем (несколько диапазонов), и ValueError для невыполнимого."""
+    match = _RANGE.match(value.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        # bytes=-500: последние 500 байт
+        start, end = max(size - int(last), 0), size - 1
+    else:
+        start = int(first)
+        end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(value)
+    return start, end
+
+
+class AssetFiles(StaticFiles):
+    """StaticFiles с хэшированными адресами, .br/.gz-копиями, Range и
+    правильным Cache-Control."""
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        path, hashed = _unhash(path)
+        response = await super().get_response(path, scope)
+        immutable = hashed or path.startswith(IMMUTABLE_PREFIXES)
+        if response.status_code in (200, 206, 304):
+            response.headers["cache-control"] = IMMUTABLE if immutable else REVALIDATE
+        return response
+
+    def file_response(self, full_path, stat_result: os.stat_result, scope: Scope,
+                      status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        method = scope["method"]
+
+        encoded = self._encoded_sibling(str(full_path), stat_result, request_headers)
+        if encoded:
+            encoding, encoded_path, encoded_stat = encoded
+            response = FileResponse(
+                encoded_path, status_code=status_code, stat_result=encoded_stat, method=method,
+                media_type=mimetypes.guess_type(str(full_path))[0] or "text/plain",
+            )
+            response.headers["content-encoding"] = encoding
+            response.headers["vary"] = "Accept-Encoding"
+        else:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, method=method)
+            response.headers["accept-ranges"] = "bytes"
+            if str(full_path).endswith(tuple(COMPRESSIBLE_EXTENSIONS)):
+                response.headers["vary"] = "Accept-Encoding"
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+
+        range_header = request_headers.get("range")
+        if range_header and not encoded and self._if_range_matches(response.headers, request_headers):
+            size = stat_result.st_size
+            try:
+                byte_range = _parse_range(range_header, size)
+            except ValueError:
+                return Response(status_code=416, headers={"content-range": f"bytes */{size}"})
+            if byte_range:
+                headers = {
+                    key: response.headers[key]
+                    for key in ("content-type", "etag", "last-modified", "accept-ranges")
+                }
+                return RangeFileResponse(str(full_path), *byte_range, size, headers, method)
+        return response
+
+    @staticmethod
+    def _if_range_matches(response_headers, request_headers) -> bool:
+        if_range = request_headers.get("if-range")
+        if not if_range:
+            return True
+        return if_range in (response_headers.get("etag"), response_headers.get("last-modified"))
+
+    @staticmethod
+    def _encoded_sibling(full_path: str, stat_result: os.stat_result,
+                         request_headers: Headers) -> Optional[tuple]:
+        if os.path.splitext(full_path)[1] not in COMPRESSIBLE_EXTENSIONS:
+            return None
+        suffixes = dict(ENCODINGS)
+        accepted = acceptable_encodings(request_headers.get("accept-encoding", ""), tuple(suffixes))
+        for encoding in accepted:
+            suffix = suffixes[encoding]
+            try:
+                encoded_stat = os.stat(full_path + suffix)
+            except OSError:
+                continue
+            # Копия старше исходника - файл правили без пересборки
+            if stat.S_ISREG(encoded_stat.st_mode) and encoded_stat.st_mtime >= stat_result.st_mtime:
+                return encoding, full_path + suffix, encoded_stat
+        return None
+
+
+def build_compressed(directory: str = STATIC_DIR) -> list:
+    """Пишет .gz (и .br, если установлен brotli) рядом с текстовыми файлами."""
+    written = []
+    for root, _, files in os.walk(directory):
+        if os.path.relpath(root, directory).startswith(IMMUTABLE_PREFIXES[0].rstrip("/")):
+            continue
+        for name in files:
+            if os.path.splitext(name)[1] not in COMPRESSIBLE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            with open(path, "rb") as f:
+                data = f.read()
+            with open(path + ".gz", "wb") as f:
+                f.write(gzip.compress(data, compresslevel=9, mtime=0))
+            written.append(path + ".gz")
+            if brotli is not None:
+                with open(path + ".br", "wb") as f:
+                    f.write(brotli.compress(data, quality=11))
+                written.append(path + ".br")
+    return written
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["build"]:
+        print("Использование: python -m app.assets build")
+        sys.exit(1)
+
+    for path in build_compressed():
+        print(path)
+    if brotli is None:
+        print("brotli не установлен, собраны только .gz")
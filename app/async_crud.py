@@ -0,0 +1,112 @@
+"""Асинхронные варианты функций app.crud для AsyncSession.
+
+Запросы описаны один раз в app.crud; AsyncSession.run_sync выполняет их
+через асинхронный драйвер (asyncpg / aiosqlite), не блокируя цикл событий.
+Все, что читают шаблоны, загружается внутри вызова через joinedload /
+selectinload, потому что ленивые загрузки вне run_sync невозможны.
+"""
+from functools import wraps
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import counters, crud, schemas, tag_stats
+from app.auth import get_password_hash_async, verify_password_async
+from app.counter_buffer import reaction_counters
+from app.pagination import encode_cursor
+
+
+def _run_sync(fn):
+    @wraps(fn)
+    async def wrapper(db: AsyncSession, *args, **kwargs):
+        return await db.run_sync(fn, *args, **kwargs)
+    return wrapper
+
+
+get_user_by_email = _run_sync(crud.get_user_by_email)
+get_user_by_username = _run_sync(crud.get_user_by_username)
+get_user = _run_sync(crud.get_user)
+get_users = _run_sync(crud.get_users)
+change_user_password = _run_sync(crud.change_user_password)
+set_user_active = _run_sync(crud.set_user_active)
+
+
+# bcrypt считается в пуле потоков app.auth, в run_sync остаются только запросы
+async def create_user(db: AsyncSession, user: schemas.UserCreate):
+    hashed_password = await get_password_hash_async(user.password)
+    return await db.run_sync(crud.create_user, user, hashed_password)
+
+
+async def authenticate_user(db: AsyncSession, email: str, password: str):
+    user = await get_user_by_email(db, email)
+    if not user or not await verify_password_async(password, user.hashed_password):
+        return None
+    return user
+
+
+create_post = _run_sync(crud.create_post)
+get_post = _run_sync(crud.get_post)
+post_exists = _run_sync(crud.post_exists)
+get_posts = _run_sync(crud.get_posts)
+get_post_version = _run_sync(crud.get_post_version)
+get_listing_version = _run_sync(crud.get_listing_version)
+count_posts = _run_sync(crud.count_posts)
+count_users = _run_sync(crud.count_users)
+get_site_counts = _run_sync(counters.get_site_counts)
+get_user_posts = _run_sync(crud.get_user_posts)
+get_user_liked_posts = _run_sync(crud.get_user_liked_posts)
+get_user_comments = _run_sync(crud.get_user_comments)
+update_post = _run_sync(crud.update_post)
+delete_post = _run_sync(crud.delete_post)
+
+search_posts = _run_sync(crud.search_posts)
+count_search_posts = _run_sync(crud.count_search_posts)
+get_posts_by_tag = _run_sync(crud.get_posts_by_tag)
+count_posts_by_tag = _run_sync(crud.count_posts_by_tag)
+get_all_tags = _run_sync(crud.get_all_tags)
+get_popular_tags = _run_sync(crud.get_popular_tags)
+popular_tags = _run_sync(tag_stats.popular_tags)
+tag_cloud = _run_sync(tag_stats.tag_cloud)
+
+create_comment = _run_sync(crud.create_comment)
+get_comment = _run_sync(crud.get_comment)
+get_comments_by_post = _run_sync(crud.get_comments_by_post)
+update_comment = _run_sync(crud.update_comment)
+delete_comment = _run_sync(crud.delete_comment)
+get_comments_count_by_post = _run_sync(crud.get_comments_count_by_post)
+
+
+async def stream_comments_by_post(db: AsyncSession, post_id: int, limit: int, batch_size: int, listing: dict):
+    """Первая страница комментариев пачками по batch_size (yield_per, на
+    Postgres - серверный курсор). Курсор следующей страницы кладется в
+    listing["next_cursor"], когда станет известен."""
+    query = crud.first_comments_query(post_id, limit + 1).execution_options(yield_per=batch_size)
+    result = await db.stream_scalars(query)
+    sent, last = 0, None
+    try:
+        async for rows in result.partitions():
+            page = rows[:limit - sent]
+            if page:
+                sent += len(page)
+                last = page[-1]
+                yield page
+            if len(rows) > len(page):
+                # Строка сверх limit - есть следующая страница
+                listing["next_cursor"] = encode_cursor(last.created_at, last.id)
+                break
+    finally:
+        await result.close()
+
+
+# Реакция пишется сразу, счетчики - пачкой через reaction_counters
+async def set_reaction(db: AsyncSession, post_id: int, user_id: int, is_like: bool):
+    previous = await db.run_sync(crud.set_reaction, post_id, user_id, is_like)
+    reaction_counters.add_reaction(post_id, user_id, previous, is_like)
+
+
+async def delete_reaction(db: AsyncSession, post_id: int, user_id: int) -> bool:
+    previous = await db.run_sync(crud.delete_reaction, post_id, user_id)
+    reaction_counters.add_reaction(post_id, user_id, previous, None)
+    return previous is not None
+
+
+get_post_reactions = _run_sync(crud.get_post_reactions)
+get_user_reaction = _run_sync(crud.get_user_reaction)
+get_post_with_reactions = _run_sync(crud.get_post_with_reactions)
@@ -1,8 +1,12 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from app.config import settings
+from app.metrics import password_hash_duration, password_hash_rejected
 
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
@@ -12,6 +16,48 @@ def verify_password(plain_password, hashed_password):
 def get_password_hash(password):
     return pwd_context.hash(password)
 
+
+class PasswordHasherBusy(Exception):
+    """Очередь на bcrypt переполнена, запрос стоит повторить позже."""
+
+
+# bcrypt отпускает GIL, поэтому потоков достаточно: цикл событий продолжает
+# обслуживать остальные запросы, пока считается хэш.
+_hash_executor = ThreadPoolExecutor(
+    max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="bcrypt"
+)
+_hash_in_flight = 0
+
+
+def _timed_hash(operation, fn, *args):
+    # Замер внутри потока пула: только сам bcrypt, без ожидания в очереди
+    started = time.perf_counter()
+    try:
+        return fn(*args)
+    finally:
+        password_hash_duration.observe(time.perf_counter() - started, operation)
+
+
+async def _run_hasher(operation, fn, *args):
+    global _hash_in_flight
+    if _hash_in_flight >= settings.PASSWORD_HASH_WORKERS + settings.PASSWORD_HASH_QUEUE:
+        password_hash_rejected.inc()
+        raise PasswordHasherBusy()
+    _hash_in_flight += 1
+    try:
+        return await asyncio.get_running_loop().run_in_executor(_hash_executor, _timed_hash, operation, fn, *args)
+    finally:
+        _hash_in_flight -= 1
+
+
+async def verify_password_async(plain_password, hashed_password):
+    return await _run_hasher("verify", verify_password, plain_password, hashed_password)
+
+
+async def get_password_hash_async(password):
+    return await _run_hasher("hash", get_password_hash, password)
+
+
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
     if expires_delta:
@@ -22,12 +68,15 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str):
+def decode_token(token: str) -> Optional[dict]:
     try:
         payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            return None
-        return username
     except JWTError:
         return None
+    if payload.get("sub") is None:
+        return None
+    return payload
+
+def verify_token(token: str):
+    payload = decode_token(token)
+    return payload["sub"] if payload else None
@@ -0,0 +1,241 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+from urllib.parse import urlencode
+from fastapi import Request
+from fastapi.responses import HTMLResponse, StreamingResponse
+from app.config import settings
+
+
+class CacheStats:
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.sets = 0
+        self.evictions = 0
+
+    def as_dict(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "sets": self.sets,
+            "evictions": self.evictions,
+            "hit_ratio": round(self.hits / total, 3) if total else 0.0,
+        }
+
+
+class MemoryCache:
+    """Кэш в памяти процесса: TTL на запись и вытеснение LRU.
+
+    Поколения (generation) - счетчики по тегам вроде "posts" или "post:5".
+    Ключ страницы включает текущие поколения своих тегов, поэтому
+    инвалидация - это просто инкремент: старые записи больше не читаются
+    и со временем вытесняются.
+    """
+
+    def __init__(self, max_entries: int = 1000, ttl: int = 60):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.stats = CacheStats()
+        self._data = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._data[key]
+                self.stats.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.stats.hits += 1
+            return entry[1]
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        expires = time.monotonic() + (ttl or self.ttl)
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            self.stats.sets += 1
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.stats.evictions += 1
+
+    def delete(self, key: str):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def get_generations(self, tags) -> list:
+        with self._lock:
+            return [self._generations.get(tag, 0) for tag in tags]
+
+    def invalidate(self, *tags):
+        with self._lock:
+            for tag in tags:
+                self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self._generations.clear()
+
+
+class SharedCache:
+    """Общий кэш для нескольких процессов uvicorn.
+
+    client - любой объект с интерфейсом redis-py (get, set(ex=), mget, incr),
+    например redis.Redis или fakeredis.FakeRedis для локального запуска.
+    """
+
+    def __init__(self, client, ttl: int = 60, prefix: str = "blog:"):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+        self.stats = CacheStats()
+
+    @classmethod
+    def from_url(cls, url: str, ttl: int = 60):
+        import redis
+        return cls(redis.Redis.from_url(url), ttl)
+
+    def get(self, key: str) -> Optional[bytes]:
+        value = self.client.get(self.prefix + key)
+        if value is None:
+            self.stats.misses += 1
+        else:
+            self.stats.hits += 1
+        return value
+
+    def set(self, key: str, value: bytes, ttl: Optional[int] = None):
+        self.client.set(self.prefix + key, value, ex=ttl or self.ttl)
+        self.stats.sets += 1
+
+    def delete(self, key: str):
+        self.client.delete(self.prefix + key)
+
+    def get_generations(self, tags) -> list:
+        values = self.client.mget([f"{self.prefix}gen:{tag}" for tag in tags])
+        return [int(value or 0) for value in values]
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.client.incr(f"{self.prefix}gen:{tag}")
+
+    def clear(self):
+        for key in self.client.scan_iter(self.prefix + "*"):
+            self.client.delete(key)
+
+
+class NullCache:
+    def __init__(self):
+        self.stats = CacheStats()
+
+    def get(self, key):
+        self.stats.misses += 1
+        return None
+
+    def set(self, key, value, ttl=None):
+        pass
+
+    def delete(self, key):
+        pass
+
+    def get_generations(self, tags):
+        return [0] * len(tags)
+
+    def invalidate(self, *tags):
+        pass
+
+    def clear(self):
+        pass
+
+
+def create_cache(backend: str = settings.CACHE_BACKEND):
+    if backend == "memory":
+        return MemoryCache(settings.CACHE_MAX_ENTRIES, settings.CACHE_TTL)
+    if backend == "redis":
+        return SharedCache.from_url(settings.CACHE_URL, settings.CACHE_TTL)
+    return NullCache()
+
+
+page_cache = create_cache()
+
+
+# Снимки пользователей для get_current_user. Только в памяти процесса:
+# при нескольких воркерах деактивация доходит до остальных за USER_CACHE_TTL.
+user_cache = MemoryCache(settings.USER_CACHE_MAX_ENTRIES, settings.USER_CACHE_TTL)
+
+# Имя тега -> id. Теги не переименовываются и не удаляются, так что запись
+# может устареть только вместе с базой; TTL - страховка от этого.
+tag_cache = MemoryCache(settings.TAG_CACHE_MAX_ENTRIES, settings.TAG_CACHE_TTL)
+
+# Топ и облако тегов (app.tag_stats). Сбрасывается при смене тегов в этом
+# процессе, в остальных воркерах устаревает не дольше TAG_STATS_TTL.
+tag_stats_cache = MemoryCache(16, settings.TAG_STATS_TTL)
+
+
+def invalidate(*tags):
+    page_cache.invalidate(*tags)
+
+
+def invalidate_user(user_id: int):
+    user_cache.delete(f"user:{user_id}")
+
+
+def invalidate_tag_stats():
+    tag_stats_cache.clear()
+
+
+def post_tag(post_id: int) -> str:
+    return f"post:{post_id}"
+
+
+def anonymous_page_key(request: Request, current_user, *tags, etag: Optional[str] = None) -> Optional[str]:
+    """Ключ кэша страницы или None, если страницу кэшировать нельзя.
+
+    Кэшируются только страницы для анонимов: у вошедших пользователей
+    в разметке есть их имя, реакции и кнопки редактирования.
+
+    etag - версия данных, с которой страница отрисована. Кэш в памяти у
+    каждого воркера свой, и запись в другом воркере его не сбрасывает;
+    с версией в ключе устаревшая копия просто не найдется и не уйдет
+    клиенту под ETag новой версии.
+    """
+    if current_user is not None or request.cookies.get("access_token"):
+        return None
+    generations = page_cache.get_generations(tags)
+    query = urlencode(sorted(request.query_params.multi_items()))
+    versions = ",".join(f"{tag}={gen}" for tag, gen in zip(tags, generations))
+    return f"page:{request.url.path}?{query}|{versions}|{etag or ''}"
+
+
+def get_cached_page(key: Optional[str]) -> Optional[HTMLResponse]:
+    if key is None:
+        return None
+    body = page_cache.get(key)
+    if body is None:
+        return None
+    return HTMLResponse(body, headers={"X-Cache": "HIT"})
+
+
+def store_page(key: Optional[str], response):
+    if key is not None and response.status_code == 200:
+        if isinstance(response, StreamingResponse):
+            response.body_iterator = _store_when_sent(key, response.body_iterator)
+        else:
+            page_cache.set(key, response.body)
+        response.headers["X-Cache"] = "MISS"
+    return response
+
+
+async def _store_when_sent(key: str, chunks):
+    # Потоковая страница попадает в кэш, только если отправлена целиком
+    body = []
+    async for chunk in chunks:
+        body.append(chunk)
+        yield chunk
+    page_cache.set(key, b"".join(body))
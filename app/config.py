@@ -1,13 +1,86 @@
+from typing import Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str = "sqlite:///./blog.db"
+    # По умолчанию выводится из DATABASE_URL (asyncpg / aiosqlite)
+    ASYNC_DATABASE_URL: Optional[str] = None
     SECRET_KEY: str = "your-secret-key-change-this-in-production"
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     UPLOAD_DIR: str = "app/static/uploads"
+    # Недокачанные файлы: вне /static, чтобы их нельзя было открыть по URL
+    UPLOAD_TMP_DIR: str = ".upload-tmp"
     MAX_FILE_SIZE: int = 5 * 1024 * 1024  # 5MB
     ALLOWED_EXTENSIONS: set = {".jpg", ".jpeg", ".png", ".gif"}
+    # Варианты изображений (максимальная сторона, px) и процессы для Pillow
+    IMAGE_THUMB_SIZE: int = 480
+    IMAGE_LARGE_SIZE: int = 1200
+    IMAGE_WORKERS: int = 2
+    IMAGE_MAX_PIXELS: int = 40_000_000
+    # Запас на текстовые поля формы сверх MAX_FILE_SIZE
+    UPLOAD_FORM_OVERHEAD: int = 1024 * 1024
+    # Сжатие ответов (gzip/brotli)
+    COMPRESSION_MIN_SIZE: int = 1024  # байт
+    GZIP_LEVEL: int = 6
+    BROTLI_QUALITY: int = 4
+    # Доля одного ядра на сжатие, 0 - без ограничения
+    COMPRESSION_CPU_BUDGET: float = 0.5
+    # Шаблоны: байткод Jinja2 на диске (пусто - не сохранять) и проверка
+    # изменений файлов при каждом рендере (для разработки)
+    TEMPLATE_CACHE_DIR: str = ".jinja-cache"
+    TEMPLATE_AUTO_RELOAD: bool = False
+    # Комментариев на странице поста и в одном ответе "Загрузить ещё"
+    COMMENTS_PAGE_SIZE: int = 20
+    # По сколько комментариев первой страницы рендерить и отправлять за раз
+    COMMENTS_STREAM_BATCH: int = 5
+    # Счетчики лайков копятся в памяти и пишутся пачкой раз в
+    # REACTION_FLUSH_MS или после REACTION_FLUSH_EVENTS реакций
+    REACTION_FLUSH_MS: int = 250
+    REACTION_FLUSH_EVENTS: int = 500
+    # Номерные ссылки (OFFSET) только для первых страниц, дальше - курсор
+    MAX_OFFSET_PAGE: int = 10
+    # auto | postgres | sqlite | like
+    SEARCH_BACKEND: str = "auto"
+    SEARCH_LANGUAGE: str = "russian"
+    # Пул соединений (на каждый процесс uvicorn, отдельно для sync и async движков)
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: int = 30  # секунд ожидания свободного соединения
+    DB_POOL_RECYCLE: int = 1800  # секунд жизни соединения
+    DB_POOL_PRE_PING: bool = True
+    # Таймауты Postgres в миллисекундах, 0 - без ограничения
+    DB_STATEMENT_TIMEOUT: int = 30000
+    DB_LOCK_TIMEOUT: int = 5000
+    # alembic upgrade head при старте; выключить, если миграции идут шагом деплоя
+    DB_AUTO_MIGRATE: bool = True
+    # SQLite
+    SQLITE_WAL: bool = True
+    SQLITE_BUSY_TIMEOUT: int = 5000  # мс
+    # Кэш страниц для анонимов: memory | redis | none
+    CACHE_BACKEND: str = "memory"
+    CACHE_URL: str = "redis://localhost:6379/0"
+    CACHE_TTL: int = 60  # секунд
+    CACHE_MAX_ENTRIES: int = 1000
+    # Кэш пользователя из JWT (get_current_user)
+    USER_CACHE_TTL: int = 30  # секунд
+    USER_CACHE_MAX_ENTRIES: int = 10000
+    # Кэш id тегов по имени (create_post / update_post)
+    TAG_CACHE_TTL: int = 3600  # секунд
+    TAG_CACHE_MAX_ENTRIES: int = 10000
+    # Популярные теги и облако тегов
+    POPULAR_TAGS_LIMIT: int = 10
+    TAG_STATS_TTL: int = 60  # секунд
+    # bcrypt выполняется в отдельных потоках: сколько хэшей считать
+    # одновременно и сколько запросов может ждать своей очереди
+    PASSWORD_HASH_WORKERS: int = 2
+    PASSWORD_HASH_QUEUE: int = 32
+    # Профилирование запросов (app/profiling.py): Server-Timing и лог
+    # по каждому запросу. Медленные SQL пишутся в лог при SLOW_QUERY_MS > 0
+    PROFILE_REQUESTS: bool = False
+    SLOW_QUERY_MS: int = 0
+    # GET /metrics в формате Prometheus (app/metrics.py)
+    METRICS_ENABLED: bool = True
 
     class Config:
         env_file = ".env"
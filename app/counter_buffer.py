@@ -0,0 +1,107 @@
+"""Отложенная запись счетчиков реакций (write-behind).
+
+Сама реакция пишется сразу (crud.set_reaction), а likes_count и
+dislikes_count поста и автора реакции копятся в памяти процесса и
+применяются одной транзакцией на пачку. У популярного поста сотни
+лайков в секунду превращаются в один UPDATE строки posts на пачку
+вместо UPDATE на каждый клик.
+
+Дельты складываются, поэтому несколько воркеров пишут каждый свою
+пачку без потерь. Пока пачка не записана, счетчики отстают на
+REACTION_FLUSH_MS; python -m app.counters rebuild пересчитывает их
+с нуля, если процесс упал с непримененной пачкой.
+"""
+import asyncio
+import logging
+from collections import defaultdict
+from typing import Optional
+from app.cache import invalidate, post_tag
+from app.config import settings
+from app.counters import bump_post, bump_user, reaction_deltas
+from app.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+
+def _zero():
+    return {"likes": 0, "dislikes": 0}
+
+
+def _apply(db, posts: dict, users: dict):
+    # Один порядок блокировок во всех воркерах - без взаимных блокировок
+    for post_id in sorted(posts):
+        bump_post(db, post_id, **posts[post_id])
+    for user_id in sorted(users):
+        bump_user(db, user_id, **users[user_id])
+    db.commit()
+
+
+class CounterBuffer:
+    def __init__(self, interval: float, max_events: int):
+        self.interval = interval
+        self.max_events = max_events
+        self._posts = defaultdict(_zero)
+        self._users = defaultdict(_zero)
+        self._events = 0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+        self.stats = {"events": 0, "flushes": 0, "errors": 0, "pending": 0}
+
+    def add_reaction(self, post_id: int, user_id: int, previous: Optional[bool], current: Optional[bool]):
+        deltas = reaction_deltas(previous, current)
+        if not any(deltas.values()):
+            return
+        for name, delta in deltas.items():
+            self._posts[post_id][name] += delta
+            self._users[user_id][name] += delta
+        self._events += 1
+        self.stats["events"] += 1
+        self.stats["pending"] = self._events
+        if self._events >= self.max_events and (self._flush_task is None or self._flush_task.done()):
+            self._flush_task = asyncio.create_task(self.flush())
+
+    def _merge_back(self, posts: dict, users: dict, events: int):
+        for target, source in ((self._posts, posts), (self._users, users)):
+            for key, deltas in source.items():
+                for name, delta in deltas.items():
+                    target[key][name] += delta
+        self._events += events
+
+    async def flush(self):
+        async with self._lock:
+            if not self._events:
+                return
+            posts, users, events = self._posts, self._users, self._events
+            self._posts, self._users, self._events = defaultdict(_zero), defaultdict(_zero), 0
+            try:
+                async with AsyncSessionLocal() as db:
+                    await db.run_sync(_apply, posts, users)
+            except Exception:
+                # Пачка не потеряна: попробуем со следующей
+                logger.exception("Не удалось записать счетчики реакций")
+                self.stats["errors"] += 1
+                self._merge_back(posts, users, events)
+                return
+            finally:
+                self.stats["pending"] = self._events
+            self.stats["flushes"] += 1
+            invalidate(*(post_tag(post_id) for post_id in posts))
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.flush()
+
+
+reaction_counters = CounterBuffer(settings.REACTION_FLUSH_MS / 1000, settings.REACTION_FLUSH_EVENTS)
@@ -0,0 +1,181 @@
+import sys
+from typing import Optional
+from sqlalchemy import Integer, delete, func, insert, select, update
+from sqlalchemy.orm import Session
+from app import models
+
+SITE_COUNTERS = ("posts", "users", "comments")
+
+
+def _bump(db: Session, model, pk, deltas: dict):
+    values = {
+        name: getattr(model, name) + delta
+        for name, delta in deltas.items() if delta
+    }
+    if values:
+        # Счетчики не должны трогать onupdate=now() у posts.updated_at
+        if hasattr(model, "updated_at"):
+            values["updated_at"] = model.updated_at
+        db.execute(
+            update(model).where(model.id == pk).values(values),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def bump_post(db: Session, post_id: int, likes: int = 0, dislikes: int = 0, comments: int = 0):
+    _bump(db, models.Post, post_id, {
+        "likes_count": likes,
+        "dislikes_count": dislikes,
+        "comments_count": comments,
+    })
+
+
+def bump_user(db: Session, user_id: int, posts: int = 0, comments: int = 0, likes: int = 0, dislikes: int = 0):
+    _bump(db, models.User, user_id, {
+        "posts_count": posts,
+        "comments_count": comments,
+        "likes_count": likes,
+        "dislikes_count": dislikes,
+    })
+
+
+def bump_tags(db: Session, deltas: dict):
+    """deltas: tag_id -> изменение posts_count. Один UPDATE на каждое
+    значение изменения, а не на каждый тег."""
+    by_delta = {}
+    for tag_id, delta in deltas.items():
+        if delta:
+            by_delta.setdefault(delta, []).append(tag_id)
+    for delta, tag_ids in by_delta.items():
+        db.execute(
+            update(models.Tag)
+            .where(models.Tag.id.in_(sorted(tag_ids)))
+            .values(posts_count=models.Tag.posts_count + delta),
+            execution_options={"synchronize_session": False},
+        )
+
+
+def bump_site(db: Session, **deltas):
+    for name, delta in deltas.items():
+        if delta:
+            db.execute(
+                update(models.SiteCounter)
+                .where(models.SiteCounter.name == name)
+                .values(value=models.SiteCounter.value + delta)
+            )
+
+
+def reaction_deltas(previous: Optional[bool], current: Optional[bool]) -> dict:
+    """Изменение likes/dislikes при смене реакции previous -> current
+    (None - реакции нет)."""
+    deltas = {"likes": 0, "dislikes": 0}
+    if previous != current:
+        if previous is not None:
+            deltas["likes" if previous else "dislikes"] -= 1
+        if current is not None:
+            deltas["likes" if current else "dislikes"] += 1
+    return deltas
+
+
+def get_site_counts(db: Session) -> dict:
+    counts = dict.fromkeys(SITE_COUNTERS, 0)
+    counts.update(db.execute(select(models.SiteCounter.name, models.SiteCounter.value)).all())
+    return counts
+
+
+def _site_totals(db: Session) -> dict:
+    return {
+        "posts": db.scalar(select(func.count(models.Post.id))),
+        "users": db.scalar(select(func.count(models.User.id))),
+        "comments": db.scalar(select(func.count(models.Comment.id))),
+    }
+
+
+def ensure_site_counters(db: Session):
+    existing = set(db.scalars(select(models.SiteCounter.name)))
+    missing = [name for name in SITE_COUNTERS if name not in existing]
+    if missing:
+        totals = _site_totals(db)
+        db.execute(insert(models.SiteCounter), [
+            {"name": name, "value": totals[name]} for name in missing
+        ])
+        db.commit()
+
+
+def _count(model, *criteria):
+    return select(func.count(model.id)).where(*criteria).scalar_subquery()
+
+
+def rebuild_counters(db: Session):
+    """Пересчитывает все счетчики с нуля по исходным таблицам."""
+    Reaction, Comment, Post = models.Reaction, models.Comment, models.Post
+
+    db.execute(update(Post).values(
+        likes_count=_count(Reaction, Reaction.post_id == Post.id, Reaction.is_like == True),
+        dislikes_count=_count(Reaction, Reaction.post_id == Post.id, Reaction.is_like == False),
+        comments_count=_count(Comment, Comment.post_id == Post.id),
+        updated_at=Post.updated_at,
+    ), execution_options={"synchronize_session": False})
+
+    Tag, post_tags = models.Tag, models.post_tags
+    db.execute(update(Tag).values(
+        posts_count=select(func.count()).where(post_tags.c.tag_id == Tag.id).scalar_subquery(),
+    ), execution_options={"synchronize_session": False})
+
+    User = models.User
+    db.execute(update(User).values(
+        posts_count=_count(Post, Post.author_id == User.id),
+        comments_count=_count(Comment, Comment.author_id == User.id),
+        likes_count=_count(Reaction, Reaction.user_id == User.id, Reaction.is_like == True),
+        dislikes_count=_count(Reaction, Reaction.user_id == User.id, Reaction.is_like == False),
+    ), execution_options={"synchronize_session": False})
+
+    totals = _site_totals(db)
+    db.execute(delete(models.SiteCounter))
+    db.execute(insert(models.SiteCounter), [
+        {"name": name, "value": value} for name, value in totals.items()
+    ])
+    db.commit()
+
+
+def release_post_counters(db: Session, post_id: int):
+    """Снимает вклад удаляемого поста из счетчиков комментаторов и реакций."""
+    Reaction, Comment = models.Reaction, models.Comment
+
+    comment_counts = db.execute(
+        select(Comment.author_id, func.count(Comment.id))
+        .where(Comment.post_id == post_id)
+        .group_by(Comment.author_id)
+    ).all()
+    for author_id, count in comment_counts:
+        bump_user(db, author_id, comments=-count)
+
+    reaction_counts = db.execute(
+        select(Reaction.user_id,
+               func.sum(Reaction.is_like.cast(Integer)),
+               func.sum((~Reaction.is_like).cast(Integer)))
+        .where(Reaction.post_id == post_id)
+        .group_by(Reaction.user_id)
+    ).all()
+    for user_id, likes, dislikes in reaction_counts:
+        bump_user(db, user_id, likes=-(likes or 0), dislikes=-(dislikes or 0))
+
+    bump_site(db, comments=-sum(count for _, count in comment_counts))
+
+    tag_ids = db.scalars(select(models.post_tags.c.tag_id).where(models.post_tags.c.post_id == post_id))
+    bump_tags(db, {tag_id: -1 for tag_id in tag_ids})
+
+
+if __name__ == "__main__":
+    from app.database import SessionLocal
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Использование: python -m app.counters rebuild")
+        sys.exit(1)
+
+    session = SessionLocal()
+    try:
+        rebuild_counters(session)
+        print("Счетчики пересчитаны:", get_site_counts(session))
+    finally:
+        session.close()
@@ -1,8 +1,12 @@
-from sqlalchemy.orm import Session
-from sqlalchemy import Integer
+from sqlalchemy.orm import Session, joinedload, selectinload
 from typing import Optional
-from sqlalchemy import func
+from sqlalchemy import delete, func, insert, literal_column, select, update
+from sqlalchemy.dialects import postgresql, sqlite
 from app import models, schemas
+from app.cache import invalidate, invalidate_tag_stats, invalidate_user, post_tag, tag_cache
+from app.counters import bump_post, bump_tags, bump_user, bump_site, get_site_counts, release_post_counters
+from app.pagination import Page, paginate
+from app.search import get_search_backend
 from app.auth import get_password_hash, verify_password
 
 
@@ -14,19 +18,45 @@ def get_user_by_username(db: Session, username: str):
     return db.query(models.User).filter(models.User.username == username).first()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = get_password_hash(user.password)
+def get_user(db: Session, user_id: int):
+    return db.get(models.User, user_id)
+
+
+def get_users(db: Session):
+    return db.query(models.User).order_by(models.User.created_at.desc()).all()
+
+
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: Optional[str] = None):
+    if hashed_password is None:
+        hashed_password = get_password_hash(user.password)
     db_user = models.User(
         email=user.email,
         username=user.username,
         hashed_password=hashed_password
     )
     db.add(db_user)
+    bump_site(db, users=1)
     db.commit()
+    invalidate("users")
     db.refresh(db_user)
     return db_user
 
 
+def change_user_password(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id) \
+        .update({"hashed_password": hashed_password}, synchronize_session=False)
+    db.commit()
+    invalidate_user(user_id)
+
+
+def set_user_active(db: Session, user_id: int, is_active: bool):
+    updated = db.query(models.User).filter(models.User.id == user_id) \
+        .update({"is_active": is_active}, synchronize_session=False)
+    db.commit()
+    invalidate_user(user_id)
+    return bool(updated)
+
+
 def authenticate_user(db: Session, email: str, password: str):
     user = get_user_by_email(db, email)
     if not user or not verify_password(password, user.hashed_password):
@@ -34,14 +64,85 @@ def authenticate_user(db: Session, email: str, password: str):
     return user
 
 
-def get_or_create_tag(db: Session, tag_name: str):
-    tag = db.query(models.Tag).filter(models.Tag.name == tag_name).first()
-    if not tag:
-        tag = models.Tag(name=tag_name)
-        db.add(tag)
-        db.commit()
-        db.refresh(tag)
-    return tag
+def _dialect_insert(db: Session, table):
+    insert = postgresql.insert if db.get_bind().dialect.name == "postgresql" else sqlite.insert
+    return insert(table)
+
+
+def _tag_names(names) -> list:
+    # Порядок как ввел автор, без пустых и повторов
+    return list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+
+
+def resolve_tag_ids(db: Session, names: list) -> dict:
+    """id тегов по именам, недостающие создаются - не больше трех запросов
+    на любое число тегов и без отдельного commit.
+
+    Новые id попадают в tag_cache только после commit поста: при откате
+    их в базе не будет.
+    """
+    ids, created = {}, {}
+    missing = []
+    for name in names:
+        tag_id = tag_cache.get(f"tag:{name}")
+        if tag_id is None:
+            missing.append(name)
+        else:
+            ids[name] = tag_id
+
+    if missing:
+        found = dict(db.execute(
+            select(models.Tag.name, models.Tag.id).where(models.Tag.name.in_(missing))
+        ).all())
+        for name, tag_id in found.items():
+            tag_cache.set(f"tag:{name}", tag_id)
+        ids.update(found)
+        missing = [name for name in missing if name not in found]
+
+    if missing:
+        # ON CONFLICT: тот же тег мог только что создать параллельный запрос
+        created = dict(db.execute(
+            _dialect_insert(db, models.Tag)
+            .values([{"name": name} for name in missing])
+            .on_conflict_do_nothing(index_elements=[models.Tag.name])
+            .returning(models.Tag.name, models.Tag.id)
+        ).all())
+        ids.update(created)
+        raced = [name for name in missing if name not in created]
+        if raced:
+            ids.update(db.execute(
+                select(models.Tag.name, models.Tag.id).where(models.Tag.name.in_(raced))
+            ).all())
+    return ids
+
+
+def _set_post_tags(db: Session, db_post: models.Post, names: list, replace: bool) -> dict:
+    """Связи поста с тегами одним INSERT в транзакции поста; posts_count
+    тегов меняется только у добавленных и убранных."""
+    ids = resolve_tag_ids(db, names)
+    old_ids = set()
+    if replace:
+        old_ids = set(db.scalars(
+            delete(models.post_tags)
+            .where(models.post_tags.c.post_id == db_post.id)
+            .returning(models.post_tags.c.tag_id)
+        ))
+    if ids:
+        db.execute(insert(models.post_tags), [
+            {"post_id": db_post.id, "tag_id": ids[name]} for name in names
+        ])
+    new_ids = set(ids.values())
+    deltas = {tag_id: 1 for tag_id in new_ids - old_ids}
+    deltas.update({tag_id: -1 for tag_id in old_ids - new_ids})
+    bump_tags(db, deltas)
+    # Коллекция обновлена в обход ORM
+    db.expire(db_post, ["tags"])
+    return ids
+
+
+def _remember_tags(ids: dict):
+    for name, tag_id in ids.items():
+        tag_cache.set(f"tag:{name}", tag_id)
 
 
 def create_post(db: Session, post: schemas.PostCreate, user_id: int, image_filename: str = None):
@@ -51,24 +152,113 @@ def create_post(db: Session, post: schemas.PostCreate, user_id: int, image_filen
         author_id=user_id,
         image_filename=image_filename
     )
+    db.add(db_post)
+    db.flush()
 
-    if hasattr(post, 'tags') and post.tags:
-        for tag_name in post.tags:
-            tag = get_or_create_tag(db, tag_name.strip())
-            db_post.tags.append(tag)
+    tag_ids = {}
+    names = _tag_names(getattr(post, 'tags', None) or [])
+    if names:
+        tag_ids = _set_post_tags(db, db_post, names, replace=False)
 
-    db.add(db_post)
+    bump_user(db, user_id, posts=1)
+    bump_site(db, posts=1)
     db.commit()
-    db.refresh(db_post)
-    return db_post
+    _remember_tags(tag_ids)
+    invalidate("posts")
+    if tag_ids:
+        invalidate_tag_stats()
+    return get_post(db, db_post.id)
+
+
+# Шаблоны списков обращаются к post.author и post.tags, поэтому грузим их
+# сразу: автор через JOIN, теги одним дополнительным запросом на страницу.
+def _post_listing_options():
+    return (
+        joinedload(models.Post.author),
+        selectinload(models.Post.tags),
+    )
 
 
 def get_post(db: Session, post_id: int):
-    return db.query(models.Post).filter(models.Post.id == post_id).first()
+    return db.query(models.Post) \
+        .options(*_post_listing_options()) \
+        .filter(models.Post.id == post_id) \
+        .first()
+
+
+def post_exists(db: Session, post_id: int) -> bool:
+    return db.scalar(select(models.Post.id).where(models.Post.id == post_id)) is not None
+
+
+def get_post_version(db: Session, post_id: int):
+    """Все, от чего зависит страница поста, одной строкой: время правки,
+    счетчики реакций и комментариев, время последней правки комментария.
+    None, если поста нет."""
+    Post, Comment = models.Post, models.Comment
+    last_comment = select(func.max(func.coalesce(Comment.updated_at, Comment.created_at))) \
+        .where(Comment.post_id == post_id) \
+        .scalar_subquery()
+    row = db.query(
+        func.coalesce(Post.updated_at, Post.created_at),
+        Post.likes_count,
+        Post.dislikes_count,
+        Post.comments_count,
+        last_comment,
+    ).filter(Post.id == post_id).first()
+    if row is None:
+        return None
+    last_modified = max((value for value in (row[0], row[4]) if value is not None), default=None)
+    return tuple(row), last_modified
+
+
+def get_listing_version(db: Session):
+    """Версия лент (главная, теги, поиск): последний пост, последняя правка
+    и счетчики сайта, чтобы удаление поста тоже меняло версию."""
+    Post = models.Post
+    # Каждый max отдельным подзапросом: так оба берутся с края индекса
+    # (первичный ключ и ix_posts_modified_at), а не полным просмотром
+    last_id, last_modified = db.execute(select(
+        select(func.max(Post.id)).scalar_subquery(),
+        select(func.max(func.coalesce(Post.updated_at, Post.created_at))).scalar_subquery(),
+    )).one()
+    counts = get_site_counts(db)
+    return (last_id, last_modified, counts["posts"], counts["users"]), last_modified
+
+
+def get_posts(db: Session, skip: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    query = db.query(models.Post).options(*_post_listing_options())
+    return paginate(query, models.Post.created_at, models.Post.id, skip, limit, cursor)
+
+
+def count_posts(db: Session):
+    return get_site_counts(db)["posts"]
+
+
+def count_users(db: Session):
+    return get_site_counts(db)["users"]
+
+
+def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    query = db.query(models.Post) \
+        .options(*_post_listing_options()) \
+        .filter(models.Post.author_id == user_id)
+    return paginate(query, models.Post.created_at, models.Post.id, skip, limit, cursor)
+
+
+def get_user_liked_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    query = db.query(models.Post) \
+        .options(*_post_listing_options()) \
+        .join(models.Reaction) \
+        .filter(models.Reaction.user_id == user_id,
+                models.Reaction.is_like == True)
+    return paginate(query, models.Reaction.created_at, models.Reaction.id, skip, limit, cursor)
 
 
-def get_posts(db: Session, skip: int = 0, limit: int = 10):
-    return db.query(models.Post).offset(skip).limit(limit).all()
+def get_user_comments(db: Session, user_id: int, skip: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    query = db.query(models.Comment) \
+        .options(joinedload(models.Comment.post)) \
+        .filter(models.Comment.author_id == user_id)
+    return paginate(query, models.Comment.created_at, models.Comment.id, skip, limit, cursor)
 
 
 def update_post(db: Session, post_id: int, post_update: schemas.PostUpdate, user_id: int):
@@ -82,14 +272,19 @@ def update_post(db: Session, post_id: int, post_update: schemas.PostUpdate, user
         for field, value in update_data.items():
             setattr(db_post, field, value)
 
+        tag_ids = {}
         if 'tags' in post_update.dict(exclude_unset=True):
-            db_post.tags.clear()
-            for tag_name in post_update.tags:
-                tag = get_or_create_tag(db, tag_name.strip())
-                db_post.tags.append(tag)
+            # Смена одних тегов не трогает колонки posts, а updated_at
+            # участвует в ETag страницы поста
+            db_post.updated_at = func.now()
+            tag_ids = _set_post_tags(db, db_post, _tag_names(post_update.tags or []), replace=True)
 
         db.commit()
-        db.refresh(db_post)
+        _remember_tags(tag_ids)
+        invalidate("posts", post_tag(post_id))
+        if 'tags' in post_update.dict(exclude_unset=True):
+            invalidate_tag_stats()
+        return get_post(db, post_id)
 
     return db_post
 
@@ -101,6 +296,9 @@ def delete_post(db: Session, post_id: int, user_id: int):
     ).first()
 
     if db_post:
+        release_post_counters(db, post_id)
+        bump_user(db, user_id, posts=-1)
+        bump_site(db, posts=-1)
 
         db.query(models.Reaction).filter(
             models.Reaction.post_id == post_id
@@ -112,36 +310,36 @@ def delete_post(db: Session, post_id: int, user_id: int):
 
         db.delete(db_post)
         db.commit()
+        invalidate("posts", post_tag(post_id))
+        invalidate_tag_stats()
         return True
 
     return False
 
 
-def search_posts(db: Session, search_query: str, skip: int = 0, limit: int = 10):
-    return db.query(models.Post) \
-        .filter(models.Post.title.ilike(f"%{search_query}%") |
-                models.Post.content.ilike(f"%{search_query}%")) \
-        .order_by(models.Post.created_at.desc()) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+def search_posts(db: Session, search_query: str, skip: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    if not search_query.strip():
+        return Page([], None)
+    query = db.query(models.Post).options(*_post_listing_options())
+    return get_search_backend(db).search(query, search_query, skip, limit, cursor)
 
 
 def count_search_posts(db: Session, search_query: str):
-    return db.query(models.Post) \
-        .filter(models.Post.title.ilike(f"%{search_query}%") |
-                models.Post.content.ilike(f"%{search_query}%")) \
-        .count()
+    if not search_query.strip():
+        return 0
+    return get_search_backend(db).count(db.query(models.Post), search_query)
 
 
-def get_posts_by_tag(db: Session, tag_name: str, skip: int = 0, limit: int = 10):
-    return db.query(models.Post) \
+def get_posts_by_tag(db: Session, tag_name: str, skip: int = 0, limit: int = 10, cursor: Optional[str] = None):
+    query = db.query(models.Post) \
+        .options(*_post_listing_options()) \
         .join(models.Post.tags) \
-        .filter(models.Tag.name == tag_name) \
-        .order_by(models.Post.created_at.desc()) \
-        .offset(skip) \
-        .limit(limit) \
-        .all()
+        .filter(models.Tag.name == tag_name)
+    return paginate(query, models.Post.created_at, models.Post.id, skip, limit, cursor)
+
+
+def count_posts_by_tag(db: Session, tag_name: str):
+    return db.scalar(select(models.Tag.posts_count).where(models.Tag.name == tag_name)) or 0
 
 
 def get_all_tags(db: Session):
@@ -149,14 +347,21 @@ def get_all_tags(db: Session):
 
 
 def get_popular_tags(db: Session, limit: int = 10):
-    return db.query(models.Tag, func.count(models.post_tags.c.post_id).label('count')) \
-        .join(models.post_tags) \
-        .group_by(models.Tag.id) \
-        .order_by(func.count(models.post_tags.c.post_id).desc()) \
+    # posts_count ведет counters.bump_tags, GROUP BY по post_tags не нужен
+    return db.query(models.Tag) \
+        .filter(models.Tag.posts_count > 0) \
+        .order_by(models.Tag.posts_count.desc(), models.Tag.name) \
         .limit(limit) \
         .all()
 
 
+def get_used_tags(db: Session):
+    return db.query(models.Tag) \
+        .filter(models.Tag.posts_count > 0) \
+        .order_by(models.Tag.name) \
+        .all()
+
+
 def create_comment(db: Session, comment: schemas.CommentCreate, author_id: int, post_id: int):
     db_comment = models.Comment(
         content=comment.content,
@@ -164,7 +369,11 @@ def create_comment(db: Session, comment: schemas.CommentCreate, author_id: int,
         post_id=post_id
     )
     db.add(db_comment)
+    bump_post(db, post_id, comments=1)
+    bump_user(db, author_id, comments=1)
+    bump_site(db, comments=1)
     db.commit()
+    invalidate(post_tag(post_id))
     db.refresh(db_comment)
     return db_comment
 
@@ -173,13 +382,22 @@ def get_comment(db: Session, comment_id: int):
     return db.query(models.Comment).filter(models.Comment.id == comment_id).first()
 
 
-def get_comments_by_post(db: Session, post_id: int, skip: int = 0, limit: int = 100):
-    return (db.query(models.Comment)
-            .filter(models.Comment.post_id == post_id)
-            .order_by(models.Comment.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all())
+def first_comments_query(post_id: int, limit: int):
+    """Первая страница комментариев поста как select - для потоковой выборки
+    (yield_per); порядок тот же, что у get_comments_by_post."""
+    return select(models.Comment) \
+        .options(joinedload(models.Comment.author)) \
+        .where(models.Comment.post_id == post_id) \
+        .order_by(models.Comment.created_at.desc(), models.Comment.id.desc()) \
+        .limit(limit)
+
+
+def get_comments_by_post(db: Session, post_id: int, limit: int = 20, cursor: Optional[str] = None):
+    """Страница комментариев поста, новые сначала; следующая - по курсору."""
+    query = db.query(models.Comment) \
+        .options(joinedload(models.Comment.author)) \
+        .filter(models.Comment.post_id == post_id)
+    return paginate(query, models.Comment.created_at, models.Comment.id, 0, limit, cursor)
 
 
 def update_comment(db: Session, comment_id: int, comment_update: schemas.CommentUpdate, author_id: int):
@@ -192,6 +410,7 @@ def update_comment(db: Session, comment_id: int, comment_update: schemas.Comment
         for field, value in comment_update.dict(exclude_unset=True).items():
             setattr(db_comment, field, value)
         db.commit()
+        invalidate(post_tag(db_comment.post_id))
         db.refresh(db_comment)
 
     return db_comment
@@ -205,53 +424,74 @@ def delete_comment(db: Session, comment_id: int, author_id: int):
 
     if db_comment:
         db.delete(db_comment)
+        bump_post(db, db_comment.post_id, comments=-1)
+        bump_user(db, author_id, comments=-1)
+        bump_site(db, comments=-1)
         db.commit()
+        invalidate(post_tag(db_comment.post_id))
         return True
 
     return False
 
 
 def get_comments_count_by_post(db: Session, post_id: int):
-    return db.query(models.Comment).filter(models.Comment.post_id == post_id).count()
+    return db.query(models.Post.comments_count).filter(models.Post.id == post_id).scalar() or 0
+
+def _reaction_upsert(post_id: int, user_id: int, is_like: bool):
+    stmt = postgresql.insert(models.Reaction).values(post_id=post_id, user_id=user_id, is_like=is_like)
+    # Та же реакция повторно не трогает строку: WHERE отсекает UPDATE
+    return stmt.on_conflict_do_update(
+        index_elements=[models.Reaction.post_id, models.Reaction.user_id],
+        set_={"is_like": stmt.excluded.is_like, "created_at": func.now()},
+        where=models.Reaction.is_like != stmt.excluded.is_like,
+    )
 
-def create_or_update_reaction(db: Session, reaction: schemas.ReactionCreate, post_id: int, user_id: int):
-    db_reaction = db.query(models.Reaction).filter(
-        models.Reaction.post_id == post_id,
-        models.Reaction.user_id == user_id
-    ).first()
 
-    if db_reaction:
-        if db_reaction.is_like == reaction.is_like:
-            db.delete(db_reaction)
-            db.commit()
-            return None
-        else:
-            db_reaction.is_like = reaction.is_like
-            db_reaction.created_at = func.now()
+def set_reaction(db: Session, post_id: int, user_id: int, is_like: bool) -> Optional[bool]:
+    """Ставит лайк/дизлайк, в Postgres - одним INSERT ... ON CONFLICT DO UPDATE.
+
+    Повтор той же реакции ничего не меняет. Возвращает прежнюю реакцию
+    (None - ее не было); счетчики применяет вызывающий код.
+    """
+    if db.get_bind().dialect.name == "postgresql":
+        # xmax = 0 только у только что вставленной строки
+        row = db.execute(
+            _reaction_upsert(post_id, user_id, is_like).returning(literal_column("xmax = 0"))
+        ).first()
+        previous = is_like if row is None else (None if row[0] else not is_like)
     else:
-        db_reaction = models.Reaction(
-            post_id=post_id,
-            user_id=user_id,
-            is_like=reaction.is_like
+        # В SQLite RETURNING не видит старых значений. Первый же UPDATE
+        # берет блокировку записи до commit, так что параллельный клик того
+        # же пользователя дождется ее и увидит уже новое состояние
+        Reaction = models.Reaction
+        flipped = db.scalar(
+            update(Reaction)
+            .where(Reaction.post_id == post_id, Reaction.user_id == user_id, Reaction.is_like != is_like)
+            .values(is_like=is_like, created_at=func.now())
+            .returning(Reaction.id)
         )
-        db.add(db_reaction)
-
+        if flipped is not None:
+            previous = not is_like
+        else:
+            inserted = db.scalar(
+                sqlite.insert(Reaction)
+                .values(post_id=post_id, user_id=user_id, is_like=is_like)
+                .on_conflict_do_nothing()
+                .returning(Reaction.id)
+            )
+            previous = None if inserted is not None else is_like
     db.commit()
-    db.refresh(db_reaction)
-    return db_reaction
+    return previous
 
 
 def get_post_reactions(db: Session, post_id: int):
-    from sqlalchemy import func
-
-    result = db.query(
-        func.sum(models.Reaction.is_like.cast(Integer)).label('likes'),
-        func.sum((~models.Reaction.is_like).cast(Integer)).label('dislikes')
-    ).filter(models.Reaction.post_id == post_id).first()
+    result = db.query(models.Post.likes_count, models.Post.dislikes_count) \
+        .filter(models.Post.id == post_id) \
+        .first()
 
     return {
-        'likes_count': result.likes or 0,
-        'dislikes_count': result.dislikes or 0
+        'likes_count': result.likes_count if result else 0,
+        'dislikes_count': result.dislikes_count if result else 0
     }
 
 
@@ -279,15 +519,12 @@ def get_post_with_reactions(db: Session, post_id: int, user_id: Optional[int] =
     }
 
 
-def delete_reaction(db: Session, post_id: int, user_id: int):
-    reaction = db.query(models.Reaction).filter(
-        models.Reaction.post_id == post_id,
-        models.Reaction.user_id == user_id
-    ).first()
-
-    if reaction:
-        db.delete(reaction)
-        db.commit()
-        return True
-
-    return False
\ No newline at end of file
+def delete_reaction(db: Session, post_id: int, user_id: int) -> Optional[bool]:
+    """Удаляет реакцию и возвращает ее значение (None - реакции не было)."""
+    removed = db.scalar(
+        delete(models.Reaction)
+        .where(models.Reaction.post_id == post_id, models.Reaction.user_id == user_id)
+        .returning(models.Reaction.is_like)
+    )
+    db.commit()
+    return removed
@@ -1,15 +1,142 @@
-from sqlalchemy import create_engine
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, NullPool, QueuePool
 from app.config import settings
 
-engine = create_engine(settings.DATABASE_URL)
+ASYNC_DRIVERS = {
+    "sqlite": "sqlite+aiosqlite",
+    "postgresql": "postgresql+asyncpg",
+    "postgresql+psycopg2": "postgresql+asyncpg",
+}
+
+
+def get_async_url(url: str) -> str:
+    scheme, sep, rest = url.partition("://")
+    return ASYNC_DRIVERS.get(scheme, scheme) + sep + rest
+
+
+def engine_options(url: str) -> dict:
+    """Параметры create_engine/create_async_engine из настроек."""
+    url = make_url(url)
+    options = {}
+    pool_class = url.get_dialect().get_pool_class(url)
+
+    if url.get_backend_name() == "sqlite":
+        # aiosqlite по умолчанию открывает соединение на каждую сессию
+        if pool_class is NullPool and url.database not in (None, "", ":memory:"):
+            pool_class = options["poolclass"] = AsyncAdaptedQueuePool
+    elif url.get_backend_name() == "postgresql":
+        timeouts = {
+            "statement_timeout": settings.DB_STATEMENT_TIMEOUT,
+            "lock_timeout": settings.DB_LOCK_TIMEOUT,
+        }
+        timeouts = {name: str(value) for name, value in timeouts.items() if value}
+        if timeouts:
+            if url.get_driver_name() == "asyncpg":
+                options["connect_args"] = {"server_settings": timeouts}
+            else:
+                options["connect_args"] = {
+                    "options": " ".join(f"-c {name}={value}" for name, value in timeouts.items())
+                }
+
+    if issubclass(pool_class, QueuePool):
+        options.update(
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_timeout=settings.DB_POOL_TIMEOUT,
+            pool_recycle=settings.DB_POOL_RECYCLE,
+            pool_pre_ping=settings.DB_POOL_PRE_PING,
+        )
+    return options
+
+
+def _sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA busy_timeout = {int(settings.SQLITE_BUSY_TIMEOUT)}")
+    if settings.SQLITE_WAL:
+        # Читатели не блокируют писателя; при WAL достаточно synchronous=NORMAL
+        cursor.execute("PRAGMA journal_mode = WAL")
+        cursor.execute("PRAGMA synchronous = NORMAL")
+    cursor.close()
+
+
+def _setup_engine(engine):
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", _sqlite_pragmas)
+    return engine
+
+
+engine = _setup_engine(create_engine(settings.DATABASE_URL, **engine_options(settings.DATABASE_URL)))
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 Base = declarative_base()
 
+# Асинхронный движок для обработчиков FastAPI. Синхронный остается для
+# миграций и консольных команд.
+ASYNC_URL = settings.ASYNC_DATABASE_URL or get_async_url(settings.DATABASE_URL)
+async_engine = create_async_engine(ASYNC_URL, **engine_options(ASYNC_URL))
+_setup_engine(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, class_=AsyncSession, autoflush=False, expire_on_commit=False
+)
+
 def get_db():
     db = SessionLocal()
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def pool_stats(engine) -> dict:
+    pool = engine.pool
+    stats = {"class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update(
+            size=pool.size(),
+            checked_in=pool.checkedin(),
+            checked_out=pool.checkedout(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=pool._max_overflow,
+        )
+    return stats
+
+
+class QueryCounter:
+    def __init__(self):
+        self.statements = []
+
+    @property
+    def count(self):
+        return len(self.statements)
+
+
+@contextmanager
+def count_queries(*binds):
+    """Считает SQL-запросы, выполненные внутри блока.
+
+    with count_queries() as counter:
+        client.get("/")
+    assert counter.count <= 4
+    """
+    binds = binds or (engine, async_engine.sync_engine)
+    counter = QueryCounter()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        counter.statements.append(statement)
+
+    for bind in binds:
+        event.listen(bind, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        for bind in binds:
+            event.remove(bind, "before_cursor_execute", before_cursor_execute)
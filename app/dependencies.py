@@ -1,15 +1,46 @@
 from fastapi import Depends, HTTPException, status, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
-from app.database import get_db
-from app.auth import verify_token
-from app.crud import get_user_by_username
+from app.database import get_async_db as get_db
+from app.auth import decode_token
+from app.async_crud import get_user, get_user_by_username
+from app.cache import user_cache
 from app.models import User
 
+_USER_COLUMNS = [attr.key for attr in inspect(User).column_attrs]
 
-def get_current_user(
+
+async def _resolve_user(db: AsyncSession, payload: dict) -> Optional[User]:
+    """Пользователь по данным токена.
+
+    Новые токены содержат uid: снимок колонок пользователя берется из
+    user_cache, а при промахе - по первичному ключу. Каждый запрос получает
+    свой не привязанный к сессии объект User, так что изменения в нем
+    не попадают в кэш. Токены без uid ищутся по имени, как раньше.
+    """
+    user_id = payload.get("uid")
+    if user_id is None:
+        user = await get_user_by_username(db, payload["sub"])
+        return user if user and user.is_active is not False else None
+
+    key = f"user:{user_id}"
+    data = user_cache.get(key)
+    if data is None:
+        user = await get_user(db, user_id)
+        if user is None:
+            return None
+        data = {name: getattr(user, name) for name in _USER_COLUMNS}
+        user_cache.set(key, data)
+
+    if data["is_active"] is False:
+        return None
+    return User(**data)
+
+
+async def get_current_user(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ) -> User:
     token = request.cookies.get("access_token")
     if not token or not token.startswith("Bearer "):
@@ -19,14 +50,14 @@ def get_current_user(
         )
 
     token = token[7:]
-    username = verify_token(token)
-    if not username:
+    payload = decode_token(token)
+    if not payload:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Неверный токен"
         )
 
-    user = get_user_by_username(db, username)
+    user = await _resolve_user(db, payload)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -36,17 +67,17 @@ def get_current_user(
     return user
 
 
-def get_current_user_optional(
+async def get_current_user_optional(
         request: Request,
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ) -> Optional[User]:
     token = request.cookies.get("access_token")
     if not token or not token.startswith("Bearer "):
         return None
 
     token = token[7:]
-    username = verify_token(token)
-    if not username:
+    payload = decode_token(token)
+    if not payload:
         return None
 
-    return get_user_by_username(db, username)
\ No newline at end of file
+    return await _resolve_user(db, payload)
@@ -0,0 +1,69 @@
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Optional
+from fastapi import Request, Response
+
+
+class Validators:
+    """ETag и Last-Modified страницы, посчитанные по версии данных.
+
+    Версия - результат легкого запроса (get_post_version /
+    get_listing_version), поэтому 304 отдается без загрузки поста,
+    комментариев и без рендеринга шаблона.
+    """
+
+    def __init__(self, request: Request, version: tuple, user_id: Optional[int] = None,
+                 last_modified: Optional[datetime] = None, vary_cookie: bool = True):
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        raw = repr((request.url.path, query, user_id, version)).encode()
+        self.etag = '"' + hashlib.sha1(raw).hexdigest() + '"'
+        self.last_modified = _to_utc(last_modified)
+        self.private = user_id is not None
+        self.vary_cookie = vary_cookie
+
+    def matches(self, request: Request) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if if_none_match is not None:
+            # Слабое сравнение: сжатый ответ уходит с W/-версией того же ETag
+            tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+            return "*" in tags or self.etag in tags
+
+        # If-Modified-Since учитывается только без If-None-Match (RFC 9110)
+        if_modified_since = request.headers.get("if-modified-since")
+        if if_modified_since and self.last_modified:
+            try:
+                since = parsedate_to_datetime(if_modified_since)
+            except (TypeError, ValueError):
+                return False
+            return self.last_modified.replace(microsecond=0) <= since
+        return False
+
+    def headers(self) -> dict:
+        headers = {
+            "ETag": self.etag,
+            # Браузер хранит копию, но каждый раз сверяет ее с сервером
+            "Cache-Control": ("private" if self.private else "public") + ", no-cache",
+        }
+        if self.last_modified:
+            headers["Last-Modified"] = format_datetime(self.last_modified, usegmt=True)
+        if self.vary_cookie:
+            headers["Vary"] = "Cookie"
+        return headers
+
+    def not_modified(self) -> Response:
+        return Response(status_code=304, headers=self.headers())
+
+    def apply(self, response: Response) -> Response:
+        if response.status_code == 200:
+            response.headers.update(self.headers())
+        return response
+
+
+def _to_utc(value: Optional[datetime]) -> Optional[datetime]:
+    if value is None:
+        return None
+    if value.tzinfo is None:
+        # SQLite возвращает server_default now() без зоны, это UTC
+        return value.replace(tzinfo=timezone.utc)
+    return value.astimezone(timezone.utc)
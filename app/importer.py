@@ -0,0 +1,319 @@
+"""Массовая загрузка дампов: пользователи, теги, посты, комментарии, реакции.
+
+    python -m app.importer --users users.jsonl --posts posts.csv.gz \\
+        --comments comments.jsonl --reactions reactions.csv
+
+Файлы - JSONL (по объекту на строку) или CSV с заголовком, можно .gz.
+Читаются потоком пачками по --batch-size строк: память не зависит от
+размера дампа. Каждая пачка - один многострочный INSERT (в Postgres с
+psycopg2 - COPY) и свой commit, поэтому упавшую загрузку повторяют на
+чистой базе.
+
+Поля - колонки таблиц; счетчики не читаются, они пересчитываются в конце.
+  users:     id, email, username, hashed_password, is_active, created_at
+  tags:      id, name, created_at
+  posts:     id, title, content, author_id | author, image_filename,
+             created_at, updated_at, tags (список или "a, b")
+  comments:  id, content, post_id, author_id | author, created_at, updated_at
+  reactions: post_id, user_id | user, is_like (true/false, like/dislike), created_at
+
+Пароли только готовыми bcrypt-хэшами в hashed_password, пачка с другим
+значением отклоняется целиком. Вместо *_id можно указать имя пользователя
+(author, user). Без id посты получают новые, но тогда комментарии и реакции
+к ним сослаться не смогут - для восстановления id нужно выгружать.
+
+После загрузки пересчитываются счетчики (app.counters), поисковый индекс,
+статистика планировщика и последовательности id в Postgres.
+"""
+import argparse
+import csv
+import gzip
+import io
+import json
+import sys
+import time
+from datetime import datetime, timezone
+from itertools import islice
+from typing import Iterator
+from sqlalchemy import Boolean, DateTime, Integer, String, insert, select, text
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session
+from app import crud, migrations, models
+from app.auth import pwd_context
+from app.cache import invalidate_tag_stats, page_cache, tag_cache
+from app.counters import get_site_counts, rebuild_counters
+from app.search import install_search_index, rebuild_search_index
+
+FIELDS = {
+    "users": ("id", "email", "username", "hashed_password", "is_active", "created_at"),
+    "tags": ("id", "name", "created_at"),
+    "posts": ("id", "title", "content", "author_id", "image_filename", "created_at", "updated_at"),
+    "comments": ("id", "content", "post_id", "author_id", "created_at", "updated_at"),
+    "reactions": ("id", "post_id", "user_id", "is_like", "created_at"),
+}
+
+# Ссылка на пользователя по имени: поле -> колонка с id
+USER_REFERENCES = {"posts": ("author", "author_id"), "comments": ("author", "author_id"),
+                   "reactions": ("user", "user_id")}
+
+# Порядок загрузки - по внешним ключам
+ORDER = ("users", "tags", "posts", "comments", "reactions")
+
+TRUE = {"1", "true", "t", "yes", "like"}
+FALSE = {"0", "false", "f", "no", "dislike"}
+
+
+class ImportFailed(Exception):
+    pass
+
+
+def read_rows(path: str) -> Iterator[dict]:
+    opener = gzip.open if path.endswith(".gz") else open
+    name = path[:-3] if path.endswith(".gz") else path
+    with opener(path, "rt", encoding="utf-8", newline="") as source:
+        if name.endswith(".csv"):
+            yield from csv.DictReader(source)
+            return
+        for number, line in enumerate(source, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as error:
+                raise ImportFailed(f"{path}:{number}: {error}")
+
+
+def _convert(column, value):
+    if value is None:
+        return None
+    if value == "" and (column.nullable or not isinstance(column.type, String)):
+        return None
+    if isinstance(column.type, Boolean):
+        if isinstance(value, str):
+            lowered = value.strip().lower()
+            if lowered not in TRUE | FALSE:
+                raise ValueError(f"{column.name}: не логическое значение {value!r}")
+            return lowered in TRUE
+        return bool(value)
+    if isinstance(column.type, Integer):
+        return int(value)
+    if isinstance(column.type, DateTime) and isinstance(value, str):
+        return datetime.fromisoformat(value)
+    return value
+
+
+def _check_password_hash(row: dict):
+    # Чужой формат хэша при входе - UnknownHashError и 500, а не отказ
+    value = row["hashed_password"]
+    try:
+        if pwd_context.identify(value) != "bcrypt":
+            raise ValueError
+        pwd_context.handler("bcrypt").from_string(value)
+    except (ValueError, TypeError):
+        raise ValueError(f"hashed_password: не bcrypt-хэш у {row.get('username') or row.get('email')!r}")
+
+
+def _tag_list(value) -> list:
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(",")
+    return crud._tag_names(value)
+
+
+class Importer:
+    def __init__(self, db: Session, batch_size: int = 5000, use_copy: bool = True):
+        self.db = db
+        self.batch_size = batch_size
+        dialect = db.get_bind().dialect
+        self.postgres = dialect.name == "postgresql"
+        self.use_copy = use_copy and self.postgres and dialect.driver == "psycopg2"
+
+    # --- запись -------------------------------------------------------------
+
+    def _copy(self, table, columns: list, rows: list):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            writer.writerow(["\\N" if row[name] is None else row[name] for name in columns])
+        buffer.seek(0)
+        cursor = self.db.connection().connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY {table.name} ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv, NULL '\\N')",
+                buffer,
+            )
+        finally:
+            cursor.close()
+
+    def _insert(self, table, columns: list, rows: list, returning: bool = False):
+        if table.name in ("tags", "reactions", "post_tags"):
+            # Повторы в дампе (тот же тег, вторая реакция) пропускаются
+            statement = crud._dialect_insert(self.db, table).on_conflict_do_nothing()
+        elif self.use_copy and not returning:
+            self._copy(table, columns, rows)
+            return None
+        else:
+            statement = insert(table)
+        if returning:
+            statement = statement.returning(table.c.id, sort_by_parameter_order=True)
+            return self.db.scalars(statement, rows).all()
+        self.db.execute(statement, rows)
+        return None
+
+    # --- подготовка пачки ---------------------------------------------------
+
+    def _resolve_users(self, entity: str, raw: list, rows: list):
+        if entity not in USER_REFERENCES:
+            return
+        field, column = USER_REFERENCES[entity]
+        names = {item[field] for item, row in zip(raw, rows) if row.get(column) is None and item.get(field)}
+        if not names:
+            return
+        ids = dict(self.db.execute(
+            select(models.User.username, models.User.id).where(models.User.username.in_(names))
+        ).all())
+        unknown = names - ids.keys()
+        if unknown:
+            raise ValueError(f"{field}: нет пользователей {', '.join(sorted(unknown)[:5])}")
+        for item, row in zip(raw, rows):
+            if row.get(column) is None and item.get(field):
+                row[column] = ids[item[field]]
+
+    def _rows(self, entity: str, table, columns: list, raw: list) -> list:
+        now = datetime.now(timezone.utc)
+        defaults = {
+            column.name: column.default.arg for column in table.columns
+            if column.name not in columns and column.default is not None and column.default.is_scalar
+        }
+        rows = []
+        for item in raw:
+            row = {name: _convert(table.c[name], item.get(name)) for name in columns}
+            if "created_at" in row and row["created_at"] is None:
+                row["created_at"] = now
+            row.update(defaults)
+            if entity == "users":
+                _check_password_hash(row)
+            rows.append(row)
+        self._resolve_users(entity, raw, rows)
+        return rows
+
+    def _columns(self, entity: str, first: dict) -> list:
+        if entity == "users" and "hashed_password" not in first:
+            raise ImportFailed("users: нужно поле hashed_password (готовый bcrypt-хэш)")
+        columns = [name for name in FIELDS[entity] if name in first]
+        field_column = USER_REFERENCES.get(entity)
+        if field_column and field_column[0] in first and field_column[1] not in columns:
+            columns.append(field_column[1])
+        if "created_at" not in columns:
+            columns.append("created_at")
+        return columns
+
+    # --- загрузка -----------------------------------------------------------
+
+    def _post_tags(self, raw: list, post_ids: list):
+        names = list(dict.fromkeys(name for item in raw for name in _tag_list(item.get("tags"))))
+        if not names:
+            return
+        tag_ids = crud.resolve_tag_ids(self.db, names)
+        links = [
+            {"post_id": post_id, "tag_id": tag_ids[name]}
+            for item, post_id in zip(raw, post_ids)
+            for name in _tag_list(item.get("tags"))
+        ]
+        self._insert(models.post_tags, ["post_id", "tag_id"], links)
+
+    def load(self, entity: str, path: str) -> int:
+        table = getattr(models, {"users": "User", "tags": "Tag", "posts": "Post",
+                                 "comments": "Comment", "reactions": "Reaction"}[entity]).__table__
+        source = read_rows(path)
+        columns = None
+        loaded = 0
+        while True:
+            raw = list(islice(source, self.batch_size))
+            if not raw:
+                break
+            if columns is None:
+                columns = self._columns(entity, raw[0])
+            where = f"{path}: строки {loaded + 1}-{loaded + len(raw)}"
+            try:
+                rows = self._rows(entity, table, columns, raw)
+                with_tags = entity == "posts" and any(item.get("tags") for item in raw)
+                if with_tags and "id" not in columns:
+                    post_ids = self._insert(table, columns, rows, returning=True)
+                else:
+                    self._insert(table, columns, rows)
+                    post_ids = [row.get("id") for row in rows]
+                if with_tags:
+                    self._post_tags(raw, post_ids)
+                self.db.commit()
+            except (ValueError, SQLAlchemyError) as error:
+                self.db.rollback()
+                # Теги из отмененной пачки могли попасть в кэш имен
+                tag_cache.clear()
+                reason = getattr(error, "orig", None) or error
+                raise ImportFailed(f"{where}: {reason}") from error
+            loaded += len(raw)
+        return loaded
+
+    def finish(self):
+        """Производные данные: все, что приложение ведет само при записи."""
+        if self.postgres:
+            # После вставки явных id последовательности отстают от max(id)
+            for table in ("users", "tags", "posts", "comments", "reactions"):
+                self.db.execute(text(
+                    f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), "
+                    f"COALESCE((SELECT MAX(id) FROM {table}), 0) + 1, false)"
+                ))
+            self.db.commit()
+        rebuild_counters(self.db)
+        bind = self.db.get_bind()
+        rebuild_search_index(bind)
+        with bind.begin() as connection:
+            connection.execute(text("ANALYZE"))
+        # Кэш страниц общий при CACHE_BACKEND=redis; кэши в памяти
+        # работающих воркеров устаревают сами по своим TTL
+        page_cache.clear()
+        tag_cache.clear()
+        invalidate_tag_stats()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    for entity in ORDER:
+        parser.add_argument(f"--{entity}", metavar="FILE")
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--no-copy", action="store_true", help="INSERT вместо COPY в Postgres")
+    parser.add_argument("--no-migrate", action="store_true", help="не выполнять alembic upgrade head")
+    args = parser.parse_args(argv)
+
+    files = [(entity, getattr(args, entity)) for entity in ORDER if getattr(args, entity)]
+    if not files:
+        parser.error("нужен хотя бы один файл")
+
+    from app.database import SessionLocal, engine
+
+    if not args.no_migrate:
+        migrations.upgrade(engine)
+    install_search_index(engine)
+
+    with SessionLocal() as db:
+        importer = Importer(db, args.batch_size, use_copy=not args.no_copy)
+        try:
+            for entity, path in files:
+                started = time.perf_counter()
+                count = importer.load(entity, path)
+                elapsed = time.perf_counter() - started
+                print(f"{entity}: {count} строк за {elapsed:.1f} с ({count / max(elapsed, 1e-9):.0f}/с)")
+        except (ImportFailed, OSError) as error:
+            print(f"Ошибка: {error}", file=sys.stderr)
+            sys.exit(1)
+
+        started = time.perf_counter()
+        importer.finish()
+        print(f"Производные данные пересчитаны за {time.perf_counter() - started:.1f} с:",
+              get_site_counts(db))
+
+
+if __name__ == "__main__":
+    main()
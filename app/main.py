@@ -1,78 +1,150 @@
 from typing import Optional
-from fastapi import FastAPI, Request, Depends, Query
-from fastapi.templating import Jinja2Templates
-from fastapi.staticfiles import StaticFiles
-from fastapi.responses import HTMLResponse
+from fastapi import FastAPI, HTTPException, Request, Depends, Query
+from fastapi.responses import HTMLResponse, PlainTextResponse
 import app.models as models
-from app.database import engine, get_db
+from app.database import engine, async_engine, get_async_db as get_db, SessionLocal, pool_stats
+from app.counters import ensure_site_counters
+from app.search import install_search_index
 from app.routers import auth, posts, comments, reactions, profile, simple_admin
-from sqlalchemy.orm import Session
+from app.dependencies import get_current_user_optional
+from app import async_crud, metrics, migrations, profiling
+from app.config import settings
+from app.cache import page_cache, tag_cache, tag_stats_cache, user_cache, anonymous_page_key, get_cached_page, store_page
+from app.http_cache import Validators
+from app.pagination import deep_page_redirect
+from app.auth import PasswordHasherBusy
+from app.counter_buffer import reaction_counters
+from app.utils.file_upload import shutdown_image_workers
+from app.middleware import CompressionMiddleware, UploadLimitMiddleware, compression_stats
+from app.assets import AssetFiles
+from app.templating import templates, render_stats
+from sqlalchemy.ext.asyncio import AsyncSession
+import logging
 import time
-from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(title="GG-BLOG")
+app.add_middleware(UploadLimitMiddleware, max_body_size=settings.MAX_FILE_SIZE + settings.UPLOAD_FORM_OVERHEAD)
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=settings.COMPRESSION_MIN_SIZE,
+    gzip_level=settings.GZIP_LEVEL,
+    brotli_quality=settings.BROTLI_QUALITY,
+    cpu_budget=settings.COMPRESSION_CPU_BUDGET,
+)
+
+if settings.METRICS_ENABLED:
+    metrics.instrument_engine(engine, "sync")
+    metrics.instrument_engine(async_engine.sync_engine, "async")
+    metrics.collect_pools({"sync": engine, "async": async_engine.sync_engine})
+    metrics.collect_caches({"page": page_cache, "user": user_cache, "tag": tag_cache, "tag_stats": tag_stats_cache})
+    app.add_middleware(metrics.MetricsMiddleware)
+
+if settings.PROFILE_REQUESTS or settings.SLOW_QUERY_MS:
+    profiling.configure_logging()
+    profiling.instrument(engine, async_engine.sync_engine)
+if settings.PROFILE_REQUESTS:
+    # Последний добавленный - внешний: время запроса включает сжатие
+    app.add_middleware(profiling.ProfilingMiddleware)
 
-app.mount("/static", StaticFiles(directory="app/static"), name="static")
-templates = Jinja2Templates(directory="app/templates")
+app.mount("/static", AssetFiles(directory="app/static"), name="static")
 
 @app.on_event("startup")
 def startup():
     max_retries = 5
     for i in range(max_retries):
         try:
-            models.Base.metadata.create_all(bind=engine)
+            if settings.DB_AUTO_MIGRATE:
+                migrations.upgrade(engine)
+            install_search_index(engine)
             break
-        except Exception as e:
-            if i < max_retries - 1:
-                time.sleep(3)
+        except Exception:
+            # Без схемы приложению работать не с чем: после последней
+            # попытки ошибка останавливает запуск
+            if i == max_retries - 1:
+                logger.exception("Не удалось подготовить схему базы")
+                raise
+            logger.warning("Схема базы не готова (попытка %d из %d), повтор через 3 с",
+                           i + 1, max_retries, exc_info=True)
+            time.sleep(3)
+
+    db = SessionLocal()
+    try:
+        ensure_site_counters(db)
+    finally:
+        db.close()
+
+
+@app.exception_handler(PasswordHasherBusy)
+async def password_hasher_busy(request: Request, exc: PasswordHasherBusy):
+    return PlainTextResponse(
+        "Слишком много попыток входа, повторите через несколько секунд",
+        status_code=503,
+        headers={"Retry-After": "1"},
+    )
+
+
+@app.on_event("startup")
+async def start_background_tasks():
+    reaction_counters.start()
 
 
-def moscow_time(dt: datetime) -> datetime:
-    if dt:
-        return dt + timedelta(hours=3)
-    return dt
+@app.on_event("shutdown")
+async def shutdown():
+    await reaction_counters.stop()
+    await async_engine.dispose()
+    shutdown_image_workers()
+
 
 app.include_router(auth.router)
 app.include_router(posts.router)
 app.include_router(comments.router)
-templates.env.filters["moscow_time"] = moscow_time
 app.include_router(reactions.router)
 app.include_router(profile.router)
 app.include_router(simple_admin.router)
 
-def get_current_user_optional(request: Request, db: Session = Depends(get_db)):
-    token = request.cookies.get("access_token")
-    if not token or not token.startswith("Bearer "):
-        return None
-    token = token[7:]
-    from app.auth import verify_token
-    username = verify_token(token)
-    if not username:
-        return None
-    from app.crud import get_user_by_username
-    return get_user_by_username(db, username)
-
 @app.get("/", response_class=HTMLResponse)
 async def home(
     request: Request,
     page: int = Query(1, ge=1),
     per_page: int = Query(10, ge=1, le=50),
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = Query(None),
+    db: AsyncSession = Depends(get_db),
     current_user: Optional[models.User] = Depends(get_current_user_optional)
 ):
+    redirect = deep_page_redirect(request, page, per_page, cursor)
+    if redirect:
+        return redirect
+
+    version, last_modified = await async_crud.get_listing_version(db)
+    validators = Validators(request, version, getattr(current_user, "id", None), last_modified)
+    if validators.matches(request):
+        return validators.not_modified()
+
+    cache_key = anonymous_page_key(request, current_user, "posts", "users", etag=validators.etag)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return validators.apply(cached)
+
     try:
-        total_posts = db.query(models.Post).count()
+        counts = await async_crud.get_site_counts(db)
+        total_posts = counts["posts"]
         skip = (page - 1) * per_page
         total_pages = (total_posts + per_page - 1) // per_page
-        posts_list = db.query(models.Post).order_by(models.Post.created_at.desc()).offset(skip).limit(per_page).all()
-        user_count = db.query(models.User).count()
+        posts_list, next_cursor = await async_crud.get_posts(db, skip=skip, limit=per_page, cursor=cursor)
+        user_count = counts["users"]
+        popular_tags = await async_crud.popular_tags(db)
     except:
         total_posts = 0
         total_pages = 1
         posts_list = []
+        next_cursor = None
         user_count = 0
+        popular_tags = []
+        cache_key = None
 
-    return templates.TemplateResponse(
+    return validators.apply(store_page(cache_key, templates.TemplateResponse(
         "index.html",
         {
             "request": request,
@@ -82,9 +154,11 @@ async def home(
             "page": page,
             "total_pages": total_pages,
             "per_page": per_page,
+            "next_cursor": next_cursor,
+            "popular_tags": popular_tags,
             "current_user": current_user
         }
-    )
+    )))
 
 
 @app.get("/search", response_class=HTMLResponse)
@@ -93,32 +167,39 @@ async def search(
         q: str = Query("", max_length=100),
         page: int = Query(1, ge=1),
         per_page: int = Query(10, ge=1, le=50),
-        db: Session = Depends(get_db),
+        cursor: Optional[str] = Query(None),
+        db: AsyncSession = Depends(get_db),
         current_user: Optional[models.User] = Depends(get_current_user_optional)
 ):
+    redirect = deep_page_redirect(request, page, per_page, cursor)
+    if redirect:
+        return redirect
+
+    version, last_modified = await async_crud.get_listing_version(db)
+    validators = Validators(request, version, getattr(current_user, "id", None), last_modified)
+    if validators.matches(request):
+        return validators.not_modified()
+
+    cache_key = anonymous_page_key(request, current_user, "posts", etag=validators.etag)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return validators.apply(cached)
+
     try:
         skip = (page - 1) * per_page
 
-        posts_list = db.query(models.Post) \
-            .filter(models.Post.title.ilike(f"%{q}%") |
-                    models.Post.content.ilike(f"%{q}%")) \
-            .order_by(models.Post.created_at.desc()) \
-            .offset(skip) \
-            .limit(per_page) \
-            .all()
-
-        total_results = db.query(models.Post) \
-            .filter(models.Post.title.ilike(f"%{q}%") |
-                    models.Post.content.ilike(f"%{q}%")) \
-            .count()
+        posts_list, next_cursor = await async_crud.search_posts(db, q, skip=skip, limit=per_page, cursor=cursor)
+        total_results = await async_crud.count_search_posts(db, q)
 
         total_pages = (total_results + per_page - 1) // per_page
     except:
         posts_list = []
+        next_cursor = None
         total_results = 0
         total_pages = 1
+        cache_key = None
 
-    return templates.TemplateResponse(
+    return validators.apply(store_page(cache_key, templates.TemplateResponse(
         "search.html",
         {
             "request": request,
@@ -128,14 +209,64 @@ async def search(
             "page": page,
             "total_pages": total_pages,
             "per_page": per_page,
+            "next_cursor": next_cursor,
             "current_user": current_user
         }
-    )
+    )))
 
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
+    return {
+        "status": "ok",
+        "cache": page_cache.stats.as_dict(),
+        "compression": compression_stats,
+        "templates": render_stats.as_dict(),
+        "reaction_counters": reaction_counters.stats,
+        "pool": {
+            "sync": pool_stats(engine),
+            "async": pool_stats(async_engine.sync_engine),
+        },
+    }
+
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics_endpoint():
+    if not settings.METRICS_ENABLED:
+        raise HTTPException(status_code=404)
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/tags", response_class=HTMLResponse)
+async def tags_cloud(
+        request: Request,
+        db: AsyncSession = Depends(get_db),
+        current_user: Optional[models.User] = Depends(get_current_user_optional)
+):
+    version, last_modified = await async_crud.get_listing_version(db)
+    validators = Validators(request, version, getattr(current_user, "id", None), last_modified)
+    if validators.matches(request):
+        return validators.not_modified()
+
+    cache_key = anonymous_page_key(request, current_user, "posts", etag=validators.etag)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return validators.apply(cached)
+
+    try:
+        tags = await async_crud.tag_cloud(db)
+    except:
+        tags = []
+        cache_key = None
+
+    return validators.apply(store_page(cache_key, templates.TemplateResponse(
+        "tags.html",
+        {
+            "request": request,
+            "tags": tags,
+            "current_user": current_user
+        }
+    )))
 
 
 @app.get("/tag/{tag_name}", response_class=HTMLResponse)
@@ -144,32 +275,39 @@ async def posts_by_tag(
         request: Request,
         page: int = Query(1, ge=1),
         per_page: int = Query(10, ge=1, le=50),
-        db: Session = Depends(get_db),
+        cursor: Optional[str] = Query(None),
+        db: AsyncSession = Depends(get_db),
         current_user: Optional[models.User] = Depends(get_current_user_optional)
 ):
+    redirect = deep_page_redirect(request, page, per_page, cursor)
+    if redirect:
+        return redirect
+
+    version, last_modified = await async_crud.get_listing_version(db)
+    validators = Validators(request, version, getattr(current_user, "id", None), last_modified)
+    if validators.matches(request):
+        return validators.not_modified()
+
+    cache_key = anonymous_page_key(request, current_user, "posts", etag=validators.etag)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return validators.apply(cached)
+
     try:
         skip = (page - 1) * per_page
 
-        posts_list = db.query(models.Post) \
-            .join(models.Post.tags) \
-            .filter(models.Tag.name == tag_name) \
-            .order_by(models.Post.created_at.desc()) \
-            .offset(skip) \
-            .limit(per_page) \
-            .all()
-
-        total_posts = db.query(models.Post) \
-            .join(models.Post.tags) \
-            .filter(models.Tag.name == tag_name) \
-            .count()
+        posts_list, next_cursor = await async_crud.get_posts_by_tag(db, tag_name, skip=skip, limit=per_page, cursor=cursor)
+        total_posts = await async_crud.count_posts_by_tag(db, tag_name)
 
         total_pages = (total_posts + per_page - 1) // per_page
     except:
         posts_list = []
+        next_cursor = None
         total_posts = 0
         total_pages = 1
+        cache_key = None
 
-    return templates.TemplateResponse(
+    return validators.apply(store_page(cache_key, templates.TemplateResponse(
         "tag.html",
         {
              "request": request,
@@ -179,6 +317,7 @@ async def posts_by_tag(
             "page": page,
             "total_pages": total_pages,
             "per_page": per_page,
+            "next_cursor": next_cursor,
             "current_user": current_user
         }
-    )
+    )))
@@ -0,0 +1,284 @@
+"""Метрики процесса в текстовом формате Prometheus (GET /metrics).
+
+Запись идет без общих блокировок: у каждого потока свои ячейки
+(threading.local), а /metrics складывает их при чтении. Обработчики
+работают в потоке цикла событий, bcrypt и синхронный код - в своих
+потоках пула, и никто из них не ждет друг друга. Блокировка берется
+только при первой записи нового потока, чтобы зарегистрировать его ячейки.
+
+Значения - на процесс: при нескольких воркерах uvicorn каждый отдает
+свои, складывает их Prometheus.
+"""
+import threading
+import time
+from bisect import bisect_left
+from typing import Callable, Iterable, Tuple
+from sqlalchemy import event
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.database import pool_stats
+
+# Секунды: от быстрых попаданий в кэш до медленных страниц и bcrypt
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.5, 1.0)
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple) -> str:
+    if not names:
+        return ""
+    pairs = []
+    for name, value in zip(names, values):
+        value = str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+        pairs.append(f'{name}="{value}"')
+    return "{" + ",".join(pairs) + "}"
+
+
+def _format_value(value) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Registry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+
+class _Sharded:
+    """Ячейки значений по потокам: {значения меток: ячейка}."""
+
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._local = threading.local()
+        self._shards = []
+        self._register_lock = threading.Lock()
+        registry.register(self)
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._register_lock:
+                self._shards.append(shard)
+            return shard
+
+    def _merged(self) -> dict:
+        raise NotImplementedError
+
+
+class Counter(_Sharded):
+    type = "counter"
+
+    def inc(self, *labels, amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+    def _merged(self) -> dict:
+        total = {}
+        for shard in list(self._shards):
+            for labels, value in list(shard.items()):
+                total[labels] = total.get(labels, 0) + value
+        return total
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in sorted(self._merged().items()):
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_format_value(value)}"
+
+
+class Histogram(_Sharded):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value: float, *labels):
+        shard = self._shard()
+        row = shard.get(labels)
+        if row is None:
+            # Счетчики корзин (последняя - +Inf), затем сумма и число
+            row = shard[labels] = [0] * (len(self.buckets) + 3)
+        row[bisect_left(self.buckets, value)] += 1
+        row[-2] += value
+        row[-1] += 1
+
+    def _merged(self) -> dict:
+        total = {}
+        for shard in list(self._shards):
+            for labels, row in list(shard.items()):
+                merged = total.get(labels)
+                if merged is None:
+                    total[labels] = list(row)
+                else:
+                    for i, value in enumerate(row):
+                        merged[i] += value
+        return total
+
+    def samples(self) -> Iterable[str]:
+        bounds = self.buckets + (float("inf"),)
+        names = self.labels + ("le",)
+        for labels, row in sorted(self._merged().items()):
+            cumulative = 0
+            for bound, count in zip(bounds, row):
+                cumulative += count
+                yield f"{self.name}_bucket{_format_labels(names, labels + (_format_value(bound),))} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {_format_value(row[-2])}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {row[-1]}"
+
+
+class Collected:
+    """Значения, которые уже где-то посчитаны (пул, кэши): читаются
+    функцией collect в момент запроса /metrics."""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...], collect: Callable, type: str = "gauge"):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.collect = collect
+        self.type = type
+        registry.register(self)
+
+    def samples(self) -> Iterable[str]:
+        for labels, value in self.collect():
+            yield f"{self.name}{_format_labels(self.labels, tuple(labels))} {_format_value(value)}"
+
+
+http_requests = Counter(
+    "http_requests_total", "HTTP-запросы по маршруту и статусу", ("method", "route", "status")
+)
+http_request_duration = Histogram(
+    "http_request_duration_seconds", "Время ответа по шаблону маршрута", ("method", "route")
+)
+db_queries = Counter("db_queries_total", "Выполненные SQL-запросы", ("engine",))
+db_query_duration = Histogram(
+    "db_query_duration_seconds", "Время SQL-запроса", ("engine",), buckets=QUERY_BUCKETS
+)
+password_hash_duration = Histogram(
+    "password_hash_duration_seconds", "Время bcrypt в пуле потоков", ("operation",)
+)
+password_hash_rejected = Counter(
+    "password_hash_rejected_total", "Отказы из-за переполненной очереди bcrypt"
+)
+image_processing_duration = Histogram(
+    "image_processing_duration_seconds", "Нарезка вариантов изображения в пуле процессов"
+)
+image_processing_failures = Counter(
+    "image_processing_failures_total", "Изображения, которые не удалось нарезать"
+)
+upload_bytes = Counter("upload_bytes_total", "Байты сохраненных загрузок")
+uploads = Counter("uploads_total", "Загрузки файлов по результату", ("result",))
+
+_in_flight = 0
+Collected("http_requests_in_flight", "Запросы, которые обрабатываются сейчас", (),
+          lambda: [((), _in_flight)])
+
+
+def _route_template(scope: Scope) -> str:
+    # Шаблон маршрута, а не путь: /posts/{post_id}, а не /posts/17
+    route = scope.get("route")
+    if route is not None and getattr(route, "path", None):
+        return route.path
+    if scope["path"].startswith("/static/"):
+        return "/static"
+    return "<unmatched>"
+
+
+class MetricsMiddleware:
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        global _in_flight
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        _in_flight += 1
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _in_flight -= 1
+            route = _route_template(scope)
+            http_request_duration.observe(time.perf_counter() - started, scope["method"], route)
+            http_requests.inc(scope["method"], route, status)
+
+
+def instrument_engine(engine, name: str):
+    """Число и время SQL движка. Для AsyncEngine - его sync_engine."""
+
+    def before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+    def after(conn, cursor, statement, parameters, context, executemany):
+        db_query_duration.observe(time.perf_counter() - conn.info["metrics_started"].pop(), name)
+        db_queries.inc(name)
+
+    def failed(exception_context):
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("metrics_started"):
+            connection.info["metrics_started"].pop()
+            db_queries.inc(name)
+
+    event.listen(engine, "before_cursor_execute", before)
+    event.listen(engine, "after_cursor_execute", after)
+    event.listen(engine, "handle_error", failed)
+
+
+def collect_pools(engines: dict):
+    """Заполненность пулов соединений: {имя: engine}."""
+
+    def stats(field):
+        def collect():
+            for name, engine in engines.items():
+                values = pool_stats(engine)
+                if field in values:
+                    yield (name,), values[field]
+        return collect
+
+    for field, help in (
+        ("size", "Размер пула соединений"),
+        ("checked_out", "Соединения, выданные из пула"),
+        ("checked_in", "Свободные соединения в пуле"),
+        ("overflow", "Соединения сверх размера пула"),
+    ):
+        Collected(f"db_pool_{field}", help, ("engine",), stats(field))
+
+
+def collect_caches(caches: dict):
+    """Попадания и промахи кэшей: {имя: кэш со stats}."""
+
+    def stats(field):
+        return lambda: [((name,), getattr(cache.stats, field)) for name, cache in caches.items()]
+
+    for field in ("hits", "misses", "sets", "evictions"):
+        Collected(f"cache_{field}_total", f"Кэш: {field}", ("cache",), stats(field), type="counter")
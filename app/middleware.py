@@ -0,0 +1,286 @@
+import time
+import zlib
+from fastapi import HTTPException
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import PlainTextResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # без brotli остается только gzip
+    brotli = None
+
+
+def acceptable_encodings(accept_encoding: str, supported) -> list:
+    """Кодировки из supported, которые разрешает Accept-Encoding, от
+    предпочтительной к менее предпочтительной.
+
+    RFC 9110: q=0 (и 0.0, 0.000) запрещает кодировку, "*" задает вес всем
+    не перечисленным. Порядок - по убыванию q, при равенстве - как в supported.
+    """
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        weight = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    weight = float(value.strip())
+                except ValueError:
+                    weight = 0.0
+        weights[coding] = weight
+
+    default = weights.get("*", 0.0)
+    allowed = [(weights.get(coding, default), -i, coding) for i, coding in enumerate(supported)]
+    return [coding for weight, _, coding in sorted(allowed, reverse=True) if weight > 0]
+
+
+class UploadLimitMiddleware:
+    """Обрывает multipart-запросы больше max_body_size до разбора формы.
+
+    Starlette складывает файл во временный файл целиком еще до вызова
+    обработчика, поэтому проверка размера в обработчике опаздывает: сервер
+    уже принял и записал все 500 МБ. Здесь запрос отклоняется по
+    Content-Length сразу, а без него - как только принятые байты превысят
+    лимит.
+    """
+
+    def __init__(self, app: ASGIApp, max_body_size: int):
+        self.app = app
+        self.max_body_size = max_body_size
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        if not headers.get(b"content-type", b"").startswith(b"multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        content_length = headers.get(b"content-length")
+        if content_length and content_length.isdigit() and int(content_length) > self.max_body_size:
+            response = PlainTextResponse("Файл слишком большой", status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_size:
+                    # FastAPI пропускает HTTPException из разбора тела как есть
+                    raise HTTPException(413, "Файл слишком большой")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+# Общие для процесса счетчики сжатия (для /health)
+compression_stats = {"compressed": 0, "skipped_budget": 0, "bytes_in": 0, "bytes_out": 0}
+
+COMPRESSIBLE_TYPES = (
+    "text/", "application/json", "application/javascript", "application/xml", "image/svg+xml",
+)
+
+
+class CpuBudget:
+    """Сколько секунд процессора в окне window можно тратить на сжатие.
+
+    fraction=0.5 - не больше половины ядра. Когда бюджет исчерпан, новые
+    ответы уходят несжатыми до конца окна: лучше отдать лишние байты, чем
+    задерживать все запросы воркера.
+    """
+
+    def __init__(self, fraction: float, window: float = 1.0):
+        self.fraction = fraction
+        self.window = window
+        self.window_start = time.perf_counter()
+        self.spent = 0.0
+
+    def available(self) -> bool:
+        if self.fraction <= 0:
+            return True
+        now = time.perf_counter()
+        if now - self.window_start >= self.window:
+            self.window_start = now
+            self.spent = 0.0
+        return self.spent < self.fraction * self.window
+
+    def spend(self, seconds: float):
+        self.spent += seconds
+
+
+class _GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def chunk(self, data: bytes) -> bytes:
+        # Z_SYNC_FLUSH отдает клиенту все, что накоплено, не закрывая поток
+        return self._compressor.compress(data) + self._compressor.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.compress(data) + self._compressor.flush()
+
+
+class _BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def chunk(self, data: bytes) -> bytes:
+        return self._compressor.process(data) + self._compressor.flush()
+
+    def finish(self, data: bytes = b"") -> bytes:
+        return self._compressor.process(data) + self._compressor.finish()
+
+
+class CompressionMiddleware:
+    """gzip/brotli для ответов приложения.
+
+    Не сжимает ответы меньше minimum_size, уже сжатые (Content-Encoding)
+    и нетекстовые типы - картинки и архивы от этого только растут. Потоковые
+    ответы сжимаются по частям со сбросом буфера после каждой части, так что
+    клиент получает начало страницы сразу.
+    """
+
+    def __init__(self, app: ASGIApp, minimum_size: int = 1024, gzip_level: int = 6,
+                 brotli_quality: int = 4, cpu_budget: float = 0.0):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.budget = CpuBudget(cpu_budget)
+        self.stats = compression_stats
+
+    def _choose_encoding(self, accept_encoding: str):
+        encodings = acceptable_encodings(accept_encoding, ("br", "gzip") if brotli is not None else ("gzip",))
+        return encodings[0] if encodings else None
+
+    def _encoder(self, encoding: str):
+        if encoding == "br":
+            return _BrotliEncoder(self.brotli_quality)
+        return _GzipEncoder(self.gzip_level)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        encoding = self._choose_encoding(Headers(scope=scope).get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        compress = self.budget.available()
+        if not compress:
+            self.stats["skipped_budget"] += 1
+        await self.app(scope, receive, _CompressingSender(self, encoding, send, compress))
+
+
+class _CompressingSender:
+    def __init__(self, middleware: CompressionMiddleware, encoding: str, send: Send,
+                 compress: bool = True):
+        self.middleware = middleware
+        self.encoding = encoding
+        self.send = send
+        self.start_message = None
+        self.buffer = b""
+        self.encoder = None
+        self.passthrough = not compress
+
+    def _compressible(self, headers: MutableHeaders) -> bool:
+        if self.start_message["status"] != 200 or "content-encoding" in headers:
+            return False
+        content_type = headers.get("content-type", "")
+        return content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def _timed(self, fn, data: bytes) -> bytes:
+        started = time.perf_counter()
+        result = fn(data)
+        self.middleware.budget.spend(time.perf_counter() - started)
+        stats = self.middleware.stats
+        stats["bytes_in"] += len(data)
+        stats["bytes_out"] += len(result)
+        return result
+
+    @staticmethod
+    def _weaken(headers: MutableHeaders):
+        headers.add_vary_header("Accept-Encoding")
+        # Сжатое представление побайтно другое: сильный ETag становится слабым
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["etag"] = "W/" + etag
+
+    async def _start(self, headers: MutableHeaders, content_length=None):
+        headers["content-encoding"] = self.encoding
+        if content_length is None:
+            del headers["content-length"]
+        else:
+            headers["content-length"] = str(content_length)
+        self._weaken(headers)
+        self.start_message["headers"] = headers.raw
+        self.middleware.stats["compressed"] += 1
+        await self.send(self.start_message)
+
+    async def __call__(self, message: Message):
+        if message["type"] == "http.response.start":
+            if message["status"] == 304:
+                # 304 обновляет заголовки сохраненного сжатого ответа: ETag
+                # должен совпасть с тем, что ушел с 200, иначе кэш считает
+                # копию другой версией
+                headers = MutableHeaders(raw=message["headers"])
+                self._weaken(headers)
+                message["headers"] = headers.raw
+                self.passthrough = True
+                await self.send(message)
+                return
+            if self.passthrough:
+                # Бюджет исчерпан: ответ уходит как есть
+                await self.send(message)
+                return
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body" or self.passthrough:
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+        headers = MutableHeaders(raw=self.start_message["headers"])
+
+        if self.encoder is None:
+            if not self.buffer and not self._compressible(headers):
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+            self.buffer += body
+            if more_body and len(self.buffer) < self.middleware.minimum_size:
+                return
+            if not more_body and len(self.buffer) < self.middleware.minimum_size:
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": self.buffer, "more_body": more_body})
+                return
+
+            self.encoder = self.middleware._encoder(self.encoding)
+            body, self.buffer = self.buffer, b""
+            if not more_body:
+                compressed = self._timed(self.encoder.finish, body)
+                await self._start(headers, len(compressed))
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            await self._start(headers)
+
+        if more_body:
+            chunk = self._timed(self.encoder.chunk, body)
+        else:
+            chunk = self._timed(self.encoder.finish, body)
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
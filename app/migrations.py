@@ -0,0 +1,28 @@
+"""Схема базы ведется миграциями Alembic (alembic/versions).
+
+При DB_AUTO_MIGRATE приложение само выполняет upgrade head на старте -
+так работает локальная SQLite-база без лишних шагов. Там, где воркеров
+или реплик несколько, автозапуск выключают и выполняют
+
+    alembic upgrade head
+
+одним шагом деплоя до старта приложения (см. docker-compose.yml).
+"""
+import os
+from alembic import command
+from alembic.config import Config
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def alembic_config(connection=None) -> Config:
+    config = Config(os.path.join(ROOT, "alembic.ini"))
+    config.set_main_option("script_location", os.path.join(ROOT, "alembic"))
+    if connection is not None:
+        config.attributes["connection"] = connection
+    return config
+
+
+def upgrade(engine, revision: str = "head"):
+    with engine.begin() as connection:
+        command.upgrade(alembic_config(connection), revision)
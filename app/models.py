@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Table, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Index, PrimaryKeyConstraint, Table, UniqueConstraint
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.database import Base
@@ -6,8 +6,11 @@ from app.database import Base
 post_tags = Table(
     'post_tags',
     Base.metadata,
-    Column('post_id', Integer, ForeignKey('posts.id')),
-    Column('tag_id', Integer, ForeignKey('tags.id'))
+    Column('post_id', Integer, ForeignKey('posts.id'), primary_key=True),
+    Column('tag_id', Integer, ForeignKey('tags.id'), primary_key=True),
+    PrimaryKeyConstraint('post_id', 'tag_id', name='pk_post_tags'),
+    # Первичный ключ начинается с post_id; посты тега ищутся по этому индексу
+    Index('ix_post_tags_tag_id_post_id', 'tag_id', 'post_id'),
 )
 
 
@@ -18,6 +21,8 @@ class Tag(Base):
     name = Column(String, unique=True, index=True, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    posts_count = Column(Integer, nullable=False, default=0, server_default="0", index=True)
+
     posts = relationship("Post", secondary=post_tags, back_populates="tags")
 
 class User(Base):
@@ -30,12 +35,22 @@ class User(Base):
     is_active = Column(Boolean, default=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
+    posts_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    dislikes_count = Column(Integer, nullable=False, default=0, server_default="0")
+
     posts = relationship("Post", back_populates="author")
 
 
 class Post(Base):
     __tablename__ = "posts"
-    __table_args__ = {'extend_existing': True}
+    __table_args__ = (
+        # Главная и профиль: ORDER BY created_at DESC, id DESC
+        Index("ix_posts_created_id", "created_at", "id"),
+        Index("ix_posts_author_created_id", "author_id", "created_at", "id"),
+        {'extend_existing': True},
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     title = Column(String, nullable=False)
@@ -45,12 +60,20 @@ class Post(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
 
+    likes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    dislikes_count = Column(Integer, nullable=False, default=0, server_default="0")
+    comments_count = Column(Integer, nullable=False, default=0, server_default="0")
+
     author = relationship("User", back_populates="posts")
     tags = relationship("Tag", secondary=post_tags, back_populates="posts")
     comments = relationship("Comment", back_populates="post", cascade="all, delete-orphan")
     reactions = relationship("Reaction", back_populates="post", cascade="all, delete-orphan")
 
 
+# Версия лент (crud.get_listing_version): время последней правки
+Index("ix_posts_modified_at", func.coalesce(Post.updated_at, Post.created_at))
+
+
 class Comment(Base):
     __tablename__ = "comments"
 
@@ -65,6 +88,12 @@ class Comment(Base):
     author = relationship("User")
     post = relationship("Post", back_populates="comments")
 
+    # Комментарии поста и комментарии в профиле: ORDER BY created_at DESC, id DESC
+    __table_args__ = (
+        Index("ix_comments_post_created_id", "post_id", "created_at", "id"),
+        Index("ix_comments_author_created_id", "author_id", "created_at", "id"),
+    )
+
 
 class Reaction(Base):
     __tablename__ = "reactions"
@@ -75,9 +104,20 @@ class Reaction(Base):
     is_like = Column(Boolean, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
-    __table_args__ = (UniqueConstraint('post_id', 'user_id', name='uq_post_user_reaction'),)
+    __table_args__ = (
+        UniqueConstraint('post_id', 'user_id', name='uq_post_user_reaction'),
+        # Лайки в профиле: WHERE user_id = ? AND is_like ORDER BY created_at DESC, id DESC
+        Index("ix_reactions_user_like_created_id", "user_id", "is_like", "created_at", "id"),
+    )
 
     post = relationship("Post", back_populates="reactions")
     user = relationship("User")
 
+
+class SiteCounter(Base):
+    __tablename__ = "site_counters"
+
+    name = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0, server_default="0")
+
 reactions = relationship("Reaction", back_populates="post", cascade="all, delete-orphan")
\ No newline at end of file
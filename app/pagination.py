@@ -0,0 +1,116 @@
+import base64
+import json
+import math
+from collections import namedtuple
+from datetime import datetime
+from typing import Optional, Tuple, Union
+from sqlalchemy import String, literal, tuple_
+from starlette.requests import Request
+from starlette.responses import RedirectResponse
+from app.config import settings
+
+Page = namedtuple("Page", ["items", "next_cursor"])
+CursorKey = Union[datetime, float]
+
+# Курсор приходит от клиента: числа вне BIGINT драйвер не примет
+_INT_MIN, _INT_MAX = -2 ** 63, 2 ** 63 - 1
+
+
+class OffsetTooDeep(ValueError):
+    """OFFSET дальше MAX_OFFSET_PAGE страниц: дальше листают курсором."""
+
+
+def _is_int(value) -> bool:
+    return isinstance(value, int) and not isinstance(value, bool) and _INT_MIN <= value <= _INT_MAX
+
+
+def encode_cursor(key: CursorKey, row_id: int) -> str:
+    if isinstance(key, datetime):
+        key = key.isoformat()
+    payload = json.dumps([key, row_id], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: Optional[str]) -> Optional[Tuple[CursorKey, int]]:
+    if not cursor:
+        return None
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        key, row_id = json.loads(base64.urlsafe_b64decode(padded))
+        if isinstance(key, str):
+            key = datetime.fromisoformat(key)
+        elif isinstance(key, float):
+            if not math.isfinite(key):
+                return None
+        elif not _is_int(key):
+            return None
+        if not _is_int(row_id):
+            return None
+        return key, row_id
+    except (ValueError, TypeError, OverflowError):
+        return None
+
+
+def needs_cursor(skip: int, limit: int, cursor: Optional[str]) -> bool:
+    """Страница глубже MAX_OFFSET_PAGE, а рабочего курсора нет."""
+    return skip >= settings.MAX_OFFSET_PAGE * limit and decode_cursor(cursor) is None
+
+
+def deep_page_redirect(request: Request, page: int, per_page: int,
+                       cursor: Optional[str]) -> Optional[RedirectResponse]:
+    """Редирект HTML-списка с ?page=N без курсора на последнюю страницу,
+    доступную по номеру: оттуда пагинатор ведет дальше по курсору."""
+    if not needs_cursor((page - 1) * per_page, per_page, cursor):
+        return None
+    url = request.url.remove_query_params("cursor").include_query_params(page=settings.MAX_OFFSET_PAGE)
+    return RedirectResponse(f"{url.path}?{url.query}", status_code=302)
+
+
+def _bind_key(query, value: CursorKey):
+    if not isinstance(value, datetime):
+        return literal(value)
+    # SQLite хранит server_default now() строкой без микросекунд, а обычный
+    # биндинг DateTime всегда дописывает ".000000" - сравнение строк на
+    # границе страницы съедало бы записи с той же секундой.
+    if query.session.get_bind().dialect.name == "sqlite":
+        text = value.strftime("%Y-%m-%d %H:%M:%S")
+        if value.microsecond:
+            text += f".{value.microsecond:06d}"
+        return literal(text, String)
+    return literal(value)
+
+
+def paginate(query, key_col, id_col, skip: int = 0, limit: int = 10,
+             cursor: Optional[str] = None) -> Page:
+    """Страница записей по убыванию (key_col, id).
+
+    key_col - обычно created_at, для поиска - релевантность. С курсором
+    используется keyset-фильтр вместо OFFSET, поэтому глубина страницы не
+    влияет на стоимость запроса. Без курсора OFFSET допускается только на
+    первые MAX_OFFSET_PAGE страниц - дальше OffsetTooDeep, а не просмотр
+    всей ленты. Обработчики проверяют это заранее (needs_cursor).
+    """
+
+    query = query.add_columns(key_col.label("page_key"), id_col) \
+        .order_by(key_col.desc(), id_col.desc())
+
+    position = decode_cursor(cursor)
+    if position:
+        key, row_id = position
+        query = query.filter(
+            tuple_(key_col, id_col) < tuple_(_bind_key(query, key), literal(row_id))
+        )
+    elif skip >= settings.MAX_OFFSET_PAGE * limit:
+        raise OffsetTooDeep(skip)
+    elif skip:
+        query = query.offset(skip)
+
+    rows = query.limit(limit + 1).all()
+    items = [row[0] for row in rows[:limit]]
+
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(last[-2], last[-1])
+
+    return Page(items, next_cursor)
@@ -0,0 +1,176 @@
+"""Профиль запроса: сколько SQL выполнено, сколько они заняли, сколько
+ушло на шаблоны.
+
+Включается PROFILE_REQUESTS. Тогда у каждого ответа есть заголовок
+
+    Server-Timing: db;dur=12.4;desc="7 queries", tpl;dur=3.1, app;dur=21.8
+
+(виден во вкладке Network браузера), а в лог app.profiling по каждому
+запросу пишется JSON-строка с теми же числами и самым медленным SQL.
+У потоковых страниц заголовок уходит вместе с началом ответа и учитывает
+только то, что выполнено до него; строка лога - весь запрос целиком.
+
+SLOW_QUERY_MS > 0 независимо от этого пишет в лог каждый SQL дольше
+порога: текст и типы параметров, но не сами значения.
+"""
+import json
+import logging
+import time
+from contextvars import ContextVar
+from typing import Optional
+from sqlalchemy import event
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RequestProfile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.slowest_time = 0.0
+        self.slowest_sql: Optional[str] = None
+
+    def add_query(self, statement: str, seconds: float):
+        self.queries += 1
+        self.db_time += seconds
+        if seconds > self.slowest_time:
+            self.slowest_time = seconds
+            self.slowest_sql = statement
+
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    def server_timing(self) -> str:
+        return ", ".join((
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries"',
+            f"db-slowest;dur={self.slowest_time * 1000:.1f}",
+            f"tpl;dur={self.template_time * 1000:.1f}",
+            f"app;dur={self.elapsed() * 1000:.1f}",
+        ))
+
+
+# Профиль текущего запроса. Синхронные обработчики и run_sync получают
+# копию контекста, но объект в ней тот же, поэтому их SQL тоже учитывается.
+_current: ContextVar[Optional[RequestProfile]] = ContextVar("request_profile", default=None)
+
+
+def current_profile() -> Optional[RequestProfile]:
+    return _current.get()
+
+
+def record_template(seconds: float):
+    profile = _current.get()
+    if profile is not None:
+        profile.template_time += seconds
+
+
+def parameter_shape(parameters, executemany: bool = False):
+    """Типы параметров без значений: в них бывают пароли и личные данные."""
+    if executemany:
+        rows = list(parameters or ())
+        return {"rows": len(rows), "row": parameter_shape(rows[0]) if rows else None}
+    if isinstance(parameters, dict):
+        return {name: type(value).__name__ for name, value in parameters.items()}
+    if isinstance(parameters, (list, tuple)):
+        return [type(value).__name__ for value in parameters]
+    return type(parameters).__name__
+
+
+def _compact(statement: str) -> str:
+    return " ".join(statement.split())
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = conn.info["query_started"].pop()
+    seconds = time.perf_counter() - started
+
+    profile = _current.get()
+    if profile is not None:
+        profile.add_query(statement, seconds)
+
+    if settings.SLOW_QUERY_MS and seconds * 1000 >= settings.SLOW_QUERY_MS:
+        logger.warning(json.dumps({
+            "event": "slow_query",
+            "duration_ms": round(seconds * 1000, 1),
+            "sql": _compact(statement),
+            "params": parameter_shape(parameters, executemany),
+        }, ensure_ascii=False))
+
+
+def _handle_error(exception_context):
+    # Упавший запрос не доходит до after_cursor_execute
+    connection = exception_context.connection
+    if connection is not None and connection.info.get("query_started"):
+        connection.info["query_started"].pop()
+
+
+def configure_logging():
+    """JSON-строки профиля - в stderr, если логирование не настроено иначе."""
+    if logger.handlers or logging.getLogger().handlers:
+        logger.setLevel(logging.INFO)
+        return
+    handler = logging.StreamHandler()
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+def instrument(*engines):
+    """Подписывается на события движков. Для AsyncEngine нужен его sync_engine."""
+    for engine in engines:
+        if not event.contains(engine, "before_cursor_execute", _before_cursor_execute):
+            event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+            event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+            event.listen(engine, "handle_error", _handle_error)
+
+
+class ProfilingMiddleware:
+    """Заводит профиль на каждый HTTP-запрос, добавляет Server-Timing и
+    пишет итог в лог после отправки ответа."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        profile = RequestProfile()
+        token = _current.set(profile)
+        status = None
+
+        async def send_with_timing(message: Message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                headers = MutableHeaders(scope=message)
+                headers.append("Server-Timing", profile.server_timing())
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _current.reset(token)
+            logger.info(json.dumps({
+                "event": "request",
+                "method": scope["method"],
+                "path": scope["path"],
+                "status": status,
+                "duration_ms": round(profile.elapsed() * 1000, 1),
+                "queries": profile.queries,
+                "db_ms": round(profile.db_time * 1000, 1),
+                "template_ms": round(profile.template_time * 1000, 1),
+                "slowest_ms": round(profile.slowest_time * 1000, 1),
+                "slowest_sql": _compact(profile.slowest_sql) if profile.slowest_sql else None,
+            }, ensure_ascii=False))
@@ -1,14 +1,13 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from datetime import timedelta
-from app.database import get_db
-from app import schemas, crud, auth
+from app.dependencies import get_db
+from app import schemas, async_crud, auth
 from app.config import settings
+from app.templating import templates
 
 router = APIRouter(prefix="", tags=["auth"])
-templates = Jinja2Templates(directory="app/templates")
 
 @router.get("/register", response_class=HTMLResponse)
 async def register_page(request: Request):
@@ -21,7 +20,7 @@ async def register(
         username: str = Form(...),
         password: str = Form(...),
         confirm_password: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     errors = []
 
@@ -31,10 +30,10 @@ async def register(
     if len(password) < 6:
         errors.append("Пароль должен быть не менее 6 символов")
 
-    if crud.get_user_by_email(db, email):
+    if await async_crud.get_user_by_email(db, email):
         errors.append("Пользователь с таким email уже существует")
 
-    if crud.get_user_by_username(db, username):
+    if await async_crud.get_user_by_username(db, username):
         errors.append("Пользователь с таким именем уже существует")
 
     if errors:
@@ -48,7 +47,7 @@ async def register(
         username=username,
         password=password
     )
-    crud.create_user(db, user_create)
+    await async_crud.create_user(db, user_create)
 
     response = RedirectResponse(url="/login", status_code=status.HTTP_302_FOUND)
     return response
@@ -63,9 +62,9 @@ async def login(
         request: Request,
         email: str = Form(...),
         password: str = Form(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
-    user = crud.authenticate_user(db, email, password)
+    user = await async_crud.authenticate_user(db, email, password)
     if not user:
         return templates.TemplateResponse(
             "login.html",
@@ -73,7 +72,7 @@ async def login(
         )
 
     access_token = auth.create_access_token(
-        data={"sub": user.username},
+        data={"sub": user.username, "uid": user.id},
         expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
     )
 
@@ -1,26 +1,53 @@
-from fastapi import APIRouter, Depends, HTTPException, status, Request, Form
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, status, Request, Form, Query, Response
 from fastapi.responses import RedirectResponse, HTMLResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.dependencies import get_db, get_current_user
-from app import crud, schemas, models
+from app import async_crud, schemas, models
+from app.config import settings
+from app.http_cache import Validators
 
 router = APIRouter(tags=["comments"])
 
 
+@router.get("/posts/{post_id}/comments", response_model=schemas.CommentPage)
+async def read_comments_api(
+        post_id: int,
+        request: Request,
+        response: Response,
+        limit: int = Query(settings.COMMENTS_PAGE_SIZE, ge=1, le=100),
+        cursor: Optional[str] = Query(None),
+        db: AsyncSession = Depends(get_db)
+):
+    # Версия поста учитывает последний комментарий, поэтому годится и здесь
+    version = await async_crud.get_post_version(db, post_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Пост не найден")
+    validators = Validators(request, version[0], last_modified=version[1], vary_cookie=False)
+    if validators.matches(request):
+        return validators.not_modified()
+
+    comments, next_cursor = await async_crud.get_comments_by_post(db, post_id, limit, cursor)
+    response.headers.update(validators.headers())
+    if next_cursor:
+        response.headers["Link"] = f'</posts/{post_id}/comments?limit={limit}&cursor={next_cursor}>; rel="next"'
+    return schemas.CommentPage(items=comments, next_cursor=next_cursor)
+
+
 @router.post("/posts/{post_id}/comments/")
 async def create_comment(
         post_id: int,
         request: Request,
         content: str = Form(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    post = crud.get_post(db, post_id)
+    post = await async_crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Пост не найден")
 
     comment_create = schemas.CommentCreate(content=content)
-    crud.create_comment(db, comment_create, current_user.id, post_id)
+    await async_crud.create_comment(db, comment_create, current_user.id, post_id)
 
     return RedirectResponse(url=f"/posts/{post_id}", status_code=status.HTTP_303_SEE_OTHER)
 
@@ -30,16 +57,16 @@ async def delete_comment(
         post_id: int,
         comment_id: int,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    comment = crud.get_comment(db, comment_id)
+    comment = await async_crud.get_comment(db, comment_id)
     if not comment:
         raise HTTPException(status_code=404, detail="Комментарий не найден")
 
     if comment.author_id != current_user.id:
         raise HTTPException(status_code=403, detail="Недостаточно прав")
 
-    crud.delete_comment(db, comment_id, current_user.id)
+    await async_crud.delete_comment(db, comment_id, current_user.id)
 
     return RedirectResponse(url=f"/posts/{post_id}", status_code=status.HTTP_303_SEE_OTHER)
\ No newline at end of file
@@ -1,65 +1,98 @@
 from typing import Optional
-import os
-import shutil
 from fastapi import APIRouter, Depends, HTTPException, status, Query, Request, Form, File, UploadFile
-from app.config import settings
-from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
-from app import schemas, crud, models
+from fastapi.responses import HTMLResponse, RedirectResponse, Response
+from sqlalchemy.ext.asyncio import AsyncSession
+from app import schemas, async_crud, models
 from app.dependencies import get_db, get_current_user, get_current_user_optional
+from app.cache import anonymous_page_key, get_cached_page, store_page, post_tag
+from app.http_cache import Validators
+from app.pagination import needs_cursor
+from app.utils.file_upload import save_upload_file
+from app.templating import templates, render_block, stream_page
+from app.config import settings
 
 router = APIRouter(prefix="", tags=["posts"])
-templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/posts/", response_model=list[schemas.PostWithAuthor])
-def read_posts_api(
+async def read_posts_api(
+        request: Request,
+        response: Response,
         skip: int = Query(0, ge=0),
         limit: int = Query(10, ge=1, le=100),
-        db: Session = Depends(get_db)
+        cursor: Optional[str] = Query(None),
+        db: AsyncSession = Depends(get_db)
 ):
-    posts = crud.get_posts(db, skip=skip, limit=limit)
+    if needs_cursor(skip, limit, cursor):
+        raise HTTPException(
+            status_code=400,
+            detail=f"skip must be less than {settings.MAX_OFFSET_PAGE} pages; "
+                   f"use cursor from X-Next-Cursor for deeper pages",
+        )
+
+    version, last_modified = await async_crud.get_listing_version(db)
+    validators = Validators(request, version, last_modified=last_modified, vary_cookie=False)
+    if validators.matches(request):
+        return validators.not_modified()
+
+    posts, next_cursor = await async_crud.get_posts(db, skip=skip, limit=limit, cursor=cursor)
+    response.headers.update(validators.headers())
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+        response.headers["Link"] = f'</posts/?limit={limit}&cursor={next_cursor}>; rel="next"'
     return posts
 
 
 @router.post("/posts/", response_model=schemas.PostOut)
-def create_post_api(
+async def create_post_api(
         post: schemas.PostCreate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    return crud.create_post(db=db, post=post, author_id=current_user.id)
+    return await async_crud.create_post(db, post, current_user.id)
 
 
 @router.get("/posts/{post_id}/api", response_model=schemas.PostWithAuthor)
-def read_post_api(post_id: int, db: Session = Depends(get_db)):
-    db_post = crud.get_post(db, post_id=post_id)
+async def read_post_api(
+        post_id: int,
+        request: Request,
+        response: Response,
+        db: AsyncSession = Depends(get_db)
+):
+    version = await async_crud.get_post_version(db, post_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Post not found")
+    validators = Validators(request, version[0], last_modified=version[1], vary_cookie=False)
+    if validators.matches(request):
+        return validators.not_modified()
+
+    db_post = await async_crud.get_post(db, post_id=post_id)
     if db_post is None:
         raise HTTPException(status_code=404, detail="Post not found")
+    response.headers.update(validators.headers())
     return db_post
 
 
 @router.put("/posts/{post_id}", response_model=schemas.PostOut)
-def update_post_api(
+async def update_post_api(
         post_id: int,
         post_update: schemas.PostUpdate,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    db_post = crud.update_post(db, post_id, post_update, current_user.id)
+    db_post = await async_crud.update_post(db, post_id, post_update, current_user.id)
     if db_post is None:
         raise HTTPException(status_code=404, detail="Post not found or not authorized")
     return db_post
 
 
 @router.delete("/posts/{post_id}")
-def delete_post_api(
+async def delete_post_api(
         post_id: int,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    success = crud.delete_post(db, post_id, current_user.id)
+    success = await async_crud.delete_post(db, post_id, current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Post not found or not authorized")
     return {"message": "Post deleted successfully"}
@@ -68,7 +101,7 @@ def delete_post_api(
 @router.get("/posts/create", response_class=HTMLResponse)
 async def create_post_page(
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: Optional[models.User] = Depends(get_current_user_optional)
 ):
     if not current_user:
@@ -85,7 +118,7 @@ async def create_post(
         content: str = Form(...),
         tags: str = Form(""),
         image: UploadFile = File(None),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
 
@@ -94,15 +127,7 @@ async def create_post(
     image_filename = None
 
     if image and image.filename:
-        os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
-
-        import uuid
-        file_ext = os.path.splitext(image.filename)[1]
-        image_filename = f"{uuid.uuid4()}{file_ext}"
-        file_path = os.path.join(settings.UPLOAD_DIR, image_filename)
-
-        with open(file_path, "wb") as buffer:
-            shutil.copyfileobj(image.file, buffer)
+        image_filename = await save_upload_file(image)
 
     post_create = schemas.PostCreate(
         title=title,
@@ -110,7 +135,7 @@ async def create_post(
         tags=tag_list,
         image_filename=image_filename
     )
-    crud.create_post(db, post_create, current_user.id, image_filename)
+    await async_crud.create_post(db, post_create, current_user.id, image_filename)
     return RedirectResponse(url="/", status_code=status.HTTP_302_FOUND)
 
 
@@ -118,35 +143,64 @@ async def create_post(
 async def read_post(
         post_id: int,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: Optional[models.User] = Depends(get_current_user_optional)
 ):
-    post = crud.get_post(db, post_id)
+    version = await async_crud.get_post_version(db, post_id)
+    if version is None:
+        raise HTTPException(status_code=404, detail="Пост не найден")
+    # Счетчики реакций пишутся с задержкой, поэтому своя реакция
+    # пользователя входит в версию отдельно
+    user_reaction = await async_crud.get_user_reaction(db, post_id, current_user.id) if current_user else None
+    validators = Validators(request, (version[0], user_reaction), getattr(current_user, "id", None), version[1])
+    if validators.matches(request):
+        return validators.not_modified()
+
+    cache_key = anonymous_page_key(request, current_user, post_tag(post_id), etag=validators.etag)
+    cached = get_cached_page(cache_key)
+    if cached:
+        return validators.apply(cached)
+
+    post = await async_crud.get_post(db, post_id)
     if not post:
         raise HTTPException(status_code=404, detail="Пост не найден")
 
-    comments = crud.get_comments_by_post(db, post_id)
-    reactions = crud.get_post_reactions(db, post_id)
-    user_reaction = crud.get_user_reaction(db, post_id, current_user.id) if current_user else None
+    reactions = await async_crud.get_post_reactions(db, post_id)
 
-    return templates.TemplateResponse("post_detail.html", {
+    # Пост и форма уходят клиенту сразу, комментарии - по мере выборки
+    response = stream_page("post_detail.html", {
         "request": request,
         "post": post,
-        "comments": comments,
         "reactions": reactions,
         "user_reaction": user_reaction,
         "current_user": current_user
-    })
+    }, comments=_comment_chunks(db, post, current_user))
+    return validators.apply(store_page(cache_key, response))
+
+
+async def _comment_chunks(db: AsyncSession, post: models.Post, current_user: Optional[models.User]):
+    # Сессия запроса живет до конца отправки ответа (FastAPI < 0.106).
+    # Здесь только первая страница, остальные подгружает main.js
+    context = {"post": post, "current_user": current_user}
+    listing = {"next_cursor": None}
+    yield render_block("_comments.html", "list_start", context)
+    empty = True
+    async for batch in async_crud.stream_comments_by_post(
+            db, post.id, settings.COMMENTS_PAGE_SIZE, settings.COMMENTS_STREAM_BATCH, listing):
+        empty = False
+        yield render_block("_comments.html", "items", dict(context, comments=batch))
+    yield render_block("_comments.html", "list_end",
+                       dict(context, empty=empty, next_cursor=listing["next_cursor"]))
 
 
 @router.get("/posts/{post_id}/edit", response_class=HTMLResponse)
 async def edit_post_page(
         post_id: int,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    post = crud.get_post(db, post_id)
+    post = await async_crud.get_post(db, post_id)
     if not post or post.author_id != current_user.id:
         raise HTTPException(status_code=404, detail="Пост не найден или недостаточно прав")
 
@@ -162,11 +216,11 @@ async def edit_post(
         request: Request,
         title: str = Form(...),
         content: str = Form(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
     post_update = schemas.PostUpdate(title=title, content=content)
-    db_post = crud.update_post(db, post_id, post_update, current_user.id)
+    db_post = await async_crud.update_post(db, post_id, post_update, current_user.id)
     if not db_post:
         raise HTTPException(status_code=404, detail="Пост не найден или недостаточно прав")
 
@@ -177,10 +231,10 @@ async def edit_post(
 async def delete_post_handler(
         post_id: int,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    success = crud.delete_post(db, post_id, current_user.id)
+    success = await async_crud.delete_post(db, post_id, current_user.id)
     if not success:
         raise HTTPException(status_code=404, detail="Пост не найден или недостаточно прав")
 
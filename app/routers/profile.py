@@ -1,14 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Form
+from fastapi import APIRouter, Depends, HTTPException, Request, Form, Query
 from fastapi.responses import HTMLResponse, RedirectResponse
-from fastapi.templating import Jinja2Templates
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import Optional
 from app.dependencies import get_db, get_current_user, get_current_user_optional
-from app import crud, models, auth
-from app.auth import verify_password, get_password_hash
+from app import async_crud, models, auth
+from app.auth import verify_password_async, get_password_hash_async
+from app.pagination import deep_page_redirect
+from app.templating import templates, stream_page
 
 router = APIRouter(prefix="", tags=["profile"])
-templates = Jinja2Templates(directory="app/templates")
 
 
 @router.get("/profile/{username}", response_class=HTMLResponse)
@@ -16,57 +16,63 @@ async def user_profile(
         username: str,
         request: Request,
         tab: str = "posts",  # posts, liked, comments
-        page: int = 1,
-        per_page: int = 10,
-        db: Session = Depends(get_db),
+        page: int = Query(1, ge=1),
+        per_page: int = Query(10, ge=1, le=50),
+        cursor: Optional[str] = Query(None),
+        db: AsyncSession = Depends(get_db),
         current_user: Optional[models.User] = Depends(get_current_user_optional)
 ):
+    redirect = deep_page_redirect(request, page, per_page, cursor)
+    if redirect:
+        return redirect
 
-    user = crud.get_user_by_username(db, username)
+    user = await async_crud.get_user_by_username(db, username)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    stats = get_user_stats(db, user.id)
+    stats = get_user_stats(user)
 
 
-    data = []
-    total_items = 0
-
-    if tab == "posts":
-        skip = (page - 1) * per_page
-        data = get_user_posts(db, user.id, skip, per_page)
-        total_items = stats["posts_count"]
-    elif tab == "liked":
-        skip = (page - 1) * per_page
-        data = get_user_liked_posts(db, user.id, skip, per_page)
-        total_items = stats["likes_given"]
-    elif tab == "comments":
-        skip = (page - 1) * per_page
-        data = get_user_comments(db, user.id, skip, per_page)
-        total_items = stats["comments_count"]
-
+    total_items = {"posts": stats["posts_count"], "liked": stats["likes_given"],
+                   "comments": stats["comments_count"]}.get(tab, 0)
     total_pages = (total_items + per_page - 1) // per_page if total_items > 0 else 1
 
     is_owner = current_user and current_user.id == user.id
 
-    return templates.TemplateResponse("profile.html", {
+    # Шапка профиля уходит сразу, список вкладки - когда выполнится запрос.
+    # next_cursor нужен пагинатору после списка, поэтому передается через listing
+    listing = {"next_cursor": None}
+    items = _tab_items(db, user.id, tab, (page - 1) * per_page, per_page, cursor, listing)
+    return stream_page("profile.html", {
         "request": request,
         "profile_user": user,
         "current_user": current_user,
         "is_owner": is_owner,
         "tab": tab,
-        "data": data,
         "stats": stats,
         "page": page,
         "per_page": per_page,
         "total_pages": total_pages,
-    })
+        "listing": listing,
+    }, items=items)
+
+
+async def _tab_items(db: AsyncSession, user_id: int, tab: str, skip: int, per_page: int,
+                     cursor: Optional[str], listing: dict):
+    data = []
+    if tab == "posts":
+        data, listing["next_cursor"] = await async_crud.get_user_posts(db, user_id, skip, per_page, cursor)
+    elif tab == "liked":
+        data, listing["next_cursor"] = await async_crud.get_user_liked_posts(db, user_id, skip, per_page, cursor)
+    elif tab == "comments":
+        data, listing["next_cursor"] = await async_crud.get_user_comments(db, user_id, skip, per_page, cursor)
+    yield templates.get_template("_profile_items.html").render(tab=tab, data=data)
 
 
 @router.get("/profile", response_class=HTMLResponse)
 async def my_profile(
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
     return RedirectResponse(url=f"/profile/{current_user.username}", status_code=302)
@@ -89,10 +95,10 @@ async def change_password(
         current_password: str = Form(...),
         new_password: str = Form(...),
         confirm_password: str = Form(...),
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    if not verify_password(current_password, current_user.hashed_password):
+    if not await verify_password_async(current_password, current_user.hashed_password):
         return templates.TemplateResponse("change_password.html", {
             "request": request,
             "current_user": current_user,
@@ -106,60 +112,16 @@ async def change_password(
             "error": "Новые пароли не совпадают"
         })
 
-    current_user.hashed_password = get_password_hash(new_password)
-    db.commit()
+    hashed_password = await get_password_hash_async(new_password)
+    await async_crud.change_user_password(db, current_user.id, hashed_password)
 
     return RedirectResponse(url=f"/profile/{current_user.username}?message=Пароль успешно изменен", status_code=302)
 
 
-def get_user_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10):
-    return (db.query(models.Post)
-            .filter(models.Post.author_id == user_id)
-            .order_by(models.Post.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all())
-
-
-def get_user_liked_posts(db: Session, user_id: int, skip: int = 0, limit: int = 10):
-
-    return (db.query(models.Post)
-            .join(models.Reaction)
-            .filter(
-        models.Reaction.user_id == user_id,
-        models.Reaction.is_like == True
-    )
-            .order_by(models.Reaction.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all())
-
-
-def get_user_comments(db: Session, user_id: int, skip: int = 0, limit: int = 10):
-
-    return (db.query(models.Comment)
-            .filter(models.Comment.author_id == user_id)
-            .order_by(models.Comment.created_at.desc())
-            .offset(skip)
-            .limit(limit)
-            .all())
-
-
-def get_user_stats(db: Session, user_id: int):
-    posts_count = db.query(models.Post).filter(models.Post.author_id == user_id).count()
-    comments_count = db.query(models.Comment).filter(models.Comment.author_id == user_id).count()
-    likes_given = db.query(models.Reaction).filter(
-        models.Reaction.user_id == user_id,
-        models.Reaction.is_like == True
-    ).count()
-    dislikes_given = db.query(models.Reaction).filter(
-        models.Reaction.user_id == user_id,
-        models.Reaction.is_like == False
-    ).count()
-
+def get_user_stats(user: models.User):
     return {
-        "posts_count": posts_count,
-        "comments_count": comments_count,
-        "likes_given": likes_given,
-        "dislikes_given": dislikes_given,
+        "posts_count": user.posts_count,
+        "comments_count": user.comments_count,
+        "likes_given": user.likes_count,
+        "dislikes_given": user.dislikes_count,
     }
\ No newline at end of file
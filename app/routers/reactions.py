@@ -1,8 +1,8 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request
 from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.dependencies import get_db, get_current_user, get_current_user_optional
-from app import crud, schemas, models
+from app import async_crud, models
 
 router = APIRouter(tags=["reactions"])
 
@@ -11,15 +11,13 @@ router = APIRouter(tags=["reactions"])
 async def like_post(
         post_id: int,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    post = crud.get_post(db, post_id)
-    if not post:
+    if not await async_crud.post_exists(db, post_id):
         raise HTTPException(status_code=404, detail="Пост не найден")
 
-    reaction = schemas.ReactionCreate(is_like=True)
-    crud.create_or_update_reaction(db, reaction, post_id, current_user.id)
+    await async_crud.set_reaction(db, post_id, current_user.id, is_like=True)
 
     referer = request.headers.get("referer", f"/posts/{post_id}")
     return RedirectResponse(url=referer, status_code=status.HTTP_303_SEE_OTHER)
@@ -29,16 +27,13 @@ async def like_post(
 async def dislike_post(
         post_id: int,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-
-    post = crud.get_post(db, post_id)
-    if not post:
+    if not await async_crud.post_exists(db, post_id):
         raise HTTPException(status_code=404, detail="Пост не найден")
 
-    reaction = schemas.ReactionCreate(is_like=False)
-    crud.create_or_update_reaction(db, reaction, post_id, current_user.id)
+    await async_crud.set_reaction(db, post_id, current_user.id, is_like=False)
 
     referer = request.headers.get("referer", f"/posts/{post_id}")
     return RedirectResponse(url=referer, status_code=status.HTTP_303_SEE_OTHER)
@@ -48,10 +43,10 @@ async def dislike_post(
 async def remove_reaction(
         post_id: int,
         request: Request,
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_db),
         current_user: models.User = Depends(get_current_user)
 ):
-    crud.delete_reaction(db, post_id, current_user.id)
+    await async_crud.delete_reaction(db, post_id, current_user.id)
 
     referer = request.headers.get("referer", f"/posts/{post_id}")
     return RedirectResponse(url=referer, status_code=status.HTTP_303_SEE_OTHER)
\ No newline at end of file
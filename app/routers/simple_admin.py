@@ -1,8 +1,9 @@
-from fastapi import APIRouter, Request, Depends
-from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Request, Depends, Form
+from fastapi.responses import HTMLResponse, RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from app.dependencies import get_db, get_current_user
-from app.models import User, Post, Comment
+from app.models import User
+from app import async_crud
 
 router = APIRouter()
 
@@ -20,7 +21,7 @@ def check_admin(user: User) -> bool:
 async def admin_page(
         request: Request,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
 
     if not check_admin(current_user):
@@ -35,9 +36,10 @@ async def admin_page(
         </html>
         """, status_code=403)
 
-    total_posts = db.query(Post).count()
-    total_users = db.query(User).count()
-    total_comments = db.query(Comment).count()
+    counts = await async_crud.get_site_counts(db)
+    total_posts = counts["posts"]
+    total_users = counts["users"]
+    total_comments = counts["comments"]
 
     return HTMLResponse(f"""
     <!DOCTYPE html>
@@ -100,12 +102,12 @@ async def admin_page(
 async def admin_users(
         request: Request,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     if not check_admin(current_user):
         return HTMLResponse("Нет прав!", status_code=403)
 
-    users = db.query(User).order_by(User.created_at.desc()).all()
+    users = await async_crud.get_users(db)
 
     html = """
     <!DOCTYPE html>
@@ -124,17 +126,27 @@ async def admin_users(
                 <th>Имя</th>
                 <th>Email</th>
                 <th>Зарегистрирован</th>
+                <th>Статус</th>
             </tr>
     """
 
     for user in users:
         is_admin = "👑" if check_admin(user) else ""
+        is_active = user.is_active is not False
         html += f"""
             <tr>
                 <td>{user.id}</td>
                 <td>{is_admin} <a href="/profile/{user.username}">{user.username}</a></td>
                 <td>{user.email}</td>
                 <td>{user.created_at.strftime('%d.%m.%Y')}</td>
+                <td>
+                    <form method="post" action="/admin/users/{user.id}/active">
+                        <input type="hidden" name="is_active" value="{0 if is_active else 1}">
+                        <button class="btn btn-sm {'btn-outline-danger' if is_active else 'btn-outline-success'}">
+                            {'Заблокировать' if is_active else 'Разблокировать'}
+                        </button>
+                    </form>
+                </td>
             </tr>
         """
 
@@ -147,16 +159,30 @@ async def admin_users(
     return HTMLResponse(html)
 
 
+@router.post("/admin/users/{user_id}/active")
+async def admin_set_user_active(
+        user_id: int,
+        is_active: bool = Form(...),
+        current_user: User = Depends(get_current_user),
+        db: AsyncSession = Depends(get_db)
+):
+    if not check_admin(current_user):
+        return HTMLResponse("Нет прав!", status_code=403)
+
+    await async_crud.set_user_active(db, user_id, is_active)
+    return RedirectResponse(url="/admin/users", status_code=302)
+
+
 @router.get("/admin/posts")
 async def admin_posts(
         request: Request,
         current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_db)
 ):
     if not check_admin(current_user):
         return HTMLResponse("Нет прав!", status_code=403)
 
-    posts = db.query(Post).order_by(Post.created_at.desc()).limit(50).all()
+    posts, _ = await async_crud.get_posts(db, limit=50)
 
     html = """
     <!DOCTYPE html>
@@ -179,7 +205,7 @@ async def admin_posts(
                 <p>Дата: {post.created_at.strftime('%d.%m.%Y %H:%M')}</p>
                 <div>
                     <a href="/posts/{post.id}" class="btn btn-sm btn-primary">Открыть</a>
-                    <a href="/posts/{post.id}" class="btn btn-sm btn-outline-secondary">Комментарии ({len(post.comments)})</a>
+                    <a href="/posts/{post.id}" class="btn btn-sm btn-outline-secondary">Комментарии ({post.comments_count})</a>
                 </div>
             </div>
         </div>
@@ -104,6 +104,24 @@ class CommentWithAuthor(CommentOut):
     author: UserOut
 
 
+class CommentAuthor(BaseModel):
+    id: int
+    username: str
+
+    class Config:
+        from_attributes = True
+
+
+class CommentListItem(CommentWithAuthor):
+    # В публичном списке автор без email
+    author: CommentAuthor
+
+
+class CommentPage(BaseModel):
+    items: List[CommentListItem]
+    next_cursor: Optional[str] = None
+
+
 class PostWithComments(PostWithAuthor):
     comments: List[CommentWithAuthor] = []
 
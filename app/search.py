@@ -0,0 +1,208 @@
+import re
+from typing import Optional
+from sqlalchemy import Double, column, func, literal_column, select, table, text
+from sqlalchemy.orm import Session
+from app import models
+from app.config import settings
+from app.pagination import Page, paginate
+
+
+class SearchBackend:
+    """Поиск постов по заголовку и тексту.
+
+    install() создает индекс (идемпотентно), дальше индекс поддерживается
+    самой базой: генерируемой колонкой в Postgres или триггерами в SQLite,
+    то есть в той же транзакции, что и create/update/delete поста.
+    """
+
+    def install(self, connection):
+        pass
+
+    def rebuild(self, connection):
+        pass
+
+    def search(self, query, search_query: str, skip: int = 0, limit: int = 10,
+               cursor: Optional[str] = None) -> Page:
+        raise NotImplementedError
+
+    def count(self, query, search_query: str) -> int:
+        raise NotImplementedError
+
+
+class LikeSearchBackend(SearchBackend):
+    """Запасной вариант без индекса: ILIKE по всему тексту."""
+
+    def _filter(self, query, search_query):
+        return query.filter(models.Post.title.ilike(f"%{search_query}%") |
+                            models.Post.content.ilike(f"%{search_query}%"))
+
+    def search(self, query, search_query, skip=0, limit=10, cursor=None):
+        query = self._filter(query, search_query)
+        return paginate(query, models.Post.created_at, models.Post.id, skip, limit, cursor)
+
+    def count(self, query, search_query):
+        return self._filter(query, search_query).count()
+
+
+def is_search_object(type_: str, name: str) -> bool:
+    """Объекты индекса, которые создает install(), а не миграции: бэкенд и
+    язык выбираются настройками. Autogenerate Alembic их не трогает."""
+    if type_ == "table":
+        # posts_fts и теневые таблицы FTS5 (posts_fts_data, _idx, ...)
+        return name == "posts_fts" or name.startswith("posts_fts_")
+    return (type_, name) in {("column", "search_vector"), ("index", "ix_posts_search_vector")}
+
+
+class PostgresSearchBackend(SearchBackend):
+    """tsvector-колонка с GIN-индексом и ранжированием ts_rank."""
+
+    def __init__(self, language: str):
+        if not re.fullmatch(r"[a-z_]+", language):
+            raise ValueError(f"Недопустимая конфигурация поиска: {language}")
+        self.config = literal_column(f"'{language}'::regconfig")
+        self.vector = literal_column("posts.search_vector")
+        self.language = language
+
+    def install(self, connection):
+        connection.execute(text(f"""
+            ALTER TABLE posts ADD COLUMN IF NOT EXISTS search_vector tsvector
+            GENERATED ALWAYS AS (
+                setweight(to_tsvector('{self.language}'::regconfig, coalesce(title, '')), 'A') ||
+                setweight(to_tsvector('{self.language}'::regconfig, coalesce(content, '')), 'B')
+            ) STORED
+        """))
+        connection.execute(text(
+            "CREATE INDEX IF NOT EXISTS ix_posts_search_vector ON posts USING GIN (search_vector)"
+        ))
+
+    def _tsquery(self, search_query):
+        return func.websearch_to_tsquery(self.config, search_query)
+
+    def _filter(self, query, tsquery):
+        return query.filter(self.vector.op("@@")(tsquery))
+
+    def search(self, query, search_query, skip=0, limit=10, cursor=None):
+        tsquery = self._tsquery(search_query)
+        # float8, чтобы значение ранга в курсоре совпадало с пересчитанным
+        rank = func.ts_rank(self.vector, tsquery).cast(Double)
+        query = self._filter(query, tsquery)
+        return paginate(query, rank, models.Post.id, skip, limit, cursor)
+
+    def count(self, query, search_query):
+        return self._filter(query, self._tsquery(search_query)).count()
+
+
+class SqliteSearchBackend(SearchBackend):
+    """FTS5 с внешним содержимым (таблица posts) и триггерами синхронизации.
+
+    Стемминга для русского в FTS5 нет, поэтому каждое слово ищется как
+    префикс: "програм" находит "программирование".
+    """
+
+    fts_table = table("posts_fts", column("rowid"))
+    fts = literal_column("posts_fts")
+
+    def install(self, connection):
+        exists = connection.execute(text(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'posts_fts'"
+        )).first()
+
+        connection.execute(text("""
+            CREATE VIRTUAL TABLE IF NOT EXISTS posts_fts USING fts5(
+                title, content, content='posts', content_rowid='id',
+                tokenize='unicode61 remove_diacritics 2'
+            )
+        """))
+        connection.execute(text("""
+            CREATE TRIGGER IF NOT EXISTS posts_fts_ai AFTER INSERT ON posts BEGIN
+                INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END
+        """))
+        connection.execute(text("""
+            CREATE TRIGGER IF NOT EXISTS posts_fts_ad AFTER DELETE ON posts BEGIN
+                INSERT INTO posts_fts(posts_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+            END
+        """))
+        connection.execute(text("""
+            CREATE TRIGGER IF NOT EXISTS posts_fts_au AFTER UPDATE OF title, content ON posts BEGIN
+                INSERT INTO posts_fts(posts_fts, rowid, title, content)
+                VALUES ('delete', old.id, old.title, old.content);
+                INSERT INTO posts_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+            END
+        """))
+
+        if not exists:
+            self.rebuild(connection)
+
+    def rebuild(self, connection):
+        connection.execute(text("INSERT INTO posts_fts(posts_fts) VALUES ('rebuild')"))
+
+    @staticmethod
+    def _match_expression(search_query):
+        words = re.findall(r"\w+", search_query)
+        return " ".join(f'"{word}"*' for word in words)
+
+    def _filter(self, query, match):
+        return query.join(self.fts_table, self.fts_table.c.rowid == models.Post.id) \
+            .filter(self.fts.op("MATCH")(match))
+
+    def search(self, query, search_query, skip=0, limit=10, cursor=None):
+        match = self._match_expression(search_query)
+        if not match:
+            return Page([], None)
+        # bm25 тем меньше, чем лучше совпадение; заголовок весит больше текста
+        rank = -func.bm25(self.fts, 10.0, 1.0)
+        query = self._filter(query, match)
+        return paginate(query, rank, models.Post.id, skip, limit, cursor)
+
+    def count(self, query, search_query):
+        match = self._match_expression(search_query)
+        if not match:
+            return 0
+        return query.session.scalar(
+            select(func.count()).select_from(self.fts_table).where(self.fts.op("MATCH")(match))
+        )
+
+
+_backends = {}
+
+
+def get_search_backend(bind) -> SearchBackend:
+    if isinstance(bind, Session):
+        bind = bind.get_bind()
+    name = settings.SEARCH_BACKEND
+    if name == "auto":
+        name = {"postgresql": "postgres", "sqlite": "sqlite"}.get(bind.dialect.name, "like")
+
+    if name not in _backends:
+        if name == "postgres":
+            _backends[name] = PostgresSearchBackend(settings.SEARCH_LANGUAGE)
+        elif name == "sqlite":
+            _backends[name] = SqliteSearchBackend()
+        else:
+            _backends[name] = LikeSearchBackend()
+    return _backends[name]
+
+
+def install_search_index(engine):
+    with engine.begin() as connection:
+        get_search_backend(engine).install(connection)
+
+
+def rebuild_search_index(engine):
+    with engine.begin() as connection:
+        get_search_backend(engine).rebuild(connection)
+
+
+if __name__ == "__main__":
+    import sys
+    from app.database import engine
+
+    if sys.argv[1:] != ["rebuild"]:
+        print("Использование: python -m app.search rebuild")
+        sys.exit(1)
+
+    install_search_index(engine)
+    rebuild_search_index(engine)
+    print("Поисковый индекс перестроен")
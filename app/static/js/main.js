@@ -0,0 +1,92 @@
+// Подгрузка комментариев на странице поста: кнопка "Загрузить ещё"
+// запрашивает следующую страницу у /posts/<id>/comments по курсору.
+
+function formatMoscowTime(value) {
+    // SQLite отдает время без зоны, а хранится оно в UTC
+    const date = new Date(/[zZ]|[+-]\d\d:?\d\d$/.test(value) ? value : value + 'Z');
+    return date.toLocaleString('ru-RU', {
+        timeZone: 'Europe/Moscow',
+        day: '2-digit', month: '2-digit', year: 'numeric',
+        hour: '2-digit', minute: '2-digit',
+    }).replace(',', '');
+}
+
+function renderComment(comment, postId, userId) {
+    const item = document.createElement('div');
+    item.className = 'comment mb-3 pb-3 border-bottom';
+
+    const header = document.createElement('div');
+    header.className = 'd-flex justify-content-between align-items-start';
+
+    const meta = document.createElement('div');
+    const author = document.createElement('strong');
+    author.className = 'd-block';
+    const link = document.createElement('a');
+    link.href = '/profile/' + encodeURIComponent(comment.author.username);
+    link.className = 'text-decoration-none';
+    link.textContent = comment.author.username;
+    author.appendChild(link);
+
+    const time = document.createElement('small');
+    time.className = 'text-muted';
+    time.textContent = formatMoscowTime(comment.created_at);
+    if (comment.updated_at && comment.updated_at !== comment.created_at) {
+        time.textContent += ' (ред. ' + formatMoscowTime(comment.updated_at) + ')';
+    }
+    meta.append(author, time);
+    header.appendChild(meta);
+
+    if (userId && comment.author_id === userId) {
+        const form = document.createElement('form');
+        form.method = 'post';
+        form.action = '/posts/' + postId + '/comments/' + comment.id + '/delete';
+        form.className = 'd-inline';
+        const button = document.createElement('button');
+        button.type = 'submit';
+        button.className = 'btn btn-sm btn-outline-danger';
+        button.innerHTML = '<i class="bi bi-trash"></i>';
+        button.addEventListener('click', (event) => {
+            if (!confirm('Удалить комментарий?')) event.preventDefault();
+        });
+        form.appendChild(button);
+        header.appendChild(form);
+    }
+
+    const content = document.createElement('p');
+    content.className = 'mt-2 mb-0';
+    content.textContent = comment.content;
+
+    item.append(header, content);
+    return item;
+}
+
+async function loadMoreComments(button) {
+    const list = document.getElementById('comments-list');
+    const postId = button.dataset.postId;
+    const userId = Number(button.dataset.userId) || null;
+
+    button.disabled = true;
+    try {
+        const response = await fetch(button.dataset.loadComments, {headers: {Accept: 'application/json'}});
+        if (!response.ok) throw new Error(response.status);
+        const page = await response.json();
+
+        for (const comment of page.items) {
+            list.appendChild(renderComment(comment, postId, userId));
+        }
+        if (page.next_cursor) {
+            button.dataset.loadComments = '/posts/' + postId + '/comments?cursor=' + encodeURIComponent(page.next_cursor);
+            button.disabled = false;
+        } else {
+            button.remove();
+        }
+    } catch (error) {
+        button.disabled = false;
+        button.textContent = 'Не удалось загрузить, попробовать ещё раз';
+    }
+}
+
+document.addEventListener('click', (event) => {
+    const button = event.target.closest('[data-load-comments]');
+    if (button) loadMoreComments(button);
+});
@@ -0,0 +1,43 @@
+"""Популярные теги и облако тегов.
+
+Число постов у тега хранится в tags.posts_count (counters.bump_tags
+меняет его в транзакции поста), так что топ и облако - это чтение
+одной таблицы без GROUP BY по post_tags. Результат дополнительно
+держится в tag_stats_cache: он нужен на каждой главной странице.
+"""
+from sqlalchemy.orm import Session
+from app import crud
+from app.cache import tag_stats_cache
+from app.config import settings
+
+CLOUD_WEIGHTS = 5
+
+
+def popular_tags(db: Session, limit: int = settings.POPULAR_TAGS_LIMIT) -> list:
+    key = f"popular:{limit}"
+    tags = tag_stats_cache.get(key)
+    if tags is None:
+        tags = [{"name": tag.name, "count": tag.posts_count} for tag in crud.get_popular_tags(db, limit)]
+        tag_stats_cache.set(key, tags)
+    return tags
+
+
+def _weight(count: int, low: int, high: int) -> int:
+    if high == low:
+        return 1
+    return 1 + round((count - low) * (CLOUD_WEIGHTS - 1) / (high - low))
+
+
+def tag_cloud(db: Session) -> list:
+    """Все теги с постами по алфавиту, weight от 1 до CLOUD_WEIGHTS."""
+    tags = tag_stats_cache.get("cloud")
+    if tags is None:
+        used = crud.get_used_tags(db)
+        counts = [tag.posts_count for tag in used]
+        low, high = min(counts, default=0), max(counts, default=0)
+        tags = [
+            {"name": tag.name, "count": tag.posts_count, "weight": _weight(tag.posts_count, low, high)}
+            for tag in used
+        ]
+        tag_stats_cache.set("cloud", tags)
+    return tags
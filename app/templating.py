@@ -0,0 +1,170 @@
+"""Общее окружение Jinja2 для всех роутеров.
+
+Шаблоны разбираются один раз на процесс, а скомпилированный байткод
+хранится на диске (TEMPLATE_CACHE_DIR), так что новый воркер не
+компилирует их заново. В образ байткод кладется при сборке:
+
+    python -m app.templating compile
+
+stream_page отдает страницу по частям: все до {{ stream_slot("имя") }}
+уходит клиенту сразу, затем содержимое слота по мере того, как его
+генератор достает данные из базы, затем остаток шаблона.
+"""
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import AsyncIterable
+from fastapi.responses import StreamingResponse
+from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache, Template
+from markupsafe import Markup
+from app.config import settings
+from app.assets import asset_url
+from app.profiling import record_template
+from app.utils.file_upload import image_variant
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "templates")
+
+
+class RenderStats:
+    """Число рендеров и время по каждому шаблону верхнего уровня."""
+
+    def __init__(self):
+        self.templates = {}
+
+    def record(self, name: str, seconds: float):
+        entry = self.templates.get(name)
+        if entry is None:
+            entry = self.templates[name] = {"count": 0, "total": 0.0, "max": 0.0}
+        entry["count"] += 1
+        entry["total"] += seconds
+        entry["max"] = max(entry["max"], seconds)
+
+    def as_dict(self) -> dict:
+        return {
+            name: {
+                "count": entry["count"],
+                "avg_ms": round(entry["total"] / entry["count"] * 1000, 3),
+                "max_ms": round(entry["max"] * 1000, 3),
+            }
+            for name, entry in sorted(self.templates.items())
+        }
+
+
+render_stats = RenderStats()
+
+
+class TimedTemplate(Template):
+    def render(self, *args, **kwargs) -> str:
+        started = time.perf_counter()
+        try:
+            return super().render(*args, **kwargs)
+        finally:
+            spent = time.perf_counter() - started
+            render_stats.record(self.name, spent)
+            record_template(spent)
+
+
+_SLOT_MARKER = "<!--slot:%s-->"
+
+
+def stream_slot(name: str) -> Markup:
+    """Место в шаблоне, куда stream_page подставит поток из слота name.
+
+    Должно стоять прямо в теле шаблона или блока, не внутри макроса:
+    вывод макроса приходит одной строкой, и метку в нем не найти.
+    """
+    return Markup(_SLOT_MARKER % name)
+
+
+def render_block(name: str, block: str, context: dict) -> str:
+    """Один {% block %} шаблона: слот, который отдает список частями,
+    рендерит начало, пачки элементов и конец по отдельности."""
+    template = templates.env.get_template(name)
+    started = time.perf_counter()
+    html = "".join(template.blocks[block](template.new_context(context)))
+    record_template(time.perf_counter() - started)
+    return html
+
+
+def moscow_time(dt: datetime) -> datetime:
+    if dt:
+        return dt + timedelta(hours=3)
+    return dt
+
+
+def _bytecode_cache():
+    if not settings.TEMPLATE_CACHE_DIR:
+        return None
+    os.makedirs(settings.TEMPLATE_CACHE_DIR, exist_ok=True)
+    return FileSystemBytecodeCache(settings.TEMPLATE_CACHE_DIR)
+
+
+templates = Jinja2Templates(
+    directory=TEMPLATE_DIR,
+    auto_reload=settings.TEMPLATE_AUTO_RELOAD,
+    bytecode_cache=_bytecode_cache(),
+)
+templates.env.template_class = TimedTemplate
+templates.env.filters["moscow_time"] = moscow_time
+templates.env.globals["MAX_OFFSET_PAGE"] = settings.MAX_OFFSET_PAGE
+templates.env.globals["image_variant"] = image_variant
+templates.env.globals["asset_url"] = asset_url
+templates.env.globals["stream_slot"] = stream_slot
+
+
+async def _generate(template: Template, context: dict, slots: dict):
+    markers = {_SLOT_MARKER % name: slot for name, slot in slots.items()}
+    buffer = []
+    spent = 0.0
+    pieces = template.generate(context)
+    while True:
+        started = time.perf_counter()
+        piece = next(pieces, None)
+        spent += time.perf_counter() - started
+        if piece is None:
+            break
+        slot = markers.get(piece)
+        if slot is None:
+            buffer.append(piece)
+            continue
+        # Начало страницы уходит до первого запроса слота к базе
+        yield "".join(buffer).encode()
+        buffer = []
+        async for chunk in slot:
+            yield chunk.encode()
+    render_stats.record(template.name, spent)
+    record_template(spent)
+    yield "".join(buffer).encode()
+
+
+def stream_page(name: str, context: dict, **slots: AsyncIterable[str]) -> StreamingResponse:
+    """HTML-ответ, который рендерится по мере отправки.
+
+    Каждый слот - асинхронный генератор готовых кусков HTML. Время в
+    render_stats - только рендер самого шаблона, без ожидания слотов.
+    """
+    template = templates.env.get_template(name)
+    return StreamingResponse(_generate(template, context, slots), media_type="text/html")
+
+
+def compile_templates() -> list:
+    """Загружает все шаблоны: байткод попадает в кэш, а синтаксические
+    ошибки всплывают при сборке, а не на первом запросе."""
+    names = templates.env.list_templates(extensions=["html"])
+    for name in names:
+        templates.env.get_template(name)
+    return names
+
+
+if __name__ == "__main__":
+    if sys.argv[1:] != ["compile"]:
+        print("Использование: python -m app.templating compile")
+        sys.exit(1)
+    if not settings.TEMPLATE_CACHE_DIR:
+        print("TEMPLATE_CACHE_DIR пуст, байткод сохранять некуда")
+        sys.exit(1)
+
+    for name in compile_templates():
+        print(name)
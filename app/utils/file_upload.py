@@ -1,29 +1,200 @@
+import asyncio
+import errno
+import logging
 import os
+import shutil
+import tempfile
+import time
 import uuid
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
 from fastapi import UploadFile, HTTPException
-from PIL import Image
-import io
+from PIL import Image, ImageOps
+from app.cache import MemoryCache
 from app.config import settings
+from app.metrics import image_processing_duration, image_processing_failures, upload_bytes, uploads
 
+CHUNK_SIZE = 64 * 1024
+UPLOAD_URL = "/static/uploads/"
 
-def save_upload_file(upload_file: UploadFile) -> str:
-    file_ext = os.path.splitext(upload_file.filename)[1].lower()
-    if file_ext not in settings.ALLOWED_EXTENSIONS:
-        raise HTTPException(400, f"Недопустимый формат файла. Разрешенные: {settings.ALLOWED_EXTENSIONS}")
+# Имя варианта -> максимальная сторона в пикселях
+IMAGE_VARIANTS = {
+    "thumb": settings.IMAGE_THUMB_SIZE,
+    "large": settings.IMAGE_LARGE_SIZE,
+}
+# GIF не трогаем: thumbnail() оставил бы только первый кадр анимации
+RESIZABLE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+
+# Тип файла определяется по первым байтам, а не по имени
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", ".jpg"),
+    (b"\x89PNG\r\n\x1a\n", ".png"),
+    (b"GIF87a", ".gif"),
+    (b"GIF89a", ".gif"),
+)
+
+# Картинка 10000x10000 в памяти - это 300 МБ; больше не декодируем
+Image.MAX_IMAGE_PIXELS = settings.IMAGE_MAX_PIXELS
+
+logger = logging.getLogger(__name__)
+_executor: Optional[ProcessPoolExecutor] = None
+_pending = set()
+# Уже нарезанные варианты: файл варианта не пропадает, пока жив пост,
+# поэтому проверять диск на каждом рендере незачем
+_ready = MemoryCache(10_000, 24 * 3600)
+
+
+def variant_filename(filename: str, variant: str, ext: Optional[str] = None) -> str:
+    stem, original_ext = os.path.splitext(filename)
+    return f"{stem}_{variant}{ext or original_ext.lower()}"
+
+
+def sniff_image_type(head: bytes) -> Optional[str]:
+    for signature, ext in IMAGE_SIGNATURES:
+        if head.startswith(signature):
+            return ext
+    return None
+
+
+def make_variants(path: str):
+    """Уменьшенные копии картинки рядом с оригиналом: в исходном формате и в WebP.
+
+    Выполняется в отдельном процессе, поэтому без обращений к базе и настройкам
+    приложения кроме уже посчитанных IMAGE_VARIANTS.
+    """
+    directory, filename = os.path.split(path)
+    largest = max(IMAGE_VARIANTS.values())
+    with Image.open(path) as source:
+        # JPEG декодируется сразу в уменьшенном масштабе (1/2, 1/4, 1/8),
+        # так что фото 6000x4000 не разворачивается в памяти целиком
+        source.draft("RGB", (largest, largest))
+        image = ImageOps.exif_transpose(source)
+        is_png = filename.lower().endswith(".png")
+        if not is_png and image.mode != "RGB":
+            image = image.convert("RGB")
+
+        # От большего варианта к меньшему: каждый режется из предыдущего
+        resized = image
+        for variant, size in sorted(IMAGE_VARIANTS.items(), key=lambda item: -item[1]):
+            resized = resized.copy()
+            resized.thumbnail((size, size), Image.LANCZOS)
+
+            webp_path = os.path.join(directory, variant_filename(filename, variant, ".webp"))
+            resized.save(webp_path + ".tmp", "WEBP", quality=80, method=4)
+            os.replace(webp_path + ".tmp", webp_path)
+
+            # Исходный формат пишется последним: по нему шаблоны узнают,
+            # что оба файла варианта готовы
+            target = os.path.join(directory, variant_filename(filename, variant))
+            if is_png:
+                resized.save(target + ".tmp", "PNG", optimize=True)
+            else:
+                resized.save(target + ".tmp", "JPEG", quality=85, optimize=True, progressive=True)
+            os.replace(target + ".tmp", target)
+
+
+def _timed_variants(path: str) -> float:
+    # Время меряется в процессе пула, а записывается в метрики родителя
+    started = time.perf_counter()
+    make_variants(path)
+    return time.perf_counter() - started
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=settings.IMAGE_WORKERS)
+    return _executor
+
+
+def shutdown_image_workers():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+def _variants_done(future):
+    _pending.discard(future)
+    # Битая картинка не ломает пост: остается оригинал
+    if future.cancelled():
+        return
+    if future.exception():
+        image_processing_failures.inc()
+        logger.warning("Не удалось нарезать варианты изображения: %r", future.exception())
+    else:
+        image_processing_duration.observe(future.result())
+
+
+def _schedule_variants(path: str):
+    future = asyncio.get_running_loop().run_in_executor(_get_executor(), _timed_variants, path)
+    _pending.add(future)
+    future.add_done_callback(_variants_done)
+
+
+async def save_upload_file(upload_file: UploadFile) -> str:
+    """Сохраняет загрузку по частям с проверкой MAX_FILE_SIZE и ставит
+    нарезку вариантов в очередь пула процессов. Ответ не ждет Pillow.
+
+    В памяти одновременно не больше одного фрагмента CHUNK_SIZE: файл
+    пишется во временный .part в UPLOAD_TMP_DIR и переносится в
+    UPLOAD_DIR, когда тип и размер проверены.
+    """
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    os.makedirs(settings.UPLOAD_TMP_DIR, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=settings.UPLOAD_TMP_DIR, suffix=".part")
+
+    file_ext = None
+    size = 0
+    try:
+        with os.fdopen(fd, "wb") as buffer:
+            while chunk := await upload_file.read(CHUNK_SIZE):
+                if file_ext is None:
+                    file_ext = sniff_image_type(chunk)
+                    if file_ext not in settings.ALLOWED_EXTENSIONS:
+                        raise HTTPException(400, f"Недопустимый формат файла. Разрешенные: {settings.ALLOWED_EXTENSIONS}")
+                size += len(chunk)
+                if size > settings.MAX_FILE_SIZE:
+                    raise HTTPException(413, f"Файл слишком большой. Максимум: {settings.MAX_FILE_SIZE // 1024 // 1024}MB")
+                buffer.write(chunk)
+        if file_ext is None:
+            raise HTTPException(400, "Пустой файл")
+    except BaseException:
+        os.remove(temp_path)
+        uploads.inc("rejected")
+        raise
 
     filename = f"{uuid.uuid4()}{file_ext}"
     filepath = os.path.join(settings.UPLOAD_DIR, filename)
+    # mkstemp создает файл с правами 0600, а отдавать его будет веб-сервер
+    os.chmod(temp_path, 0o644)
+    try:
+        os.replace(temp_path, filepath)
+    except OSError as exc:
+        if exc.errno != errno.EXDEV:
+            raise
+        # UPLOAD_DIR на другом томе: копия. Имя еще нигде не опубликовано,
+        # так что недописанный файл никто не запросит
+        shutil.move(temp_path, filepath)
+    uploads.inc("saved")
+    upload_bytes.inc(amount=size)
 
-    contents = upload_file.file.read()
-    if len(contents) > settings.MAX_FILE_SIZE:
-        raise HTTPException(400, f"Файл слишком большой. Максимум: {settings.MAX_FILE_SIZE // 1024 // 1024}MB")
+    if file_ext in RESIZABLE_EXTENSIONS:
+        _schedule_variants(filepath)
+
+    return filename
 
-    if file_ext in ['.jpg', '.jpeg', '.png']:
-        image = Image.open(io.BytesIO(contents))
-        image.thumbnail((1200, 1200))
-        image.save(filepath, optimize=True, quality=85)
-    else:
-        with open(filepath, "wb") as f:
-            f.write(contents)
 
-    return filename
\ No newline at end of file
+def image_variant(filename: str, variant: str) -> dict:
+    """URL картинки для шаблона: вариант, если он уже нарезан, иначе оригинал."""
+    if os.path.splitext(filename)[1].lower() not in RESIZABLE_EXTENSIONS:
+        return {"src": UPLOAD_URL + filename, "webp": None}
+    target = variant_filename(filename, variant)
+    if _ready.get(target) is None:
+        if not os.path.exists(os.path.join(settings.UPLOAD_DIR, target)):
+            return {"src": UPLOAD_URL + filename, "webp": None}
+        _ready.set(target, True)
+    return {
+        "src": UPLOAD_URL + target,
+        "webp": UPLOAD_URL + variant_filename(filename, variant, ".webp"),
+    }
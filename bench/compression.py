@@ -0,0 +1,69 @@
+"""Размер на проводе и цена сжатия по типам страниц.
+
+    uvicorn app.main:app &
+    python bench/compression.py --url http://127.0.0.1:8000 \
+        --path / --path /posts/1 --path /profile/admin --cookie "access_token=..."
+
+Для каждой страницы: сколько байт отдал сервер без сжатия и с
+Accept-Encoding br/gzip, и сколько микросекунд тратит на то же тело
+gzip/brotli разных уровней (медиана по --repeat прогонам).
+"""
+import argparse
+import statistics
+import time
+import zlib
+import httpx
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def codecs():
+    for level in (1, 6, 9):
+        yield f"gzip-{level}", lambda data, level=level: zlib.compress(data, level)
+    if brotli is not None:
+        for quality in (1, 4, 11):
+            yield f"br-{quality}", lambda data, quality=quality: brotli.compress(data, quality=quality)
+
+
+def cost(fn, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn(data)
+        timings.append(time.perf_counter() - started)
+    return len(result), statistics.median(timings) * 1e6
+
+
+def wire_size(client, path, encoding):
+    # stream(), чтобы httpx не распаковывал тело: нужен именно размер на проводе
+    with client.stream("GET", path, headers={"Accept-Encoding": encoding}) as response:
+        raw = b"".join(response.iter_raw())
+        return len(raw), response.headers.get("content-encoding", "identity")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", action="append", dest="paths")
+    parser.add_argument("--cookie", default=None)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    headers = {"Cookie": args.cookie} if args.cookie else {}
+    with httpx.Client(base_url=args.url, headers=headers, timeout=30) as client:
+        for path in args.paths or ["/"]:
+            body = client.get(path, headers={"Accept-Encoding": "identity"}).content
+            print(f"\n{path}: {len(body)} байт без сжатия")
+            for encoding in ("br", "gzip"):
+                size, used = wire_size(client, path, encoding)
+                print(f"  сервер, {encoding:<5} -> {used:<8} {size:>8} байт")
+            for name, fn in codecs():
+                size, micros = cost(fn, body, args.repeat)
+                print(f"  {name:<8} {size:>8} байт  {size / len(body):6.1%}  {micros:8.0f} мкс")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,395 @@
+"""Синтетические данные и прогон основных маршрутов с сохранением результата.
+
+    # 1. база с данными (через app.crud, одной транзакцией)
+    DATABASE_URL=sqlite:///./bench.db python bench/harness.py seed --users 200 --posts 2000
+
+    # 2. сервер на той же базе
+    DATABASE_URL=sqlite:///./bench.db uvicorn app.main:app --workers 1 &
+
+    # 3. прогон и файл результата
+    DATABASE_URL=sqlite:///./bench.db python bench/harness.py run --output before.json
+    ...  # другой коммит, тот же seed
+    DATABASE_URL=sqlite:///./bench.db python bench/harness.py run --output after.json --baseline before.json
+
+    # или сравнить два готовых файла
+    python bench/harness.py compare before.json after.json
+
+Сценарии выполняются по очереди, каждый --requests запросов в
+--concurrency потоков. Для каждого печатаются и сохраняются rps,
+p50/p95/p99 и число SQL на запрос (по приросту db_queries_total в
+/metrics сервера). compare завершается с кодом 1, если rps упал или
+p95 вырос больше --threshold процентов, либо выросло число SQL на запрос.
+"""
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import time
+import uuid
+from datetime import datetime, timezone
+import httpx
+from PIL import Image
+from load import percentile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import func, select  # noqa: E402
+from sqlalchemy.orm import Session  # noqa: E402
+import app.models as models  # noqa: E402
+from app import crud, migrations, schemas  # noqa: E402
+from app.auth import create_access_token, get_password_hash  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.counters import rebuild_counters  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.search import install_search_index  # noqa: E402
+from app.utils.file_upload import make_variants  # noqa: E402
+
+PASSWORD = "bench-password"
+WORDS = (
+    "python fastapi sqlalchemy postgres sqlite кэш индекс запрос шаблон очередь "
+    "миграция профиль блог пост комментарий лайк тег поиск производительность"
+).split()
+SEARCH_WORDS = ("python", "кэш", "индекс", "производительность")
+
+
+def _skewed_weights(count: int, exponent: float) -> list:
+    # Закон Ципфа: немногие посты собирают большую часть реакций и комментариев
+    return [1 / (rank ** exponent) for rank in range(1, count + 1)]
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choices(WORDS, k=words)).capitalize() + "."
+
+
+def _make_image(rng: random.Random) -> str:
+    image = Image.new("RGB", (1600, 1200), tuple(rng.randrange(256) for _ in range(3)))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=85)
+    os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
+    filename = f"{uuid.uuid4()}.jpg"
+    path = os.path.join(settings.UPLOAD_DIR, filename)
+    with open(path, "wb") as file:
+        file.write(buffer.getvalue())
+    make_variants(path)
+    return filename
+
+
+def seed(args):
+    migrations.upgrade(engine)
+    install_search_index(engine)
+    rng = random.Random(args.seed)
+    hashed = get_password_hash(PASSWORD)
+    prefix = uuid.uuid4().hex[:6]
+    tags = [f"tag{i}" for i in range(args.tags)]
+    started = time.perf_counter()
+
+    # crud.* коммитят после каждой записи; внутри внешней транзакции это
+    # только точки сохранения, а настоящий COMMIT один, в конце
+    with engine.connect() as connection:
+        transaction = connection.begin()
+        db = Session(bind=connection, join_transaction_mode="create_savepoint")
+
+        users = [
+            crud.create_user(db, schemas.UserCreate(
+                email=f"{prefix}{i}@example.com", username=f"{prefix}_{i}", password=PASSWORD,
+            ), hashed_password=hashed).id
+            for i in range(args.users)
+        ]
+
+        posts = []
+        for i in range(args.posts):
+            image = _make_image(rng) if rng.random() < args.image_ratio else None
+            post = crud.create_post(db, schemas.PostCreate(
+                title=_text(rng, 5)[:200],
+                content=_text(rng, rng.randint(30, 200)),
+                tags=rng.sample(tags, rng.randint(1, 4)),
+            ), rng.choice(users), image_filename=image)
+            posts.append(post.id)
+
+        # Популярность постов одна на реакции и комментарии
+        popular = posts[:]
+        rng.shuffle(popular)
+        weights = list(_accumulate(_skewed_weights(len(popular), args.skew)))
+
+        for _ in range(args.comments):
+            post_id = rng.choices(popular, cum_weights=weights)[0]
+            crud.create_comment(db, schemas.CommentCreate(content=_text(rng, rng.randint(5, 40))),
+                                rng.choice(users), post_id)
+
+        for _ in range(args.reactions):
+            post_id = rng.choices(popular, cum_weights=weights)[0]
+            crud.set_reaction(db, post_id, rng.choice(users), rng.random() < 0.8)
+
+        # set_reaction оставляет счетчики вызывающему коду
+        rebuild_counters(db)
+        db.close()
+        transaction.commit()
+
+    print(f"{args.users} пользователей, {args.posts} постов, {args.comments} комментариев, "
+          f"{args.reactions} реакций за {time.perf_counter() - started:.1f} с")
+
+
+def _accumulate(values):
+    total = 0.0
+    for value in values:
+        total += value
+        yield total
+
+
+def load_dataset() -> dict:
+    with SessionLocal() as db:
+        users = db.execute(select(models.User.id, models.User.username, models.User.email)).all()
+        posts = db.scalars(select(models.Post.id).order_by(models.Post.likes_count.desc())).all()
+        tags = db.scalars(
+            select(models.Tag.name).where(models.Tag.posts_count > 0).order_by(models.Tag.posts_count.desc())
+        ).all()
+        comments = db.scalar(select(func.count(models.Comment.id)))
+        reactions = db.scalar(select(func.count(models.Reaction.id)))
+    if not users or not posts:
+        sys.exit("База пуста: сначала python bench/harness.py seed")
+    return {"users": users, "posts": posts, "tags": tags, "comments": comments, "reactions": reactions}
+
+
+def scenarios(data: dict, skew: float) -> dict:
+    """Имя -> функция (rng) -> (метод, путь, параметры httpx)."""
+    users, posts, tags = data["users"], data["posts"], data["tags"]
+    # Посты уже отсортированы по лайкам: самые популярные читают чаще
+    weights = list(_accumulate(_skewed_weights(len(posts), skew)))
+    tokens = {}
+
+    def hot_post(rng):
+        return rng.choices(posts, cum_weights=weights)[0]
+
+    def cookies(user):
+        token = tokens.get(user.id)
+        if token is None:
+            token = tokens[user.id] = create_access_token({"sub": user.username, "uid": user.id})
+        return {"access_token": f"Bearer {token}"}
+
+    return {
+        "home": lambda rng: ("GET", f"/?page={rng.randint(1, 5)}", {}),
+        "post": lambda rng: ("GET", f"/posts/{hot_post(rng)}", {}),
+        "tag": lambda rng: ("GET", f"/tag/{rng.choice(tags[:20])}", {}),
+        "search": lambda rng: ("GET", f"/search?q={rng.choice(SEARCH_WORDS)}", {}),
+        "profile": lambda rng: ("GET", f"/profile/{rng.choice(users).username}", {}),
+        "post_logged_in": lambda rng: ("GET", f"/posts/{hot_post(rng)}", {"cookies": cookies(rng.choice(users))}),
+        "like": lambda rng: ("POST", f"/posts/{hot_post(rng)}/like", {"cookies": cookies(rng.choice(users))}),
+        "comment": lambda rng: ("POST", f"/posts/{hot_post(rng)}/comments/", {
+            "cookies": cookies(rng.choice(users)), "data": {"content": "Нагрузочный комментарий"},
+        }),
+        "login": lambda rng: ("POST", "/login", {
+            "data": {"email": rng.choice(users).email, "password": PASSWORD},
+        }),
+    }
+
+
+async def _queries_total(client: httpx.AsyncClient):
+    try:
+        response = await client.get("/metrics")
+    except httpx.HTTPError:
+        return None
+    if response.status_code != 200:
+        return None
+    total = 0.0
+    for line in response.text.splitlines():
+        if line.startswith("db_queries_total"):
+            total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+async def run_scenario(client, make_request, requests: int, concurrency: int, seed: int) -> dict:
+    latencies = []
+    statuses = {}
+    counter = iter(range(requests))
+    rng = random.Random(seed)
+
+    async def worker():
+        for _ in counter:
+            method, path, kwargs = make_request(rng)
+            started = time.perf_counter()
+            try:
+                response = await client.request(method, path, follow_redirects=False, **kwargs)
+                status = response.status_code
+            except httpx.HTTPError:
+                status = "error"
+            latencies.append(time.perf_counter() - started)
+            statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    before = await _queries_total(client)
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    after = await _queries_total(client)
+
+    errors = sum(count for status, count in statuses.items() if status[0] not in "23")
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "statuses": statuses,
+        "rps": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentile(latencies, 50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 99) * 1000, 2),
+        # Запрос к /metrics между замерами сам SQL не выполняет
+        "queries_per_request": round((after - before) / len(latencies), 2)
+        if before is not None and after is not None and latencies else None,
+    }
+
+
+def _git_commit():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True)
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True)
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return commit.stdout.strip() + ("-dirty" if dirty.stdout.strip() else "")
+
+
+def run(args):
+    data = load_dataset()
+    available = scenarios(data, args.skew)
+    names = args.scenario or list(available)
+    unknown = set(names) - set(available)
+    if unknown:
+        sys.exit(f"Неизвестные сценарии: {', '.join(sorted(unknown))}")
+
+    async def run_all():
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=args.url, timeout=30, limits=limits) as client:
+            results = {}
+            for i, name in enumerate(names):
+                results[name] = await run_scenario(
+                    client, available[name], args.requests, args.concurrency, args.seed + i
+                )
+                print_result(name, results[name])
+            return results
+
+    result = {
+        "meta": {
+            "commit": _git_commit(),
+            "created": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "url": args.url,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+            "dataset": {
+                "users": len(data["users"]),
+                "posts": len(data["posts"]),
+                "tags": len(data["tags"]),
+                "comments": data["comments"],
+                "reactions": data["reactions"],
+            },
+        },
+        "scenarios": asyncio.run(run_all()),
+    }
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(result, file, ensure_ascii=False, indent=2)
+        print(f"Результат: {args.output}")
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as file:
+            baseline = json.load(file)
+        if not compare_results(baseline, result, args.threshold):
+            sys.exit(1)
+
+
+def print_result(name: str, result: dict):
+    queries = result["queries_per_request"]
+    print(
+        f"{name:>15}: {result['rps']:8.1f} rps  p50 {result['p50_ms']:7.1f}  p95 {result['p95_ms']:7.1f}  "
+        f"p99 {result['p99_ms']:7.1f} ms  sql/req {'-' if queries is None else queries}  "
+        f"ошибок {result['errors']}"
+    )
+
+
+def _change(old, new) -> str:
+    if not old:
+        return "     -"
+    return f"{(new - old) / old * 100:+6.1f}%"
+
+
+def compare_results(baseline: dict, current: dict, threshold: float) -> bool:
+    """Печатает разницу по сценариям; False, если есть регрессия."""
+    print(f"\nБаза: {baseline['meta'].get('commit')}  сейчас: {current['meta'].get('commit')}")
+    # Комментарии и реакции добавляют сами сценарии, сравнивается остальное
+    shape = lambda result: {key: result["meta"]["dataset"].get(key) for key in ("users", "posts", "tags")}
+    if shape(baseline) != shape(current):
+        print("Внимание: наборы данных различаются, сравнение приблизительное")
+
+    ok = True
+    for name, new in current["scenarios"].items():
+        old = baseline["scenarios"].get(name)
+        if old is None:
+            print(f"{name:>15}: нет в базе")
+            continue
+        problems = []
+        if old["rps"] and (old["rps"] - new["rps"]) / old["rps"] * 100 > threshold:
+            problems.append("rps")
+        if old["p95_ms"] and (new["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 > threshold:
+            problems.append("p95")
+        old_queries, new_queries = old.get("queries_per_request"), new.get("queries_per_request")
+        if old_queries is not None and new_queries is not None and new_queries > old_queries + 0.5:
+            problems.append("sql/req")
+        if new["errors"] > old["errors"]:
+            problems.append("ошибки")
+        ok = ok and not problems
+        print(
+            f"{name:>15}: rps {old['rps']:8.1f} -> {new['rps']:8.1f} {_change(old['rps'], new['rps'])}  "
+            f"p95 {old['p95_ms']:7.1f} -> {new['p95_ms']:7.1f} {_change(old['p95_ms'], new['p95_ms'])}  "
+            f"sql/req {old_queries} -> {new_queries}"
+            + (f"  РЕГРЕССИЯ: {', '.join(problems)}" if problems else "")
+        )
+    return ok
+
+
+def compare(args):
+    with open(args.baseline, encoding="utf-8") as file:
+        baseline = json.load(file)
+    with open(args.current, encoding="utf-8") as file:
+        current = json.load(file)
+    if not compare_results(baseline, current, args.threshold):
+        sys.exit(1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    seed_parser = commands.add_parser("seed", help="заполнить базу DATABASE_URL")
+    seed_parser.add_argument("--users", type=int, default=200)
+    seed_parser.add_argument("--posts", type=int, default=2000)
+    seed_parser.add_argument("--tags", type=int, default=50)
+    seed_parser.add_argument("--comments", type=int, default=10000)
+    seed_parser.add_argument("--reactions", type=int, default=20000)
+    seed_parser.add_argument("--image-ratio", type=float, default=0.1, help="доля постов с картинкой")
+    seed_parser.add_argument("--skew", type=float, default=1.1, help="показатель распределения Ципфа")
+    seed_parser.add_argument("--seed", type=int, default=1)
+    seed_parser.set_defaults(handler=seed)
+
+    run_parser = commands.add_parser("run", help="прогнать сценарии против сервера")
+    run_parser.add_argument("--url", default="http://127.0.0.1:8000")
+    run_parser.add_argument("--scenario", action="append", help="только этот сценарий (можно несколько)")
+    run_parser.add_argument("--requests", type=int, default=500, help="запросов на сценарий")
+    run_parser.add_argument("--concurrency", type=int, default=20)
+    run_parser.add_argument("--skew", type=float, default=1.1)
+    run_parser.add_argument("--seed", type=int, default=1)
+    run_parser.add_argument("--output", help="куда записать JSON с результатом")
+    run_parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    run_parser.add_argument("--threshold", type=float, default=10.0, help="допустимое ухудшение, %%")
+    run_parser.set_defaults(handler=run)
+
+    compare_parser = commands.add_parser("compare", help="сравнить два файла результатов")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("current")
+    compare_parser.add_argument("--threshold", type=float, default=10.0)
+    compare_parser.set_defaults(handler=compare)
+
+    args = parser.parse_args()
+    args.handler(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Нагрузочный прогон против запущенного сервера.
+
+    uvicorn app.main:app --workers 1 &
+    python bench/load.py --url http://127.0.0.1:8000 --path / --path /posts/1 \
+        --concurrency 50 --requests 2000
+
+Печатает пропускную способность и перцентили задержки; чтобы сравнить
+две версии, запустите его на обоих коммитах с одной и той же базой.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+import httpx
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+async def run(url, paths, concurrency, total):
+    latencies = []
+    errors = 0
+    counter = iter(range(total))
+
+    async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                path = paths[i % len(paths)]
+                started = time.perf_counter()
+                try:
+                    response = await client.get(path)
+                    if response.status_code >= 500:
+                        errors += 1
+                except httpx.HTTPError:
+                    errors += 1
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": len(latencies) / elapsed,
+        "mean_ms": statistics.mean(latencies) * 1000,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p95_ms": percentile(latencies, 95) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--path", action="append", dest="paths")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.paths or ["/"], args.concurrency, args.requests))
+    for key, value in result.items():
+        print(f"{key:>10}: {value:.1f}" if isinstance(value, float) else f"{key:>10}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,81 @@
+"""Всплеск логинов и задержка посторонних запросов во время него.
+
+    uvicorn app.main:app --workers 1 &
+    python bench/login_burst.py --url http://127.0.0.1:8000 --logins 40 --concurrency 20
+
+Пока идут логины, отдельная задача каждые --probe-interval мс запрашивает
+--probe-path. Если bcrypt блокирует цикл событий, задержка проб растет
+до суммарного времени хэширования; в пуле потоков - остается около нуля.
+"""
+import argparse
+import asyncio
+import time
+import httpx
+from load import percentile
+
+
+async def run(url, email, password, logins, concurrency, probe_path, probe_interval):
+    login_latencies, probe_latencies = [], []
+    statuses = {}
+    counter = iter(range(logins))
+
+    async with httpx.AsyncClient(base_url=url, timeout=60) as client:
+        await client.post("/register", data={
+            "email": email, "username": email.split("@")[0],
+            "password": password, "confirm_password": password,
+        })
+
+        async def login_worker():
+            for _ in counter:
+                started = time.perf_counter()
+                response = await client.post("/login", data={"email": email, "password": password})
+                login_latencies.append(time.perf_counter() - started)
+                statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+        async def probe(done):
+            while not done.is_set():
+                started = time.perf_counter()
+                await client.get(probe_path)
+                probe_latencies.append(time.perf_counter() - started)
+                await asyncio.sleep(probe_interval / 1000)
+
+        done = asyncio.Event()
+        probe_task = asyncio.create_task(probe(done))
+        started = time.perf_counter()
+        await asyncio.gather(*(login_worker() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - started
+        done.set()
+        await probe_task
+
+    return {
+        "logins": len(login_latencies),
+        "statuses": statuses,
+        "elapsed_s": elapsed,
+        "login_p50_ms": percentile(login_latencies, 50) * 1000,
+        "login_p99_ms": percentile(login_latencies, 99) * 1000,
+        "probes": len(probe_latencies),
+        "probe_p50_ms": percentile(probe_latencies, 50) * 1000,
+        "probe_p99_ms": percentile(probe_latencies, 99) * 1000,
+        "probe_max_ms": max(probe_latencies, default=0) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--email", default="burst@example.com")
+    parser.add_argument("--password", default="burst-password")
+    parser.add_argument("--logins", type=int, default=40)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--probe-path", default="/health")
+    parser.add_argument("--probe-interval", type=int, default=20)
+    args = parser.parse_args()
+
+    result = asyncio.run(run(args.url, args.email, args.password, args.logins,
+                             args.concurrency, args.probe_path, args.probe_interval))
+    for key, value in result.items():
+        print(f"{key:>13}: {value:.1f}" if isinstance(value, float) else f"{key:>13}: {value}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,240 @@
+"""Проверка планов запросов: ни один запрос лент и профиля не читает таблицу целиком.
+
+    python bench/query_plans.py                  # временная SQLite-база
+    DATABASE_URL=postgresql://... python bench/query_plans.py --posts 20000
+
+Схема создается миграциями (alembic upgrade head), затем база
+заполняется --posts постами с тегами, комментариями и реакциями. Каждый
+запрос из checks() вызывается как в обработчиках, все его SELECT
+перехватываются и прогоняются через EXPLAIN с теми же параметрами.
+Полный просмотр таблицы (SCAN без индекса в SQLite, Seq Scan в Postgres
+при enable_seqscan = off) - ошибка, код возврата 1.
+
+Базу для проверки нужно отдавать пустую: скрипт ее наполняет. Те же
+проверки выполняет tests/test_query_plans.py на тестовой базе.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+from collections import namedtuple
+from datetime import datetime, timedelta
+
+if __name__ == "__main__":
+    if "DATABASE_URL" not in os.environ:
+        os.environ["DATABASE_URL"] = "sqlite:///" + os.path.join(tempfile.mkdtemp(), "plans.db")
+    sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import event, func, insert, select, text  # noqa: E402
+import app.models as models  # noqa: E402
+from app import crud, migrations  # noqa: E402
+from app.counters import ensure_site_counters, rebuild_counters  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+from app.search import install_search_index  # noqa: E402
+
+# Таблицы, которые читаются целиком намеренно
+ALLOWED_SCANS = {
+    "site_counters",  # три строки
+}
+
+WORDS = "python fastapi sqlite postgres индекс запрос план кэш очередь миграция".split()
+
+# С чем вызываются проверки: первый добавленный пользователь и пост
+Sample = namedtuple("Sample", ["user_id", "username", "email", "post_id", "tag"])
+
+
+def _last_id(db, model) -> int:
+    return db.scalar(select(func.max(model.id))) or 0
+
+
+def seed(posts: int, users: int) -> Sample:
+    migrations.upgrade(engine)
+    install_search_index(engine)
+    rng = random.Random(1)
+    start = datetime(2024, 1, 1)
+    with SessionLocal() as db:
+        # В базе уже могут быть записи (тесты): id считаются от последних
+        user0, tag0, post0 = _last_id(db, models.User), _last_id(db, models.Tag), _last_id(db, models.Post)
+        db.execute(insert(models.User), [
+            {"email": f"u{i}@example.com", "username": f"u{i}", "hashed_password": "-"}
+            for i in range(1, users + 1)
+        ])
+        db.execute(insert(models.Tag), [{"name": f"tag{i}"} for i in range(1, 51)])
+        db.execute(insert(models.Post), [
+            {
+                "title": f"Пост {i}",
+                "content": " ".join(rng.choices(WORDS, k=30)),
+                "author_id": user0 + rng.randint(1, users),
+                "created_at": start + timedelta(minutes=i),
+                "updated_at": start + timedelta(minutes=i, seconds=30) if i % 10 == 0 else None,
+            }
+            for i in range(posts)
+        ])
+        db.execute(insert(models.post_tags), [
+            {"post_id": post0 + post_id, "tag_id": tag0 + tag_id}
+            for post_id in range(1, posts + 1)
+            for tag_id in rng.sample(range(1, 51), 3)
+        ])
+        db.execute(insert(models.Comment), [
+            {
+                "content": "Комментарий",
+                "author_id": user0 + rng.randint(1, users),
+                "post_id": post0 + rng.randint(1, posts),
+                "created_at": start + timedelta(minutes=i),
+            }
+            for i in range(posts * 2)
+        ])
+        reactions = {(post0 + rng.randint(1, posts), user0 + rng.randint(1, users)) for _ in range(posts * 3)}
+        db.execute(insert(models.Reaction), [
+            {
+                "post_id": post_id,
+                "user_id": user_id,
+                "is_like": rng.random() < 0.8,
+                "created_at": start + timedelta(seconds=i),
+            }
+            for i, (post_id, user_id) in enumerate(sorted(reactions))
+        ])
+        db.commit()
+        rebuild_counters(db)
+        ensure_site_counters(db)
+    with engine.begin() as connection:
+        connection.execute(text("ANALYZE"))
+    return Sample(user0 + 1, "u1", "u1@example.com", post0 + 1, "tag1")
+
+
+def _next(page):
+    return page.next_cursor
+
+
+def checks(db, sample: Sample):
+    """(название, функция) - то, что выполняют обработчики на каждый запрос."""
+    user_id, post_id, tag = sample.user_id, sample.post_id, sample.tag
+    feed = crud.get_posts(db, limit=10)
+    tagged = crud.get_posts_by_tag(db, tag, limit=10)
+    comments = crud.get_comments_by_post(db, post_id, limit=5)
+    own = crud.get_user_posts(db, user_id, limit=5)
+    liked = crud.get_user_liked_posts(db, user_id, limit=5)
+    written = crud.get_user_comments(db, user_id, limit=5)
+    found = crud.search_posts(db, "python", limit=10)
+    return [
+        ("главная", lambda: crud.get_posts(db, limit=10)),
+        ("главная, курсор", lambda: crud.get_posts(db, limit=10, cursor=_next(feed))),
+        ("главная, страница 5", lambda: crud.get_posts(db, skip=40, limit=10)),
+        ("версия лент", lambda: crud.get_listing_version(db)),
+        ("пост", lambda: crud.get_post_with_reactions(db, post_id, user_id)),
+        ("версия поста", lambda: crud.get_post_version(db, post_id)),
+        ("комментарии поста", lambda: crud.get_comments_by_post(db, post_id, limit=5)),
+        ("комментарии поста, поток", lambda: db.scalars(crud.first_comments_query(post_id, 21)).all()),
+        ("комментарии поста, курсор",
+         lambda: crud.get_comments_by_post(db, post_id, limit=5, cursor=_next(comments))),
+        ("тег", lambda: crud.get_posts_by_tag(db, tag, limit=10)),
+        ("тег, курсор", lambda: crud.get_posts_by_tag(db, tag, limit=10, cursor=_next(tagged))),
+        ("тег, число постов", lambda: crud.count_posts_by_tag(db, tag)),
+        ("поиск", lambda: crud.search_posts(db, "python", limit=10)),
+        ("поиск, курсор", lambda: crud.search_posts(db, "python", limit=10, cursor=_next(found))),
+        ("популярные теги", lambda: crud.get_popular_tags(db, 10)),
+        ("облако тегов", lambda: crud.get_used_tags(db)),
+        ("пользователь по имени", lambda: crud.get_user_by_username(db, sample.username)),
+        ("пользователь по email", lambda: crud.get_user_by_email(db, sample.email)),
+        ("профиль: посты", lambda: crud.get_user_posts(db, user_id, limit=5)),
+        ("профиль: посты, курсор", lambda: crud.get_user_posts(db, user_id, limit=5, cursor=_next(own))),
+        ("профиль: лайки", lambda: crud.get_user_liked_posts(db, user_id, limit=5)),
+        ("профиль: лайки, курсор",
+         lambda: crud.get_user_liked_posts(db, user_id, limit=5, cursor=_next(liked))),
+        ("профиль: комментарии", lambda: crud.get_user_comments(db, user_id, limit=5)),
+        ("профиль: комментарии, курсор",
+         lambda: crud.get_user_comments(db, user_id, limit=5, cursor=_next(written))),
+    ]
+
+
+def capture(fn) -> list:
+    statements = []
+
+    def remember(conn, cursor, statement, parameters, context, executemany):
+        if statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            statements.append((statement, parameters))
+
+    event.listen(engine, "before_cursor_execute", remember)
+    try:
+        fn()
+    finally:
+        event.remove(engine, "before_cursor_execute", remember)
+    return statements
+
+
+def explain(connection, statement, parameters) -> list:
+    if connection.dialect.name == "postgresql":
+        rows = connection.exec_driver_sql("EXPLAIN " + statement, parameters)
+        return [row[0] for row in rows]
+    rows = connection.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, parameters)
+    return [row[-1] for row in rows]
+
+
+def full_scans(plan: list) -> list:
+    # SCAN по индексу и сортировка во временном B-дереве: индекс не дает
+    # нужного порядка, читается и сортируется вся таблица ради LIMIT
+    sorted_in_temp = any(line.strip().startswith("USE TEMP B-TREE FOR ORDER BY") for line in plan)
+    found = []
+    for line in plan:
+        line = line.strip().lstrip("->").strip()
+        if line.startswith("Seq Scan on "):
+            table = line.split()[3]
+        elif (line.startswith("SCAN ") and "VIRTUAL TABLE" not in line
+              and (" USING " not in line or sorted_in_temp)):
+            table = line.split()[1]
+        else:
+            continue
+        if table not in ALLOWED_SCANS and table != "CONSTANT":
+            found.append(line)
+    return found
+
+
+def plans(db, fn) -> list:
+    """[(запрос, план, полные просмотры)] для всех SELECT, которые делает fn."""
+    statements = capture(fn)
+    db.rollback()
+    result = []
+    with engine.connect() as connection:
+        if connection.dialect.name == "postgresql":
+            # Seq Scan при выключенном seqscan означает: подходящего индекса нет
+            connection.exec_driver_sql("SET enable_seqscan = off")
+        for statement, parameters in statements:
+            plan = explain(connection, statement, parameters)
+            result.append((statement, plan, full_scans(plan)))
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--posts", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--show", action="store_true", help="печатать все планы, а не только ошибки")
+    args = parser.parse_args()
+
+    print(f"Заполнение базы: {args.posts} постов, {args.users} пользователей")
+    sample = seed(args.posts, args.users)
+
+    failures = 0
+    with SessionLocal() as db:
+        for name, fn in checks(db, sample):
+            statements = plans(db, fn)
+            problems = [item for item in statements if item[2] or args.show]
+            bad = any(scans for _, _, scans in problems)
+            failures += bad
+            print(f"{'FAIL' if bad else 'ok  '} {name} ({len(statements)} запр.)")
+            for statement, plan, scans in problems:
+                if not scans and not args.show:
+                    continue
+                print("     " + " ".join(statement.split())[:200])
+                for line in plan:
+                    print("       " + line)
+
+    if failures:
+        print(f"\nПолный просмотр таблицы в {failures} проверках")
+        sys.exit(1)
+    print("\nВсе запросы идут по индексам")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""Лайки и дизлайки одного поста от многих пользователей.
+
+    DATABASE_URL=sqlite:///./bench.db uvicorn app.main:app --workers 1 &
+    DATABASE_URL=sqlite:///./bench.db python bench/reactions.py --users 200 --seconds 10
+
+Скрипт сам создает --users пользователей и пост в той же базе (пароль не
+нужен: токены подписываются SECRET_KEY приложения), затем --concurrency
+клиентов случайно ставят like/dislike/remove-reaction на один пост.
+В конце ждет записи отложенных счетчиков и сверяет likes_count /
+dislikes_count поста с COUNT(*) по reactions.
+"""
+import argparse
+import asyncio
+import os
+import random
+import sys
+import time
+import uuid
+import httpx
+from load import percentile
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+from sqlalchemy import func, select  # noqa: E402
+import app.models as models  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app import migrations  # noqa: E402
+from app.database import SessionLocal, engine  # noqa: E402
+
+ACTIONS = ("like", "like", "dislike", "remove-reaction")
+
+
+def prepare(users):
+    migrations.upgrade(engine)
+    prefix = uuid.uuid4().hex[:8]
+    with SessionLocal() as db:
+        accounts = [
+            models.User(email=f"r{prefix}{i}@example.com", username=f"r{prefix}{i}", hashed_password="-")
+            for i in range(users)
+        ]
+        db.add_all(accounts)
+        db.flush()
+        post = models.Post(title="Горячий пост", content="Нагрузочный прогон реакций", author_id=accounts[0].id)
+        db.add(post)
+        db.commit()
+        tokens = [create_access_token({"sub": user.username, "uid": user.id}) for user in accounts]
+        return post.id, tokens
+
+
+def post_counters(post_id):
+    Reaction = models.Reaction
+    with SessionLocal() as db:
+        stored = db.execute(
+            select(models.Post.likes_count, models.Post.dislikes_count).where(models.Post.id == post_id)
+        ).one()
+        actual = db.execute(
+            select(func.count().filter(Reaction.is_like == True), func.count().filter(Reaction.is_like == False))
+            .where(Reaction.post_id == post_id)
+        ).one()
+    return tuple(stored), tuple(actual)
+
+
+async def run(url, post_id, tokens, concurrency, seconds):
+    latencies = []
+    statuses = {}
+    deadline = time.perf_counter() + seconds
+
+    async def worker():
+        async with httpx.AsyncClient(base_url=url, timeout=30) as client:
+            while time.perf_counter() < deadline:
+                token = random.choice(tokens)
+                action = random.choice(ACTIONS)
+                started = time.perf_counter()
+                try:
+                    response = await client.post(
+                        f"/posts/{post_id}/{action}",
+                        cookies={"access_token": f"Bearer {token}"},
+                        follow_redirects=False,
+                    )
+                    status = response.status_code
+                except httpx.HTTPError:
+                    status = "error"
+                latencies.append(time.perf_counter() - started)
+                statuses[status] = statuses.get(status, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    return {
+        "reactions": len(latencies),
+        "statuses": statuses,
+        "per_second": len(latencies) / elapsed,
+        "p50_ms": percentile(latencies, 50) * 1000,
+        "p99_ms": percentile(latencies, 99) * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--url", default="http://127.0.0.1:8000")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--settle", type=float, default=1.0, help="ожидание записи счетчиков, с")
+    args = parser.parse_args()
+
+    post_id, tokens = prepare(args.users)
+    result = asyncio.run(run(args.url, post_id, tokens, args.concurrency, args.seconds))
+    for key, value in result.items():
+        print(f"{key:>10}: {value:.1f}" if isinstance(value, float) else f"{key:>10}: {value}")
+
+    time.sleep(args.settle)
+    stored, actual = post_counters(post_id)
+    print(f"  counters: {stored} в posts, {actual} по reactions - {'совпадают' if stored == actual else 'РАСХОДЯТСЯ'}")
+
+
+if __name__ == "__main__":
+    main()
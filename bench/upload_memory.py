@@ -0,0 +1,88 @@
+"""Пиковая память Python при сохранении загрузки (tracemalloc).
+
+    python bench/upload_memory.py --size-mb 4 --oversize-mb 50
+
+Сравнивает save_upload_file с прежним способом (read() целиком + BytesIO)
+на настоящем JPEG и на файле больше MAX_FILE_SIZE. Нарезка вариантов идет
+в отдельном процессе и в замер не попадает.
+"""
+import argparse
+import asyncio
+import io
+import os
+import sys
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+os.environ.setdefault("UPLOAD_DIR", tempfile.mkdtemp(prefix="upload-bench-"))
+
+from fastapi import HTTPException, UploadFile  # noqa: E402
+from PIL import Image  # noqa: E402
+from app.config import settings  # noqa: E402
+from app.utils import file_upload  # noqa: E402
+
+
+def make_jpeg(path, size_mb):
+    side = int((size_mb * 1024 * 1024 / 1.5) ** 0.5)
+    Image.effect_noise((side, side), 64).convert("RGB").save(path, "JPEG", quality=95)
+
+
+def make_oversize(path, size_mb):
+    with open(path, "wb") as f:
+        f.write(b"\xff\xd8\xff\xe0")
+        for _ in range(size_mb):
+            f.write(b"\0" * 1024 * 1024)
+
+
+def buffered_save(upload_file):
+    """Прежняя реализация: весь файл в памяти и еще одна копия в BytesIO."""
+    contents = upload_file.file.read()
+    if len(contents) > settings.MAX_FILE_SIZE:
+        raise HTTPException(400, "too large")
+    image = Image.open(io.BytesIO(contents))
+    image.load()
+
+
+async def measure(label, path, save):
+    with open(path, "rb") as f:
+        upload = UploadFile(file=f, filename=os.path.basename(path))
+        tracemalloc.start()
+        outcome = "ok"
+        try:
+            result = save(upload)
+            if asyncio.iscoroutine(result):
+                await result
+        except HTTPException as exc:
+            outcome = f"HTTP {exc.status_code}"
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    print(f"{label:<28} {os.path.getsize(path) / 2**20:7.1f} MB  peak {peak / 2**20:7.2f} MB  {outcome}")
+
+
+async def run(size_mb, oversize_mb):
+    workdir = tempfile.mkdtemp(prefix="upload-src-")
+    photo = os.path.join(workdir, "photo.jpg")
+    huge = os.path.join(workdir, "huge.jpg")
+    make_jpeg(photo, size_mb)
+    make_oversize(huge, oversize_mb)
+
+    await measure("streaming, photo", photo, file_upload.save_upload_file)
+    await measure("streaming, oversize", huge, file_upload.save_upload_file)
+    await measure("buffered, photo", photo, buffered_save)
+    await measure("buffered, oversize", huge, buffered_save)
+
+    await asyncio.sleep(0)
+    file_upload.shutdown_image_workers()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--oversize-mb", type=int, default=50)
+    args = parser.parse_args()
+    asyncio.run(run(args.size_mb, args.oversize_mb))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,42 @@
+"""Общие фикстуры: приложение на временной SQLite-базе.
+
+Настройки читаются при импорте app.config, поэтому окружение задается
+здесь, до первого импорта приложения.
+"""
+import os
+import tempfile
+
+_workdir = tempfile.mkdtemp(prefix="blog-tests-")
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_workdir, 'test.db')}"
+os.environ["UPLOAD_DIR"] = os.path.join(_workdir, "uploads")
+os.environ["UPLOAD_TMP_DIR"] = os.path.join(_workdir, "upload-tmp")
+
+import pytest  # noqa: E402
+from fastapi.testclient import TestClient  # noqa: E402
+from app import models  # noqa: E402
+from app.auth import create_access_token  # noqa: E402
+from app.database import SessionLocal  # noqa: E402
+from app.main import app  # noqa: E402
+
+
+@pytest.fixture(scope="session")
+def client():
+    # Контекст запускает startup: миграции, поисковый индекс, счетчики
+    with TestClient(app) as client:
+        yield client
+
+
+@pytest.fixture(scope="session")
+def user(client):
+    with SessionLocal() as db:
+        account = models.User(email="alice@example.com", username="alice", hashed_password="-")
+        db.add(account)
+        db.commit()
+        db.refresh(account)
+        return account
+
+
+@pytest.fixture(scope="session")
+def auth_cookie(user) -> str:
+    token = create_access_token({"sub": user.username, "uid": user.id})
+    return f'access_token="Bearer {token}"'
@@ -0,0 +1,45 @@
+"""Статика: выбор предсжатой копии по Accept-Encoding."""
+import pytest
+from fastapi.testclient import TestClient
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from app import assets
+
+
+@pytest.fixture(scope="module")
+def static_client(tmp_path_factory):
+    directory = tmp_path_factory.mktemp("static")
+    (directory / "app.js").write_text("console.log('статика');\n" * 200, encoding="utf-8")
+    assets.build_compressed(str(directory))
+    app = Starlette(routes=[Mount("/static", assets.AssetFiles(directory=str(directory)))])
+    with TestClient(app) as client:
+        yield client
+
+
+def encoding_for(client, accept_encoding):
+    response = client.get("/static/app.js", headers={"Accept-Encoding": accept_encoding})
+    assert response.status_code == 200
+    return response.headers.get("content-encoding")
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip; q=0.0", None),
+    ("*;q=0", None),
+    ("br;q=0, gzip", "gzip"),
+    ("br;q=0, gzip;q=0", None),
+])
+def test_precompressed_copy_respects_q_values(static_client, header, expected):
+    assert encoding_for(static_client, header) == expected
+
+
+@pytest.mark.skipif(assets.brotli is None, reason="brotli не установлен")
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, br", "br"),
+    ("br;q=0.5, gzip", "gzip"),
+    ("*", "br"),
+])
+def test_brotli_copy_negotiation(static_client, header, expected):
+    assert encoding_for(static_client, header) == expected
@@ -0,0 +1,117 @@
+"""Дымовой прогон bench/harness.py: seed, короткий run против uvicorn, compare.
+
+Скрипт не входит в приложение и иначе ничем не запускается, поэтому здесь
+проверяется, что он работает на текущем коде и пишет JSON ожидаемой формы.
+"""
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import httpx
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HARNESS = os.path.join(ROOT, "bench", "harness.py")
+SCENARIOS = ("home", "post", "tag", "search", "profile", "post_logged_in", "like", "comment", "login")
+STATS = {"requests", "errors", "statuses", "rps", "p50_ms", "p95_ms", "p99_ms", "queries_per_request"}
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture(scope="module")
+def bench_env(tmp_path_factory):
+    # Своя база: harness наполняет ее, а сервер запускается отдельным процессом
+    workdir = tmp_path_factory.mktemp("harness")
+    env = dict(os.environ)
+    env.update(
+        DATABASE_URL=f"sqlite:///{workdir / 'bench.db'}",
+        UPLOAD_DIR=str(workdir / "uploads"),
+        UPLOAD_TMP_DIR=str(workdir / "upload-tmp"),
+        TEMPLATE_CACHE_DIR="",
+    )
+    env.pop("ASYNC_DATABASE_URL", None)
+    return workdir, env
+
+
+def harness(env, *args, check=True):
+    return subprocess.run(
+        [sys.executable, HARNESS, *args], cwd=ROOT, env=env,
+        capture_output=True, text=True, timeout=300, check=check,
+    )
+
+
+@pytest.fixture(scope="module")
+def server(bench_env):
+    workdir, env = bench_env
+    harness(env, "seed", "--users", "5", "--posts", "20", "--tags", "5",
+            "--comments", "30", "--reactions", "30", "--image-ratio", "0.1")
+
+    port = _free_port()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(port)],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    url = f"http://127.0.0.1:{port}"
+    try:
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                if httpx.get(url + "/metrics", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if process.poll() is not None or time.monotonic() > deadline:
+                pytest.fail("uvicorn не запустился")
+            time.sleep(0.2)
+        yield url
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def test_seed_run_and_compare(bench_env, server):
+    workdir, env = bench_env
+    output = workdir / "run.json"
+    harness(env, "run", "--url", server, "--requests", "4", "--concurrency", "2", "--output", str(output))
+
+    result = json.loads(output.read_text(encoding="utf-8"))
+    assert set(result) == {"meta", "scenarios"}
+    meta = result["meta"]
+    assert {"commit", "created", "url", "requests", "concurrency", "dataset"} <= set(meta)
+    assert meta["dataset"]["users"] == 5 and meta["dataset"]["posts"] == 20
+    assert set(result["scenarios"]) == set(SCENARIOS)
+    for name, stats in result["scenarios"].items():
+        assert set(stats) == STATS, name
+        assert stats["requests"] == 4, name
+        assert stats["errors"] == 0, (name, stats["statuses"])
+        assert stats["queries_per_request"] is not None, name
+
+    # Тот же файл - не регрессия; втрое медленнее - регрессия, код 1
+    assert harness(env, "compare", str(output), str(output)).returncode == 0
+    slower = json.loads(output.read_text(encoding="utf-8"))
+    for stats in slower["scenarios"].values():
+        stats["rps"] /= 3
+        stats["p95_ms"] *= 3
+    slower_path = workdir / "slower.json"
+    slower_path.write_text(json.dumps(slower), encoding="utf-8")
+    assert harness(env, "compare", str(output), str(slower_path), check=False).returncode == 1
+
+
+@pytest.mark.parametrize("script", sorted(
+    name for name in os.listdir(os.path.join(ROOT, "bench")) if name.endswith(".py")
+))
+def test_bench_scripts_start(bench_env, script):
+    # Остальные скрипты требуют сервер или долгий прогон: проверяем хотя бы,
+    # что они импортируются и разбирают аргументы на текущем коде
+    _, env = bench_env
+    completed = subprocess.run(
+        [sys.executable, os.path.join(ROOT, "bench", script), "--help"], cwd=ROOT, env=env,
+        capture_output=True, text=True, timeout=60,
+    )
+    assert completed.returncode == 0, completed.stderr
@@ -0,0 +1,49 @@
+"""Первая страница комментариев на странице поста и продолжение по курсору."""
+import re
+import pytest
+from app import async_crud, crud, schemas
+from app.config import settings
+from app.database import AsyncSessionLocal, SessionLocal
+from app.routers.posts import _comment_chunks
+
+
+@pytest.fixture(scope="module")
+def post_with_comments(user):
+    with SessionLocal() as db:
+        post = crud.create_post(db, schemas.PostCreate(title="Обсуждение", content="Текст", tags=[]), user.id)
+        for i in range(settings.COMMENTS_PAGE_SIZE + 3):
+            crud.create_comment(db, schemas.CommentCreate(content=f"Комментарий №{i}"), user.id, post.id)
+        return post.id
+
+
+def test_first_page_is_streamed_in_batches(client, post_with_comments):
+    # TestClient собирает ответ целиком, поэтому части слота смотрим у генератора
+    async def comment_chunks():
+        async with AsyncSessionLocal() as db:
+            post = await async_crud.get_post(db, post_with_comments)
+            return [chunk async for chunk in _comment_chunks(db, post, None)]
+
+    chunks = client.portal.call(comment_chunks)
+    html = "".join(chunks)
+
+    shown = re.findall(r"Комментарий №(\d+)", html)
+    assert len(shown) == settings.COMMENTS_PAGE_SIZE
+    assert shown[0] == str(settings.COMMENTS_PAGE_SIZE + 2)  # новые сначала
+    batches = [chunk for chunk in chunks if "Комментарий №" in chunk]
+    assert len(batches) == settings.COMMENTS_PAGE_SIZE // settings.COMMENTS_STREAM_BATCH
+    assert "Пока нет комментариев" not in html
+
+    assert client.get(f"/posts/{post_with_comments}").text.count("Комментарий №") == settings.COMMENTS_PAGE_SIZE
+
+    cursor = re.search(r'data-load-comments="/posts/\d+/comments\?cursor=([^"]+)"', html).group(1)
+    rest = client.get(f"/posts/{post_with_comments}/comments", params={"cursor": cursor}).json()
+    assert [item["content"] for item in rest["items"]] == [f"Комментарий №{i}" for i in (2, 1, 0)]
+    assert rest["next_cursor"] is None
+
+
+def test_post_without_comments(client, user):
+    with SessionLocal() as db:
+        post = crud.create_post(db, schemas.PostCreate(title="Тишина", content="Текст", tags=[]), user.id)
+    html = client.get(f"/posts/{post.id}").text
+    assert "Пока нет комментариев" in html
+    assert "data-load-comments" not in html
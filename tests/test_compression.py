@@ -0,0 +1,66 @@
+"""Выбор кодировки сжатия по Accept-Encoding и заголовки сжатых ответов."""
+import pytest
+from app import crud, middleware, schemas
+from app.database import SessionLocal
+from app.middleware import CompressionMiddleware
+
+requires_brotli = pytest.mark.skipif(middleware.brotli is None, reason="brotli не установлен")
+
+
+@pytest.fixture
+def choose():
+    return CompressionMiddleware(app=None)._choose_encoding
+
+
+@pytest.mark.parametrize("header, expected", [
+    ("", None),
+    ("identity", None),
+    ("gzip", "gzip"),
+    ("gzip;q=0", None),
+    ("gzip;q=0.0", None),
+    ("gzip; q=0.000", None),
+    ("gzip;q=bogus", None),
+    ("deflate, gzip;q=0.5", "gzip"),
+    ("*;q=0", None),
+    ("*", "gzip"),
+    ("*;q=0, gzip", "gzip"),
+])
+def test_gzip_negotiation(choose, monkeypatch, header, expected):
+    monkeypatch.setattr(middleware, "brotli", None)
+    assert choose(header) == expected
+
+
+@requires_brotli
+@pytest.mark.parametrize("header, expected", [
+    ("gzip, deflate, br", "br"),
+    ("br;q=0, gzip", "gzip"),
+    ("br; q=0, gzip", "gzip"),
+    ("br;q=0.0, gzip;q=0.0", None),
+    ("gzip;q=1.0, br;q=0.5", "gzip"),
+    ("*", "br"),
+    ("*;q=0.5, br;q=0", "gzip"),
+])
+def test_brotli_negotiation(choose, header, expected):
+    assert choose(header) == expected
+
+
+def test_not_modified_keeps_compressed_etag(client, user, monkeypatch):
+    monkeypatch.setattr(middleware, "brotli", None)
+    with SessionLocal() as db:
+        post = crud.create_post(db, schemas.PostCreate(title="Сжатие", content="Текст " * 500, tags=[]), user.id)
+
+    headers = {"Accept-Encoding": "gzip"}
+    full = client.get(f"/posts/{post.id}", headers=headers)
+    assert full.headers["content-encoding"] == "gzip"
+    etag = full.headers["etag"]
+    assert etag.startswith("W/")
+
+    cached = client.get(f"/posts/{post.id}", headers={**headers, "If-None-Match": etag})
+    assert cached.status_code == 304
+    assert cached.headers["etag"] == etag
+    assert "Accept-Encoding" in cached.headers["vary"]
+
+    # Без сжатия и 200, и 304 несут сильный ETag
+    plain = client.get(f"/posts/{post.id}", headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert plain.status_code == 304
+    assert plain.headers["etag"] == etag.removeprefix("W/")
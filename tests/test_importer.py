@@ -0,0 +1,93 @@
+"""Загрузка дампа в отдельную SQLite-базу и пересчет производных данных."""
+import csv
+import gzip
+import json
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+from app import crud, migrations, models
+from app.auth import pwd_context
+from app.cache import tag_cache
+from app.counters import get_site_counts
+from app.importer import ImportFailed, Importer
+from app.search import install_search_index
+
+HASH = pwd_context.hash("secret")
+
+
+def _jsonl(path, rows):
+    path.write_text("".join(json.dumps(row, ensure_ascii=False) + "\n" for row in rows), encoding="utf-8")
+    return str(path)
+
+
+def _csv_gz(path, rows):
+    with gzip.open(path, "wt", encoding="utf-8", newline="") as target:
+        writer = csv.DictWriter(target, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    return str(path)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'import.db'}")
+    migrations.upgrade(engine)
+    install_search_index(engine)
+    # Имена тегов кэшируются в процессе, а база здесь своя
+    tag_cache.clear()
+    yield engine
+    tag_cache.clear()
+    engine.dispose()
+
+
+def test_import_rebuilds_counters_and_search(engine, tmp_path):
+    users = _jsonl(tmp_path / "users.jsonl", [
+        {"id": 1, "email": "ann@example.com", "username": "ann", "hashed_password": HASH},
+        {"id": 2, "email": "bob@example.com", "username": "bob", "hashed_password": HASH},
+    ])
+    posts = _csv_gz(tmp_path / "posts.csv.gz", [
+        {"id": 10, "title": "Про выдру", "content": "Выдра плавает", "author_id": "", "author": "ann",
+         "tags": "звери, вода"},
+        {"id": 11, "title": "Про ежа", "content": "Еж спит", "author_id": 2, "author": "", "tags": "звери"},
+    ])
+    comments = _jsonl(tmp_path / "comments.jsonl", [
+        {"id": 100, "content": "Милота", "post_id": 10, "author": "bob"},
+        {"id": 101, "content": "Согласна", "post_id": 10, "author": "ann"},
+    ])
+    reactions = _jsonl(tmp_path / "reactions.jsonl", [
+        {"post_id": 10, "user": "bob", "is_like": "like"},
+        {"post_id": 11, "user": "ann", "is_like": "dislike"},
+        {"post_id": 10, "user": "bob", "is_like": "like"},  # повтор пропускается
+    ])
+
+    with Session(engine) as db:
+        importer = Importer(db, batch_size=1)
+        assert importer.load("users", users) == 2
+        assert importer.load("posts", posts) == 2
+        assert importer.load("comments", comments) == 2
+        assert importer.load("reactions", reactions) == 3
+        importer.finish()
+
+        assert get_site_counts(db) == {"posts": 2, "users": 2, "comments": 2}
+        otter = db.get(models.Post, 10)
+        assert (otter.comments_count, otter.likes_count, otter.dislikes_count) == (2, 1, 0)
+        assert db.get(models.Post, 11).dislikes_count == 1
+        ann, bob = db.get(models.User, 1), db.get(models.User, 2)
+        assert (ann.posts_count, ann.comments_count, ann.dislikes_count) == (1, 1, 1)
+        assert (bob.posts_count, bob.comments_count, bob.likes_count) == (1, 1, 1)
+        assert {tag.name: tag.posts_count for tag in db.query(models.Tag)} == {"звери": 2, "вода": 1}
+
+        assert [post.id for post in crud.search_posts(db, "выдра").items] == [10]
+        assert crud.count_search_posts(db, "выдра") == 1
+
+
+@pytest.mark.parametrize("value", ["-", "plain-text", "$1$salt$abc", HASH[:-1], ""])
+def test_rejects_rows_without_bcrypt_hash(engine, tmp_path, value):
+    users = _jsonl(tmp_path / "users.jsonl", [
+        {"email": "ok@example.com", "username": "ok", "hashed_password": HASH},
+        {"email": "bad@example.com", "username": "bad", "hashed_password": value},
+    ])
+    with Session(engine) as db:
+        with pytest.raises(ImportFailed, match="строки 1-2.*bad"):
+            Importer(db).load("users", users)
+        assert db.query(models.User).count() == 0
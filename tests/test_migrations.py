@@ -0,0 +1,49 @@
+"""Схема существующей базы догоняет модели: счетчики добавляются и
+заполняются миграцией, а не ждут пересчета вручную."""
+import pytest
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.orm import Session
+from app import migrations, models
+from app.counters import ensure_site_counters, get_site_counts
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'old.db'}")
+    yield engine
+    engine.dispose()
+
+
+def test_counters_are_backfilled_on_existing_database(engine):
+    # База в схеме до счетчиков, с данными
+    migrations.upgrade(engine, "0001")
+    assert "posts_count" not in {column["name"] for column in inspect(engine).get_columns("users")}
+    with engine.begin() as connection:
+        connection.execute(text(
+            "INSERT INTO users (id, email, username, hashed_password, is_active) VALUES "
+            "(1, 'ann@example.com', 'ann', '-', 1), (2, 'bob@example.com', 'bob', '-', 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO posts (id, title, content, author_id) VALUES (1, 'a', 'a', 1), (2, 'b', 'b', 1)"
+        ))
+        connection.execute(text("INSERT INTO tags (id, name) VALUES (1, 'py')"))
+        connection.execute(text("INSERT INTO post_tags (post_id, tag_id) VALUES (1, 1), (2, 1), (2, 1)"))
+        connection.execute(text(
+            "INSERT INTO comments (content, post_id, author_id) VALUES ('x', 1, 2), ('y', 1, 1)"
+        ))
+        connection.execute(text(
+            "INSERT INTO reactions (post_id, user_id, is_like) VALUES (1, 2, 1), (2, 2, 0)"
+        ))
+
+    migrations.upgrade(engine)
+
+    with Session(engine) as db:
+        ensure_site_counters(db)
+        first, second = db.get(models.Post, 1), db.get(models.Post, 2)
+        assert (first.likes_count, first.dislikes_count, first.comments_count) == (1, 0, 2)
+        assert second.dislikes_count == 1
+        ann, bob = db.get(models.User, 1), db.get(models.User, 2)
+        assert (ann.posts_count, ann.comments_count) == (2, 1)
+        assert (bob.comments_count, bob.likes_count, bob.dislikes_count) == (1, 1, 1)
+        assert db.get(models.Tag, 1).posts_count == 2  # повторная связь схлопнута
+        assert get_site_counts(db) == {"posts": 2, "users": 2, "comments": 2}
@@ -0,0 +1,84 @@
+"""Курсоры и предел OFFSET-пагинации."""
+import base64
+import json
+import re
+from urllib.parse import parse_qs, urlsplit
+import pytest
+from app import crud, schemas
+from app.config import settings
+from app.database import SessionLocal
+from app.pagination import OffsetTooDeep, decode_cursor, encode_cursor
+
+PER_PAGE = 2
+DEEP_PAGE = settings.MAX_OFFSET_PAGE + 1
+
+
+@pytest.fixture(scope="module")
+def many_posts(user):
+    with SessionLocal() as db:
+        for i in range(PER_PAGE * DEEP_PAGE + 1):
+            crud.create_post(db, schemas.PostCreate(title=f"Лента {i}", content="Текст", tags=["deep"]), user.id)
+
+
+def _raw_cursor(payload) -> str:
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip("=")
+
+
+def test_cursor_round_trip():
+    assert decode_cursor(encode_cursor(1.5, 7)) == (1.5, 7)
+
+
+@pytest.mark.parametrize("cursor", [
+    "не base64",
+    _raw_cursor([1, 2, 3]),
+    _raw_cursor([True, 1]),
+    _raw_cursor([1, 2 ** 70]),
+    _raw_cursor([10 ** 400, 1]),
+    _raw_cursor(["2024-13-01", 1]),
+    "WzEsIE5hTl0",  # [1, NaN]
+])
+def test_forged_cursor_is_ignored(cursor):
+    assert decode_cursor(cursor) is None
+
+
+def test_paginate_refuses_deep_offset(many_posts):
+    with SessionLocal() as db:
+        with pytest.raises(OffsetTooDeep):
+            crud.get_posts(db, skip=settings.MAX_OFFSET_PAGE * PER_PAGE, limit=PER_PAGE)
+        assert len(crud.get_posts(db, skip=(settings.MAX_OFFSET_PAGE - 1) * PER_PAGE, limit=PER_PAGE).items) == PER_PAGE
+
+
+def test_api_deep_offset_points_to_cursor(client, many_posts):
+    response = client.get("/posts/", params={"skip": 100, "limit": 10})
+    assert response.status_code == 400
+    assert "cursor" in response.json()["detail"]
+
+    last = client.get("/posts/", params={"skip": (settings.MAX_OFFSET_PAGE - 1) * PER_PAGE, "limit": PER_PAGE})
+    assert last.status_code == 200
+    cursor = last.headers["X-Next-Cursor"]
+    deeper = client.get("/posts/", params={"skip": 100, "limit": PER_PAGE, "cursor": cursor})
+    assert deeper.status_code == 200
+    assert len(deeper.json()) == PER_PAGE
+
+
+@pytest.mark.parametrize("path", ["/", "/search", "/tag/deep", "/profile/alice"])
+def test_deep_html_page_redirects_to_cursor_paging(client, many_posts, path):
+    params = {"page": DEEP_PAGE, "per_page": PER_PAGE, "cursor": "испорчен", "q": "Лента"}
+    response = client.get(path, params=params, follow_redirects=False)
+    assert response.status_code == 302
+    location = urlsplit(response.headers["location"])
+    assert location.path == path
+    query = parse_qs(location.query)
+    assert query["page"] == [str(settings.MAX_OFFSET_PAGE)]
+    assert query["per_page"] == [str(PER_PAGE)]
+    assert "cursor" not in query
+
+
+@pytest.mark.parametrize("path", ["/", "/tag/deep", "/profile/alice"])
+def test_cursor_continues_past_offset_pages(client, many_posts, path):
+    html = client.get(path, params={"page": settings.MAX_OFFSET_PAGE, "per_page": PER_PAGE}).text
+    cursor = re.search(rf'page={DEEP_PAGE}&(?:amp;)?cursor=([\w-]+)', html).group(1)
+    deeper = client.get(path, params={"page": DEEP_PAGE, "per_page": PER_PAGE, "cursor": cursor},
+                        follow_redirects=False)
+    assert deeper.status_code == 200
+    assert "Лента" in deeper.text
@@ -0,0 +1,74 @@
+"""Число SQL-запросов страницы не зависит от числа строк на ней (нет N+1)."""
+import pytest
+from app import crud, models, schemas
+from app.cache import page_cache
+from app.database import SessionLocal, count_queries
+
+SIZES = {"few": 5, "many": 50}
+
+
+def _make_set(db, name: str, size: int) -> dict:
+    # У каждого поста свой автор и свой тег: ленивые загрузки автора и
+    # тегов дали бы по запросу на строку
+    users = []
+    for i in range(size):
+        user = models.User(email=f"{name}{i}@example.com", username=f"{name}{i}", hashed_password="-")
+        db.add(user)
+        users.append(user)
+    db.commit()
+
+    word = f"{name}слово"
+    posts = [
+        crud.create_post(db, schemas.PostCreate(
+            title=f"{name} {i}", content=f"{word} текст", tags=[f"{name}tag", f"{name}tag{i}"],
+        ), user.id)
+        for i, user in enumerate(users)
+    ]
+    owner, discussed = users[0], posts[0]
+    for i, (user, post) in enumerate(zip(users, posts)):
+        crud.create_comment(db, schemas.CommentCreate(content=f"Ответ {i}"), user.id, discussed.id)
+        crud.create_comment(db, schemas.CommentCreate(content=f"Свой {i}"), owner.id, post.id)
+        crud.set_reaction(db, discussed.id, user.id, True)
+        crud.set_reaction(db, post.id, owner.id, i % 2 == 0)
+    # Владелец - автор всех постов набора: вкладка "посты" профиля на size строк
+    for post in posts[1:]:
+        post.author_id = owner.id
+    db.commit()
+    return {"size": size, "owner": owner.username, "post": discussed.id, "tag": f"{name}tag", "word": word}
+
+
+@pytest.fixture(scope="module")
+def sets(client):
+    with SessionLocal() as db:
+        return {name: _make_set(db, name, size) for name, size in SIZES.items()}
+
+
+PAGES = {
+    "home": lambda s: f"/?per_page={s['size']}",
+    "tag": lambda s: f"/tag/{s['tag']}?per_page={s['size']}",
+    "search": lambda s: f"/search?q={s['word']}&per_page={s['size']}",
+    "post": lambda s: f"/posts/{s['post']}",
+    "profile_posts": lambda s: f"/profile/{s['owner']}?tab=posts&per_page={s['size']}",
+    "profile_liked": lambda s: f"/profile/{s['owner']}?tab=liked&per_page={s['size']}",
+    "profile_comments": lambda s: f"/profile/{s['owner']}?tab=comments&per_page={s['size']}",
+}
+
+
+def _count(client, url: str, cookie) -> int:
+    headers = {"Cookie": cookie} if cookie else {}
+    page_cache.clear()
+    assert client.get(url, headers=headers).status_code == 200  # прогрев кэшей тегов и пользователей
+    page_cache.clear()
+    with count_queries() as counter:
+        response = client.get(url, headers=headers)
+    assert response.status_code == 200
+    return counter.count
+
+
+@pytest.mark.parametrize("logged_in", [False, True], ids=["anonymous", "logged_in"])
+@pytest.mark.parametrize("page", list(PAGES))
+def test_query_count_does_not_grow_with_rows(client, sets, auth_cookie, page, logged_in):
+    cookie = auth_cookie if logged_in else None
+    few = _count(client, PAGES[page](sets["few"]), cookie)
+    many = _count(client, PAGES[page](sets["many"]), cookie)
+    assert few == many, f"{page}: {few} запросов на {SIZES['few']} строк, {many} на {SIZES['many']}"
@@ -0,0 +1,33 @@
+"""Планы запросов лент, поста и профиля на тестовой базе: без полного
+просмотра таблиц. Проверки и наполнение - из bench/query_plans.py."""
+import pytest
+from app.database import SessionLocal
+from bench import query_plans
+
+
+@pytest.fixture(scope="module")
+def sample(client):
+    return query_plans.seed(posts=500, users=50)
+
+
+def test_no_full_table_scans(sample):
+    failures = []
+    with SessionLocal() as db:
+        for name, fn in query_plans.checks(db, sample):
+            statements = query_plans.plans(db, fn)
+            assert statements, f"{name}: ни одного SELECT - проверять нечего"
+            for statement, plan, scans in statements:
+                if scans:
+                    failures.append(f"{name}: {' '.join(statement.split())[:200]}\n  " + "\n  ".join(plan))
+    assert not failures, "\n".join(failures)
+
+
+def test_full_scan_is_detected():
+    assert query_plans.full_scans(["SCAN posts"]) == ["SCAN posts"]
+    assert query_plans.full_scans(["-> Seq Scan on comments  (cost=0.00..1.00)"])
+    assert not query_plans.full_scans(["SEARCH posts USING INDEX ix_posts_created_id (created_at<?)"])
+    assert not query_plans.full_scans(["SCAN posts USING INDEX ix_posts_created_id"])
+    assert not query_plans.full_scans(["SCAN site_counters"])
+    # Индекс есть, но не по нужному порядку: вся таблица уходит в сортировку
+    assert query_plans.full_scans(["SCAN posts USING INDEX ix_posts_author_created_id",
+                                   "USE TEMP B-TREE FOR ORDER BY"])
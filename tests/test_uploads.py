@@ -0,0 +1,146 @@
+"""Загрузка картинки к посту: память не растет с размером файла, лишнее - 413."""
+import os
+import tracemalloc
+import pytest
+from app.config import settings
+from app.main import app
+from app.utils import file_upload
+
+BOUNDARY = "upload-test-boundary"
+CHUNK = 64 * 1024
+
+
+def multipart_body(file_size: int):
+    """Тело формы создания поста по частям, файл генерируется на лету."""
+    fields = (
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="title"\r\n\r\nБольшая картинка\r\n'
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="content"\r\n\r\nТекст\r\n'
+        f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="image"; filename="big.gif"\r\n'
+        f"Content-Type: image/gif\r\n\r\n"
+    ).encode()
+    yield fields
+    # GIF не нарезается на варианты, поэтому пул процессов не нужен
+    yield b"GIF89a"
+    left = file_size - 6
+    while left > 0:
+        size = min(CHUNK, left)
+        yield b"\0" * size
+        left -= size
+    yield f"\r\n--{BOUNDARY}--\r\n".encode()
+
+
+def body_length(file_size: int) -> int:
+    return sum(len(part) for part in multipart_body(0)) - 6 + file_size
+
+
+async def post_stream(path: str, cookie: str, chunks, content_length=None) -> int:
+    """Запрос напрямую в ASGI-приложение: TestClient собрал бы все тело в памяти."""
+    chunks = iter(chunks)
+    status = None
+
+    async def receive():
+        body = next(chunks, None)
+        if body is None:
+            return {"type": "http.request", "body": b"", "more_body": False}
+        return {"type": "http.request", "body": body, "more_body": True}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    headers = [
+        (b"content-type", f"multipart/form-data; boundary={BOUNDARY}".encode()),
+        (b"cookie", cookie.encode()),
+    ]
+    if content_length is not None:
+        headers.append((b"content-length", str(content_length).encode()))
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1",
+        "method": "POST", "scheme": "http", "path": path, "raw_path": path.encode(),
+        "root_path": "", "query_string": b"", "headers": headers,
+        "client": ("testclient", 50000), "server": ("testserver", 80),
+    }
+    await app(scope, receive, send)
+    return status
+
+
+def test_upload_peak_memory_does_not_grow_with_file(client, auth_cookie):
+    file_size = settings.MAX_FILE_SIZE - 1024
+    before = set(os.listdir(settings.UPLOAD_DIR)) if os.path.isdir(settings.UPLOAD_DIR) else set()
+
+    tracemalloc.start()
+    try:
+        status = client.portal.call(
+            post_stream, "/posts/create", auth_cookie, multipart_body(file_size), body_length(file_size)
+        )
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert status == 302
+    saved = set(os.listdir(settings.UPLOAD_DIR)) - before
+    assert len(saved) == 1
+    assert os.path.getsize(os.path.join(settings.UPLOAD_DIR, saved.pop())) == file_size
+    # Starlette держит в памяти до 1 МБ файла формы, дальше пишет на диск;
+    # весь файл в памяти дал бы пик больше file_size
+    assert peak < 2 * 1024 * 1024, f"пик {peak / 2**20:.1f} МБ при файле {file_size / 2**20:.1f} МБ"
+
+
+def test_oversized_upload_rejected_by_content_length(client, auth_cookie):
+    file_size = settings.MAX_FILE_SIZE + settings.UPLOAD_FORM_OVERHEAD + 1
+    sent = []
+
+    def counted():
+        for part in multipart_body(file_size):
+            sent.append(len(part))
+            yield part
+
+    status = client.portal.call(post_stream, "/posts/create", auth_cookie, counted(), body_length(file_size))
+    assert status == 413
+    # Ответ по Content-Length, тело не читалось
+    assert not sent
+
+
+@pytest.mark.parametrize("file_size", [
+    settings.MAX_FILE_SIZE + 1,  # в пределах лимита тела, но больше лимита файла
+    settings.MAX_FILE_SIZE + settings.UPLOAD_FORM_OVERHEAD + 1,  # больше лимита тела
+])
+def test_oversized_upload_without_content_length(client, auth_cookie, file_size):
+    sent = []
+
+    def counted():
+        for part in multipart_body(file_size):
+            sent.append(len(part))
+            yield part
+
+    status = client.portal.call(post_stream, "/posts/create", auth_cookie, counted())
+    assert status == 413
+    assert sum(sent) <= settings.MAX_FILE_SIZE + settings.UPLOAD_FORM_OVERHEAD + 2 * CHUNK
+    # Недокачанный файл удален и в публичный каталог не попадал
+    assert os.listdir(settings.UPLOAD_TMP_DIR) == []
+    assert not any(name.endswith(".part") for name in os.listdir(settings.UPLOAD_DIR))
+
+
+def test_partial_upload_is_written_outside_static(client, auth_cookie, monkeypatch):
+    seen = []
+    mkstemp = file_upload.tempfile.mkstemp
+
+    def recording_mkstemp(*args, **kwargs):
+        fd, path = mkstemp(*args, **kwargs)
+        seen.append(path)
+        return fd, path
+
+    monkeypatch.setattr(file_upload.tempfile, "mkstemp", recording_mkstemp)
+    status = client.portal.call(post_stream, "/posts/create", auth_cookie, multipart_body(1024))
+    assert status == 302
+    assert len(seen) == 1
+    assert os.path.dirname(seen[0]) == os.path.abspath(settings.UPLOAD_TMP_DIR)
+    assert not os.path.exists(seen[0])
+
+
+def test_image_variant_skips_disk_for_gif(monkeypatch):
+    monkeypatch.setattr(file_upload.os.path, "exists", lambda path: pytest.fail("проверка диска для GIF"))
+    assert file_upload.image_variant("anim.gif", "thumb") == {
+        "src": file_upload.UPLOAD_URL + "anim.gif", "webp": None,
+    }